@@ -8,10 +8,12 @@ import numpy
 import os
 import com
 import json
+from specrun import SpecRun, ProbeRun
+from eventlog import EventLog
+from ncycontrol import NcyControl
+from tabu import TabuTable, failures as tabu_failures
+import fpcache
 
-rwplist = []
-rwplist_all = []
-rwp_all = []
 tag = "auto->"
 option_this = {
     "label": 1,
@@ -19,16 +21,34 @@ option_this = {
     "clear_one": False,
     "clear_all": True,
     "alt": None,
-    "rwp": rwplist,
 }
 
 
 class autofp_log:
-    def __init__(self):
+    '''
+    The log of autorun: log_cycles, written to autofp.log at the end of a
+    run, and with a path, the events of the steps appended to an event log
+    (eventlog.EventLog) as they come. The plot process gets only the new
+    events through com.mp_queue and builds log_cycles again from them
+    (plot.apply_events).
+    '''
+
+    def __init__(self, path=None):
         self.log_cycles = {}
         self.current_cycle = 0
+        self.events = None
+        if path != None:
+            self.events = EventLog(path)
+        self.new_events = []  # events not yet put on com.mp_queue, ui mode only
+        self.written = {}     # history file -> number of values in it
         return
 
+    # the event log is written and its writer thread ends
+    def close(self):
+        if self.events != None:
+            self.events.close()
+            self.events = None
+
     def get_log_handle(self, cycle):
         key = "cycle_{}".format(cycle)
         if key not in self.log_cycles:
@@ -48,25 +68,118 @@ class autofp_log:
         msg = {"msg": context, "cycle": cycle}
         log["log"].append(msg)
         self.current_cycle = cycle
-
+        self.emit({"event": "log", "cycle": cycle, "msg": context})
+
+    # a step of autorun, step["good"] is True if it is kept
+    def log_step(self, step):
+        event = {"event": "step"}
+        event.update(step)
+        self.emit(event)
+        if step["good"] == True and com.mode == "ui":
+            self.new_events.append(event)
+
+    def emit(self, event):
+        if self.events != None:
+            self.events.emit(event)
+
+    # the history files are written again at the first write_lists
+    def reset_lists(self):
+        self.written = {}
+
+    # lists: path -> list of numbers, as numpy.savetxt writes them; only the
+    # numbers added since the last call are appended
+    def write_lists(self, lists):
+        for path, values in lists.items():
+            n = self.written.get(path)
+            if self.events == None:
+                numpy.savetxt(path, numpy.array(values))
+            elif n == None or n > len(values):
+                self.events.replace(path, "".join(["%.18e\n" % v for v in values]))
+            else:
+                self.events.append(path, "".join(["%.18e\n" % v for v in values[n:]]))
+            self.written[path] = len(values)
+
+    def write_json(self, path, data):
+        if self.events == None:
+            json.dump(data, open(path, "w"))
+        else:
+            self.events.replace(path, json.dumps(data))
+
+    # the new events since the last call, as a json list
     def log_write_queue(self):
-        self.log_cycles["cur_cycle"] = self.current_cycle
-        js = json.dumps(self.log_cycles)
+        js = json.dumps(self.new_events, default=float)
+        self.new_events = []
         try:
             com.mp_queue.put(js)
         except Full:
             print("Queue is full, cannot write autofp log to queue.")
 
-    def log_write_file(self):
+    def log_write_file(self, path="autofp.log"):
         self.log_cycles["current_cycle"] = self.current_cycle
-        with open("autofp.log", "w") as f:
+        with open(path, "w") as f:
             json.dump(self.log_cycles, f, indent=4)
+        self.flush()
 
-
-g_afl = autofp_log()
+    # wait until the event log and the history files are written
+    def flush(self):
+        if self.events != None:
+            self.events.flush()
 
 
 # Auto rietveld
+# the NCY of the next run, the fit is only set if it differs
+def set_ncy(r, ncy):
+    if r.fit.get("NCY") != ncy:
+        r.fit.set("NCY", ncy)
+    return
+
+
+# the switch from coarse to full data: run the state again on the full
+# data, return the target of it, 10000 if fp2k fails
+def full_data(r, ctx, spec):
+    r.writepcr()
+    r.rwp_limit = None
+    r.runfp()
+    err = r.err
+    goodr = 10000
+    if err == 0:
+        goodr = ctx.target(r.R)
+    else:
+        r.back_no_step()
+    ctx.afl.emit({"event": "full_data", "cycle": ctx.cycle, "err": err,
+                  "target": goodr, "R": dict(r.R)})
+    if spec != None:
+        spec.reset(r)  # the trials were made on the coarse data
+    return goodr
+
+
+# probe screening of the candidates order[start:end]: the ones which make
+# the target better than goodr in one cycle are put first, the best first,
+# then the ones whose probe failed; the others are returned, index ->
+# target, they are not refined
+def screen(r, ctx, probe, order, start, end, goodr):
+    candidates = order[start:end]
+    result = probe.probe(r, candidates)
+    targets = {}
+    for i, (err, R) in result.items():
+        targets[i] = None
+        if err == 0:
+            targets[i] = ctx.target(R)
+    good = [i for i in candidates if targets[i] != None and targets[i] < goodr]
+    good.sort(key=lambda i: targets[i])
+    # one cycle may fail where more converge: a failed probe is refined
+    failed = [i for i in candidates if targets[i] == None]
+    bad = [i for i in candidates if i not in good and i not in failed]
+    order[start:end] = good + failed + bad
+    ctx.afl.emit({"event": "probe", "cycle": ctx.cycle, "target": goodr,
+                  "probes": [[r.params.get_param_fullname(i), targets[i]]
+                             for i in candidates]})
+    screened = {}
+    for i in bad:
+        screened[i] = targets[i]
+    return screened
+
+
 def autorun(
     pcrname, param_switch=None, r=None, param_order_num=None, option=option_this
 ):
@@ -74,13 +187,20 @@ def autorun(
     if r == None:
         r = Run()
         r.reset(pcrname, "tmp")
+    ctx = r.ctx  # the state of this job
+    if ctx.afl == None:
+        ctx.afl = autofp_log(ctx.path("autofp_events.jsonl"))
+    ctx.afl.reset_lists()
+    r.reset_steps()  # only the steps of this cycle can be restored
+    rwplist = ctx.rwplist
+    rwplist_all = ctx.rwplist_all
 
     r.fit.set("NCY", com.run_set.NCY)  # set number of circle is NCY
     # sys.stdout=com.ui;
     # print tag,param_switch
     job = r.job  # get the job type of the Run,job=0 Xray; job=1 CW
     Pg = paramgroup.Pgs[job]
-    com.target = Pg.target
+    ctx.target = Pg.target
 
     # get the order of the params
     if param_order_num == None:
@@ -91,8 +211,24 @@ def autorun(
         for i in r.params.paramlist:
             param_switch.append(True)
 
-    Pg.get_order(r.params, param_switch, param_order_num)
-    order = Pg.order
+    # the order, group by group: group_end[start] is the end of the group
+    # starting at start
+    order = []
+    group_end = {}
+    groups = []  # the group of every position
+    for g in param_order_num:
+        group = Pg.get_order(r.params, param_switch, [g])
+        if group != []:
+            group_end[len(order)] = len(order)+len(group)
+        order.extend(group)
+        groups.extend([g]*len(group))
+
+    # coarse mode: the steps of the first coarse_groups groups of the order
+    # refine on data with every coarse_stride-th point only
+    coarse_n = 0
+    if com.run_set.coarse_groups > 0 and com.run_set.coarse_stride > 1:
+        coarse_n = len(Pg.get_order(r.params, param_switch,
+                                    list(param_order_num)[:com.run_set.coarse_groups]))
 
     tmp_r = 10000
     goodr = 10000
@@ -103,43 +239,165 @@ def autorun(
     rwplist_out = open(r.pcrfilename + "_rwplist.txt", "w")
     rwp_param = []
 
+    if coarse_n > 0 and r.begin_coarse(com.run_set.coarse_stride) == True:
+        com.ui.write("coarse data: " + str(coarse_n) + " steps, every " +
+                     str(com.run_set.coarse_stride) + "th point\n")
+    else:
+        coarse_n = 0
+
+    # speculative mode: run the next spec_n params in parallel
+    spec = None
+    if com.run_set.spec_n > 1:
+        spec = SpecRun(com.run_set.spec_n)
+        spec.reset(r)
+
+    # probe screening: at the start of a group its candidates run one cycle
+    # first, the ones which make the target worse are not refined
+    probe = None
+    screened = {}  # index -> target of one cycle, of the params not refined
+    screened_n = 0
+    if com.run_set.probe_screen == True:
+        probe = ProbeRun()
+        probe.reset(r)
+
+    # adaptive NCY: the cycles of a step follow the convergence of the steps
+    # of its group before, in this cycle of autofp and the ones before
+    if com.run_set.adaptive_ncy == True and ctx.ncy == None:
+        ctx.ncy = NcyControl()
+    ncy_control = None
+    if com.run_set.adaptive_ncy == True:
+        ncy_control = ctx.ncy
+
+    # tabu: the failed trials are kept, a param is not tried again from the
+    # same state, in this cycle of autofp or the next ones
+    if com.run_set.tabu == True and ctx.tabu == None:
+        ctx.tabu = TabuTable()
+    tabu = None
+    tabu_saved = 0
+    if com.run_set.tabu == True:
+        tabu = ctx.tabu
+        tabu_saved = tabu.saved
+
+    # the steps write no prf, hkl, fou, cif... files, only the last run
+    r.begin_trial()
+
     step = 0
+    timer = ctx.timer
+    ctx.afl.emit({"event": "start", "cycle": ctx.cycle, "pcr": r.pcrfilename,
+                  "order": [r.params.get_param_fullname(i) for i in order]})
     # rietveld according to the order
-    for i in order:
+    cur_end = len(order)  # the end of the group of pos
+    for pos, i in enumerate(order):
         error = 0
+        if pos in group_end:
+            cur_end = group_end[pos]
+        if pos == coarse_n and r.end_coarse() == True:
+            # the params refined so far are refined again on the full data,
+            # the target of the steps on coarse data is not compared
+            set_ncy(r, com.run_set.NCY)
+            goodr = full_data(r, ctx, spec)
+        if probe != None and pos in group_end:
+            screened = screen(r, ctx, probe, order, pos, group_end[pos], goodr)
+            i = order[pos]  # the group is in the order of the probes
+            if spec != None:
+                spec.skip = screened
         out.write(r.params.get_param_fullname(i) + "\n")
         out.flush()
-        r.setParam(i, True)
-        r.writepcr()
         param_name = r.params.get_param_fullname(i)
-
-        # try catch the error of the pcr file
-        try:
-            r.runfp()
-            if option["clear_one"] == True:
-                r.setParam(i, False)
+        timer.begin_step(pos, param_name)
+
+        # the params not refined: 0x100 one cycle with the param did not make
+        # the target better, 0x200 it failed from the same state before
+        skip = None
+        state = None
+        if i in screened:
+            skip = (0x100, screened[i])
+            screened_n += 1
+        elif tabu != None:
+            state = r.fit.snapshot()
+            entry = tabu.lookup(i, state)
+            if entry != None:
+                skip = (0x200, entry["target"])
+        if skip != None:
+            error, target_r = skip
+            ctx.afl.log_step({"cycle": ctx.cycle, "step": pos, "param": param_name,
+                              "err": 0, "error": error, "target": target_r,
+                              "R": None, "good": False})
+            out.write(str(error) + "\n")
+            out.flush()
+            step += 1
+            timer.end_step(err=0, error=error, target=target_r)
+            if com.autofp_running == False:
+                break
+            continue
+        if spec != None and tabu != None:
+            # no trial of the params of the batch which failed from this state
+            spec.skip = dict(screened)
+            for j in order[pos+1:pos+spec.n]:
+                if tabu.match(j, state) != None:
+                    spec.skip[j] = True
+
+        ncy = com.run_set.NCY
+        if ncy_control != None:
+            ncy = ncy_control.get(groups[pos])
+            set_ncy(r, ncy)
+
+        # fp2k making no progress above the best Rwp is stopped
+        r.rwp_limit = None
+        if ctx.target.name == "Rwp":
+            r.rwp_limit = goodr
+
+        if spec != None:
+            end = len(order)
+            if pos < coarse_n:
+                end = coarse_n  # no trial on coarse data after the switch
+            if ncy_control != None:
+                end = min(end, cur_end)  # the NCY of the next group is not known yet
+            spec.trial(r, order[:end], pos)
+        else:
+            r.setParam(i, True)
             r.writepcr()
-        except RietPCRError:
-            r.err = 11  # err=11 pcrfile error
-        except RietError:
-            r.err = 12
-        except Exception:
-            r.err = 13
 
-        # check error
-        com.R = r.R  # target funcrion setting
+            # try catch the error of the pcr file
+            try:
+                r.runfp()
+                if option["clear_one"] == True:
+                    r.setParam(i, False)
+                r.writepcr()
+            except RietPCRError:
+                r.err = 11  # err=11 pcrfile error
+            except RietError:
+                r.err = 12
+            except Exception:
+                r.err = 13
 
-        # begin python 2 - > pyhton 2+3, + globals()
-        exec(com.target["string"], globals())
-        target_r = MIN
+        # check error
+        ctx.R = r.R  # target funcrion setting
+        target_r = ctx.target(r.R)
+        step_R = dict(r.R)  # r.R is the one of the step restored by back()
+        if ncy_control != None and r.err == 0:
+            # the NCY the step ran with, a trial of a batch was launched before
+            ncy_control.update(groups[pos], r.cycles, r.cycles_ncy)
 
         if r.err != 0:
             error += 0x01
+        if r.err in [-35, -36]:
+            # stopped early by the monitor of fp2k, log the cycles it ran
+            com.ui.write(param_name + ": " + error_info[r.err] + " at cycle " +
+                         str(len(r.cycles)) + "\n")
+            ctx.afl.log({"param": param_name, "err": r.err,
+                         "cycles": r.cycles}, ctx.cycle)
         if target_r > goodr or target_r != target_r:
             error += 0x10
+        if error > 0 and tabu != None and (r.err == 0 or r.err in tabu_failures):
+            tabu.add(i, state, r.err, target_r, ctx.cycle)
 
         # if error back()
-        if error > 0:
+        if error > 0 and spec != None:
+            if r.err == 0:
+                rwplist_all.append(target_r)
+            spec.reject(r)
+        elif error > 0:
             # 精修无错误,rwp没减小
             if r.err == 0:
                 rwplist_all.append(target_r)
@@ -147,6 +405,8 @@ def autorun(
             # 精修有错误,没有保存,故不改变step_index
             if r.err != 0:
                 r.back_no_step()
+        elif spec != None:
+            spec.accept(r, i, option["clear_one"])
 
         # if no error
         step += 1
@@ -163,7 +423,7 @@ def autorun(
                 com.ui.write("step = " + str(r.step_index))
                 com.ui.write(param_name)
                 com.ui.write(
-                    com.target["name"] + ": " + str(target_r) + "\n", style="ok"
+                    ctx.target.name + ": " + str(target_r) + "\n", style="ok"
                 )
                 com.ui.write("Rwp= " + str(r.R["Rwp"]), style="ok")
                 com.ui.write(str(r.R), style="ok")
@@ -172,25 +432,31 @@ def autorun(
             Rwp = r.R["Rwp"]
             rwplist.append(Rwp)
             rwplist_all.append(Rwp)
-            com.Rwplist.append(Rwp)
-            numpy.savetxt("rwp.txt", numpy.array(rwplist))
-            numpy.savetxt("rwp_all.txt", numpy.array(rwplist_all))
-            numpy.savetxt("rwplist.txt", numpy.array(com.Rwplist))
+            ctx.Rwplist.append(Rwp)
+            with timer.phase("log"):
+                ctx.afl.write_lists({ctx.path("rwp.txt"): rwplist,
+                                     ctx.path("rwp_all.txt"): rwplist_all,
+                                     ctx.path("rwplist.txt"): ctx.Rwplist})
 
-            rwp_param.append(param_name)
-            json.dump(rwp_param, open("rwp_param.txt", "w"))
+                rwp_param.append(param_name)
+                ctx.afl.write_json(ctx.path("rwp_param.txt"), rwp_param)
 
-            g_afl.log_rwplist(rwplist=rwplist, rwplist_param=rwp_param, cycle=com.cycle)
-
-            if com.mode == "ui":
-                g_afl.log_write_queue()
+                ctx.afl.log_rwplist(rwplist=rwplist, rwplist_param=rwp_param, cycle=ctx.cycle)
 
             out.write("step:    " + str(r.step_index) + "\n")
 
+        with timer.phase("log"):
+            ctx.afl.log_step({"cycle": ctx.cycle, "step": pos, "param": param_name,
+                              "err": r.err, "error": error, "target": target_r,
+                              "R": step_R, "good": error == 0, "ncy": r.cycles_ncy})
+            if error == 0 and com.mode == "ui":
+                ctx.afl.log_write_queue()
+
         out.write(str(error) + "\n")
         out.write(str(target_r) + "\n")
         out.flush()
         tmp_r = target_r
+        timer.end_step(err=r.err, error=error, target=target_r)
 
         # autofp is stoped ?
         if com.autofp_running == False:
@@ -202,37 +468,58 @@ def autorun(
     out.close()
 
     print(goodr)
-    option["alt"].complete()
+    if probe != None:
+        print(tag, "probe screening:", screened_n, "of", len(order), "steps not refined")
+    if tabu != None:
+        tabu_saved = tabu.saved-tabu_saved
+        com.ui.write("tabu: " + str(tabu_saved) + " fp2k runs saved, " +
+                     str(tabu.saved) + " in all cycles\n")
+    if option["alt"] != None:
+        option["alt"].complete()
     com.ui.write("complete !\n")
 
+    coarse = r.end_coarse()
+    r.end_trial()
+    set_ncy(r, com.run_set.NCY)
     if option["clear_all"] == True:
-        for i in order:
-            r.setParam(i, False)
-        r.writepcr()
+        r.params.set_params_onoff(order, False)
+    r.writepcr()
 
+    r.rwp_limit = None
     r.runfp()  # run FP to create the PRF
+    if coarse == True and r.err == 0:
+        goodr = ctx.target(r.R)  # the target on the full data
 
     print("rwp:", rwplist)
     for i in rwplist:
         rwplist_out.write(str(i) + "\n")
     rwplist_out.close()
-    numpy.savetxt("OK.txt", rwplist)
+    numpy.savetxt(ctx.path("OK.txt"), rwplist)
+
+    if timer.enabled == True:
+        timer.write_trace(ctx.path("autofp_trace.json"))
+        print(tag, "time of the steps, trace in", ctx.path("autofp_trace.json"))
+        print(timer.summary())
 
     if rwplist != []:
         if abs(rwplist[-1] - rwplist[0]) < setting.run_set.eps:
-            com.des = True
+            ctx.des = True
     if rwplist == []:
-        com.des = True
+        ctx.des = True
     if com.run_set.rm_tmp_done == True:
         shutil.rmtree(r.tmpdir)
     if com.run_set.show_rwp == True:
-        com.plot.g_stop_events[com.cycle].set()
+        com.plot.g_stop_events[ctx.cycle].set()
     if com.run_mode > 0:
         com.ui.autofp_done_signal.emit(goodr) # emit global signal to uiset.py
-    rwp_all.append(rwplist)
-
-    print(rwp_all)  # The good Rwp of all cycles
-    g_afl.log_write_file()  # write log
+    ctx.rwp_all.append(rwplist)
+
+    print(ctx.rwp_all)  # The good Rwp of all cycles
+    if fpcache.get_cache() != None:
+        print(tag, "fp2k cache", fpcache.get_cache().stats())
+    ctx.afl.emit({"event": "end", "cycle": ctx.cycle, "target": goodr,
+                  "rwplist": rwplist, "screened": screened_n, "tabu_saved": tabu_saved})
+    ctx.afl.log_write_file(ctx.path("autofp.log"))  # write log
 
     # numpy.savetxt("rwp_all_cycles.txt",numpy.array(rwp_all))
 
@@ -0,0 +1,143 @@
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import multiprocessing
+import com
+import run
+import shautofp
+from pcrfilehelper import pcrFileHelper
+
+tag = "batch->"
+
+# columns of the batch result table
+columns = ["pcr", "Rwp", "cycles", "time", "err"]
+
+
+# batch entry, for example:  autofp -b -j 4 -c 0 -a example/dsmo/*.pcr
+def batch_run(argv, argn):
+    root = os.path.dirname(os.path.abspath(argv[0]))
+    cycle = 0
+    workers = multiprocessing.cpu_count()
+    flag_autoselect = False
+    outdir = "batch"
+    files = []
+    skip = False
+    for index, s in enumerate(argv[1:]):
+        if skip == True:
+            skip = False
+            continue
+        if s in ["-c", "-j", "-o", "-d"]:
+            value = argv[index+2]
+            skip = True
+            if s == "-c":
+                cycle = max(int(value), 0)
+            if s == "-j":
+                workers = max(int(value), 1)
+            if s == "-o":
+                outdir = value
+            if s == "-d":
+                com.wait = int(value)
+        elif s == "-a":
+            flag_autoselect = True
+        elif s != "-b":
+            names = glob.glob(s)
+            names.sort()
+            files.extend(names)
+
+    if files == []:
+        print(tag, "Error: no pcr file")
+        return []
+
+    jobs = make_jobs(files, outdir)
+    for j in jobs:
+        j["cycle"] = cycle
+        j["autoselect"] = flag_autoselect
+        j["wait"] = com.wait
+    print(tag, len(jobs), "pcr files,", workers, "workers")
+
+    pool = multiprocessing.Pool(workers, batch_init, (root,))
+    results = pool.map(batch_job, jobs, 1)
+    pool.close()
+    pool.join()
+
+    write_table(results, os.path.join(outdir, "batch_result.txt"))
+    json.dump(results, open(os.path.join(outdir, "batch_result.json"), "w"),
+              indent=1)
+    return results
+
+
+# one working dir for every pcr file: outdir/n_name/
+def make_jobs(files, outdir):
+    outdir = os.path.abspath(outdir)
+    if os.path.exists(outdir) == False:
+        os.mkdir(outdir)
+    jobs = []
+    for n, f in enumerate(files):
+        src = os.path.abspath(f)
+        name = os.path.basename(src)
+        path = os.path.join(outdir, "{:03d}_{}".format(
+            n, os.path.splitext(name)[0]))
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.mkdir(path)
+        shutil.copyfile(src, os.path.join(path, name))
+        jobs.append({"src": src, "pcr": os.path.join(path, name)})
+    return jobs
+
+
+# copy the input files of the pcr file of job from the dir of its source
+def copy_inputs(job):
+    pcr = pcrFileHelper()
+    pcr.readFromPcrFile(job["pcr"])
+    run.copy_job_files(os.path.dirname(job["src"]), os.path.basename(job["pcr"]),
+                       pcr.fit, os.path.dirname(job["pcr"]))
+
+
+# worker init, paid once per worker process instead of once per pcr file
+def batch_init(root):
+    shautofp.cmd_init(root)
+
+
+def batch_job(job):
+    result = {"pcr": job["src"], "Rwp": None, "cycles": 0,
+              "time": 0, "err": 0, "msg": ""}
+    com.wait = job["wait"]
+    com.autofp_running = True
+
+    # the log of a job is written to its working dir
+    log = open(os.path.join(os.path.dirname(job["pcr"]), "autofp_batch.log"), "w")
+    sys.stdout = log
+    com.ui = log
+    t = time.time()
+    try:
+        copy_inputs(job)
+        r = shautofp.run_job(job["pcr"], job["cycle"], job["autoselect"])
+        shautofp.print_json(r)
+        result["Rwp"] = r.Rwp
+        result["err"] = r.err
+        result["msg"] = run.error_info.get(r.err, "")
+        result["cycles"] = len(r.ctx.rwp_all)
+    except Exception as e:
+        result["err"] = -0x80
+        result["msg"] = str(e)
+    result["time"] = round(time.time()-t, 3)
+    sys.stdout = com.sys_stdout
+    com.ui = com.sys_stdout
+    log.close()
+
+    print(tag, result["pcr"], "Rwp=", result["Rwp"], "err=", result["err"])
+    return result
+
+
+def write_table(results, path):
+    lines = ["\t".join(columns)]
+    for res in results:
+        lines.append("\t".join([str(res[c]) for c in columns]))
+    text = "\n".join(lines)+"\n"
+    print(text)
+    out = open(path, "w")
+    out.write(text)
+    out.close()
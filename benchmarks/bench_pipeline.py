@@ -0,0 +1,226 @@
+# benchmark of the python side of a refinement: the pcr reader and writer,
+# the out and prf parsers, the param list, the order of the params and a
+# full autorun; fp2k is replaced by fakefp2k.py, which replays the output
+# files of the example job, so it runs offline without FullProf
+# usage: python benchmarks/bench_pipeline.py [result.json] [job ...]
+# job: a dir of example/ with a .pcr and .out file of the same name,
+# default Y2O3 pbso4; two result files are compared by compare.py
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import contextlib
+import subprocess
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(bench_dir)
+sys.path.insert(0, root)
+import run  # before com
+import com
+import auto
+import subrun
+import setting
+import paramgroup
+from paramlist import ParamList
+from pcrfilehelper import pcrFileHelper
+from diffpy.pyfullprof.fit import Fit
+from diffpy.pyfullprof.pcrfilereader import ImportFitFromFullProf
+from diffpy.pyfullprof.pcrfilewriter import pcrFileWriter
+from diffpy.pyfullprof.fpoutputfileparsers import FPOutFileParser, prfParser
+from fakefp2k import find_stem
+
+tag = "bench_pipeline->"
+default_jobs = ["Y2O3", "pbso4"]
+repeat = 5          # runs of every timed function, the best is kept
+repeat_autorun = 2  # runs of the full autorun
+
+
+def timeit(func, *args, n=repeat):
+    times = []
+    res = None
+    for i in range(n):
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = time.perf_counter()
+            res = func(*args)
+            times.append(time.perf_counter()-t)
+    return {"best": min(times), "mean": sum(times)/len(times), "n": n}, res
+
+
+# the time spent in fp2k by SubRun.run
+class Fp2kClock:
+    def __init__(self):
+        self.t = 0.0
+        self.n = 0
+
+    def wrap(self, func):
+        def timed(*args):
+            t = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                self.t += time.perf_counter()-t
+                self.n += 1
+        return timed
+
+
+# an executable fp2k which runs fakefp2k.py with this python
+def make_fp2k(path):
+    fp2k = os.path.join(path, "fp2k")
+    f = open(fp2k, "w")
+    f.write('#!/bin/sh\nexec "{}" "{}" "$@"\n'.format(
+        sys.executable, os.path.join(bench_dir, "fakefp2k.py")))
+    f.close()
+    os.chmod(fp2k, 0o755)
+    return fp2k
+
+
+def copy_job(src, dest):
+    if os.path.exists(dest):
+        shutil.rmtree(dest)
+    os.makedirs(dest)
+    for name in os.listdir(src):
+        if os.path.isfile(os.path.join(src, name)):
+            shutil.copyfile(os.path.join(src, name), os.path.join(dest, name))
+    return dest
+
+
+def read_pcr(pcr):
+    fit = Fit(None)
+    ImportFitFromFullProf(pcr).ImportFile(fit)
+    return fit
+
+
+# the pcr file of the last read: the helper reads it from its template
+def read_pcr_helper(pcr):
+    helper = pcrFileHelper()
+    helper.readFromPcrFile(pcr)
+    return helper.fit
+
+
+def read_prf(prf):
+    try:
+        return prfParser(prf)
+    except NotImplementedError:
+        return None
+
+
+def get_order(params, job):
+    Pg = paramgroup.Pgs[job]
+    switch = [True]*len(params.paramlist)
+    return Pg.get_order(params, switch, Pg.Param_Num_Order)
+
+
+def autorun(src, dest, stem):
+    copy_job(src, dest)
+    pcr = os.path.join(dest, stem+".pcr")
+    clock = Fp2kClock()
+    run_fp2k = subrun.SubRun.run
+    subrun.SubRun.run = clock.wrap(run_fp2k)
+    com.autofp_running = True
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            r = run.Run()
+            r.reset(pcr)
+            t = time.perf_counter()
+            auto.autorun(r.pcrfilename, None, r)
+            total = time.perf_counter()-t
+    finally:
+        subrun.SubRun.run = run_fp2k
+        com.autofp_running = False
+    return {"total": total, "fp2k": clock.t, "python": total-clock.t,
+            "fp2k_runs": clock.n, "steps": len(r.ctx.rwplist), "Rwp": r.Rwp}
+
+
+def bench_job(job, tmp):
+    src = os.path.join(root, "example", job)
+    stem = find_stem(src)
+    if stem == None:
+        print(tag, "no .pcr and .out of the same name in", src)
+        return None
+    dest = copy_job(src, os.path.join(tmp, job))
+    pcr = os.path.join(dest, stem+".pcr")
+    os.environ["AUTOFP_FAKE_SRC"] = src
+    res = {}
+
+    res["pcr_read"], fit = timeit(read_pcr, pcr)
+    res["pcr_read_helper"], fit = timeit(read_pcr_helper, pcr)
+    res["pcr_write"], _ = timeit(pcrFileWriter, fit, os.path.join(dest, "bench.pcr"))
+    res["out_parse"], _ = timeit(FPOutFileParser, fit, os.path.join(dest, stem+".out"))
+    if os.path.exists(os.path.join(dest, stem+".prf")):
+        res["prf_parse"], pattern = timeit(read_prf, os.path.join(dest, stem+".prf"))
+        if pattern == None:
+            del res["prf_parse"]  # a prf format prfParser does not read
+    job_type = fit.get("Pattern")[0].get("Job")
+    res["paramlist"], params = timeit(ParamList, fit.getParamList(), job_type, fit)
+    res["get_order"], order = timeit(get_order, params, job_type)
+    res["get_order"]["params"] = len(order)
+
+    runs = [autorun(src, os.path.join(tmp, job+"_run"), stem)
+            for i in range(repeat_autorun)]
+    best = min(runs, key=lambda x: x["python"])
+    res["autorun"] = dict(best)
+    res["autorun"]["best"] = best["python"]
+    res["autorun"]["n"] = repeat_autorun
+    return res
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=root,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(argv):
+    path = None
+    jobs = []
+    for arg in argv[1:]:
+        if arg.endswith(".json"):
+            path = arg
+        else:
+            jobs.append(arg)
+    if jobs == []:
+        jobs = default_jobs
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        com.com_init("cmd", root)
+    com.run_mode = 0
+    com.mode = "cmd"
+    com.ui = io.StringIO()
+    setting.run_set.show_rwp = False
+    setting.run_set.rm_tmp_done = False
+    setting.run_set.spec_n = 1
+    setting.run_set.fp_cache = False  # every fp2k is run
+
+    tmp = tempfile.mkdtemp(prefix="autofp_bench")
+    setting.run_set.fp2k_path = make_fp2k(tmp)
+    result = {"commit": git_commit(), "python": platform.python_version(),
+              "platform": platform.platform(),
+              "time": time.strftime("%Y-%m-%d %H:%M:%S"), "jobs": {}}
+    try:
+        for job in jobs:
+            res = bench_job(job, tmp)
+            if res == None:
+                continue
+            result["jobs"][job] = res
+            for name, value in res.items():
+                print("{:8s} {:16s} {:10.3f} ms".format(job, name, value["best"]*1000))
+            a = res["autorun"]
+            print("{:8s} autorun: {} steps, {} fp2k runs, total {:.3f} s, fp2k {:.3f} s".format(
+                job, a["steps"], a["fp2k_runs"], a["total"], a["fp2k"]))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if path != None:
+        json.dump(result, open(path, "w"), indent=4)
+        print(tag, "result saved to", path)
+    return result
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,80 @@
+# benchmark of prfParser (numpy) against prfParserLines (line by line)
+# usage: python benchmarks/bench_prfparser.py [scale] [prf file]
+# the pattern of the prf file is repeated scale times, with a finer step,
+# to make a prf file of high resolution data
+import os
+import sys
+import time
+import tempfile
+import numpy
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+from diffpy.pyfullprof.fpoutputfileparsers import prfParser, prfParserLines
+
+tag = "bench_prfparser->"
+
+
+# a prf file with scale times the points of src
+def make_prf(src, scale, path):
+    lines = open(src).read().splitlines()
+    n = [k for k, line in enumerate(lines) if line.count("Ycal") == 2][0]
+    phase_line = n-1
+    while len(lines[phase_line].split()) == 2:
+        phase_line -= 1  # excluded regions
+    terms = lines[phase_line-1].split()
+    num = int(terms[1])
+    data = lines[n+1:n+1+num]
+    x = [float(line.split("\t")[0]) for line in data]
+    step = (x[-1]-x[0])/(num*scale-1)
+    out = lines[:phase_line-1]
+    terms[1] = str(num*scale)
+    out.append("  "+"   ".join(terms))
+    out.extend(lines[phase_line:n+1])
+    for k in range(num*scale):
+        cols = data[k//scale].split("\t")
+        cols[0] = "%12.4f" % (x[0]+k*step)
+        out.append("\t".join(cols))
+    out.extend(lines[n+1+num:])
+    f = open(path, "w")
+    f.write("\n".join(out)+"\n")
+    f.close()
+    return num*scale
+
+
+def timeit(func, *args):
+    best = 1e10
+    for i in range(3):
+        t = time.time()
+        res = func(*args)
+        best = min(best, time.time()-t)
+    return best, res
+
+
+def bench(scale, src):
+    path = os.path.join(tempfile.mkdtemp(), "bench.prf")
+    num = make_prf(src, scale, path)
+    t_lines, ref = timeit(prfParserLines, path)
+    t_numpy, res = timeit(prfParser, path)
+    t_mmap, res_mmap = timeit(prfParser, path, True)
+    for r in [res, res_mmap]:
+        if numpy.array_equal(r[2], ref[2]) == False or numpy.array_equal(r[3], ref[3]) == False:
+            print(tag, "Error: the results are different")
+    size = os.path.getsize(path)/1024.0/1024.0
+    os.remove(path)
+    print(tag, "{} points, {:.1f} MB".format(num, size))
+    print(tag, "prfParserLines {:8.1f} ms".format(t_lines*1000))
+    print(tag, "prfParser      {:8.1f} ms  x{:.1f}".format(t_numpy*1000, t_lines/t_numpy))
+    print(tag, "prfParser mmap {:8.1f} ms  x{:.1f}".format(t_mmap*1000, t_lines/t_mmap))
+    return {"points": num, "MB": round(size, 2), "lines": t_lines,
+            "numpy": t_numpy, "mmap": t_mmap}
+
+
+if __name__ == "__main__":
+    scale = 1
+    src = os.path.join(root, "example", "Y2O3", "Y2O3.prf")
+    if len(sys.argv) > 1:
+        scale = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        src = sys.argv[2]
+    bench(scale, src)
@@ -0,0 +1,192 @@
+# benchmark of the RietveldClass object tree of the example pcr files: the
+# number of objects, the memory held by a Fit (tracemalloc), the time of a
+# full read, of building the objects alone, of get()/set() on every
+# parameter of the tree, of Fit.snapshot(), of Fit.restore() of a state with
+# one value changed and, for comparison, of a copy of the tree by pickle
+# usage: python benchmarks/bench_rietveldclass.py [result.json] [pcr ...]
+# default: every example/*/*.pcr; the "best" times of two result files are
+# compared by compare.py
+import os
+import gc
+import io
+import sys
+import glob
+import json
+import pickle
+import time
+import platform
+import tracemalloc
+import contextlib
+
+bench_dir = os.path.dirname(os.path.abspath(__file__))
+root = os.path.dirname(bench_dir)
+sys.path.insert(0, root)
+from diffpy.pyfullprof.fit import Fit
+from diffpy.pyfullprof.exception import RietError
+from diffpy.pyfullprof.pcrfilereader import ImportFitFromFullProf
+from bench_pipeline import timeit, git_commit
+
+tag = "bench_rietveldclass->"
+
+
+def read_pcr(pcr):
+    fit = Fit(None)
+    ImportFitFromFullProf(pcr).ImportFile(fit)
+    return fit
+
+
+# every object of the tree
+def nodes(obj):
+    res = [obj]
+    for name in obj.ObjectDict:
+        o = obj.__dict__[name]
+        if o is not None:
+            res.extend(nodes(o))
+    for name in obj.ObjectListDict:
+        for o in obj.__dict__[name]._list:
+            res.extend(nodes(o))
+    return res
+
+
+# the objects of the tree made again, empty
+def construct(classes):
+    return [cls(None) for cls in classes]
+
+
+# (object, name) of every parameter of the tree
+def params(tree):
+    return [(o, name) for o in tree for name in o.ParamDict]
+
+
+def get_all(pairs):
+    for o, name in pairs:
+        o.get(name)
+
+
+def set_all(values):
+    for o, name, value in values:
+        o.set(name, value)
+
+
+# (object, name, value) of the parameters which can be set to their value
+def settable(pairs):
+    values = []
+    for o, name in pairs:
+        value = o.get(name)
+        try:
+            o.set(name, value)
+        except (ValueError, TypeError, RietError):
+            continue
+        values.append((o, name, value))
+    return values
+
+
+# restore a state with one value changed, then the first state
+def restore_one(fit, states):
+    for state in states:
+        fit.restore(state)
+
+
+def copy_fit(fit):
+    return pickle.loads(pickle.dumps(fit, pickle.HIGHEST_PROTOCOL))
+
+
+# the memory held by a fit read from pcr, after a first read which fills
+# the caches of the modules
+def memory(pcr):
+    with contextlib.redirect_stdout(io.StringIO()):
+        read_pcr(pcr)
+        gc.collect()
+        tracemalloc.start()
+        fit = read_pcr(pcr)
+        gc.collect()
+        size, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return size, peak, fit
+
+
+def bench_pcr(pcr):
+    res = {}
+    try:
+        size, peak, fit = memory(pcr)
+    except Exception as e:
+        print(tag, "skip", pcr, repr(e)[:60])
+        return None
+    tree = nodes(fit)
+    # the classes which take only the parent
+    classes = []
+    for o in tree:
+        try:
+            o.__class__(None)
+            classes.append(o.__class__)
+        except (TypeError, RietError):
+            pass
+    pairs = params(tree)
+    res["pcr_read"], _ = timeit(read_pcr, pcr)
+    res["construct"], _ = timeit(construct, classes)
+    res["get"], _ = timeit(get_all, pairs)
+    values = settable(pairs)
+    res["set"], _ = timeit(set_all, values)
+    res["snapshot"], state = timeit(fit.snapshot)
+    changed = state.copy()
+    n = len(state)//4
+    if n > 0:
+        changed[n-1] += 1.0
+    res["restore"], _ = timeit(restore_one, fit, [changed, state])
+    res["restore"]["constraints"] = n
+    res["copy"], _ = timeit(copy_fit, fit)
+    res["construct"]["objects"] = len(classes)
+    res["get"]["params"] = len(pairs)
+    res["set"]["params"] = len(values)
+    res["memory"] = {"best": size/1e6, "peak": peak/1e6, "unit": "MB",
+                     "objects": len(tree)}
+    return res
+
+
+def main(argv):
+    path = None
+    pcrs = []
+    for arg in argv[1:]:
+        if arg.endswith(".json"):
+            path = arg
+        else:
+            pcrs.append(arg)
+    if pcrs == []:
+        pcrs = sorted(glob.glob(os.path.join(root, "example", "*", "*.pcr")))
+
+    result = {"commit": git_commit(), "python": platform.python_version(),
+              "platform": platform.platform(),
+              "time": time.strftime("%Y-%m-%d %H:%M:%S"), "jobs": {}}
+    total = {}
+    for pcr in pcrs:
+        res = bench_pcr(pcr)
+        if res == None:
+            continue
+        name = os.path.relpath(pcr, os.path.join(root, "example"))
+        result["jobs"][name] = res
+        for key, value in res.items():
+            total[key] = total.get(key, 0.0) + value["best"]
+        m = res["memory"]
+        print("{:28s} {:5d} objects {:7.3f} MB  read {:7.3f} ms  construct {:7.3f} ms"
+              "  get {:7.3f} ms  set {:7.3f} ms  snapshot {:7.1f} us  restore {:7.1f} us"
+              "  copy {:7.3f} ms".format(
+                  name[-28:], m["objects"], m["best"], res["pcr_read"]["best"]*1000,
+                  res["construct"]["best"]*1000, res["get"]["best"]*1000,
+                  res["set"]["best"]*1000, res["snapshot"]["best"]*1e6,
+                  res["restore"]["best"]/2*1e6, res["copy"]["best"]*1000))
+    print("{:28s} {:>13s} {:7.3f} MB  read {:7.3f} ms  construct {:7.3f} ms"
+          "  get {:7.3f} ms  set {:7.3f} ms  snapshot {:7.1f} us  restore {:7.1f} us"
+          "  copy {:7.3f} ms".format(
+              "total", "", total.get("memory", 0.0), total.get("pcr_read", 0.0)*1000,
+              total.get("construct", 0.0)*1000, total.get("get", 0.0)*1000,
+              total.get("set", 0.0)*1000, total.get("snapshot", 0.0)*1e6,
+              total.get("restore", 0.0)/2*1e6, total.get("copy", 0.0)*1000))
+
+    if path != None:
+        json.dump(result, open(path, "w"), indent=4)
+        print(tag, "result saved to", path)
+    return result
+
+
+if __name__ == "__main__":
+    main(sys.argv)
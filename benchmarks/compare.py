@@ -0,0 +1,51 @@
+# compare two results of bench_pipeline.py, e.g. of two commits
+# usage: python benchmarks/compare.py <old.json> <new.json> [tolerance]
+# a time or size more than tolerance (default 0.1, 10%) above the old one is marked
+# as slower, and the exit code is 1 if there is any
+import sys
+import json
+
+
+def compare(old, new, tolerance=0.1):
+    slower = []
+    print("old: {} {}".format(old.get("commit", "")[:10], old.get("time", "")))
+    print("new: {} {}".format(new.get("commit", "")[:10], new.get("time", "")))
+    for job, res in new["jobs"].items():
+        if job not in old["jobs"]:
+            continue
+        for name, value in res.items():
+            if name not in old["jobs"][job]:
+                continue
+            t_old = old["jobs"][job][name]["best"]
+            t_new = value["best"]
+            ratio = t_new/t_old if t_old > 0 else 1.0
+            mark = ""
+            if ratio > 1+tolerance:
+                mark = "slower"
+                slower.append((job, name))
+            elif ratio < 1-tolerance:
+                mark = "faster"
+            # times are in s, others give their unit, e.g. MB
+            unit = value.get("unit", "ms")
+            scale = 1000 if unit == "ms" else 1
+            print("{:8s} {:16s} {:10.3f} {:2s} {:10.3f} {:2s} {:6.2f}x {}".format(
+                job, name, t_old*scale, unit, t_new*scale, unit, ratio, mark))
+    return slower
+
+
+def main(argv):
+    if len(argv) < 3:
+        print("usage: compare.py <old.json> <new.json> [tolerance]")
+        return 2
+    tolerance = 0.1
+    if len(argv) > 3:
+        tolerance = float(argv[3])
+    old = json.load(open(argv[1]))
+    new = json.load(open(argv[2]))
+    if compare(old, new, tolerance) != []:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,67 @@
+# a stub of fp2k for the benchmarks, no FullProf is needed:
+# the .out, .prf and .sum files of an example job are copied into the
+# current dir under the name of the pcr file, and the R factors of every
+# cycle of the .out file are printed on stdout as fp2k does
+# usage: python fakefp2k.py <pcr file>
+# the example job dir is given by the environment variable AUTOFP_FAKE_SRC
+import os
+import re
+import sys
+import shutil
+
+replay_ext = [".out", ".prf", ".sum"]
+
+CycleRe = re.compile(r"=> CYCLE No\.:\s*(\d+)")
+RRe = re.compile(
+    r"Conventional Rietveld Rp,Rwp,Re and Chi2:\s*(\S+)\s+(\S+)\s+(\S+)\s+(\S+)")
+
+
+# the stem of the job in src: the one with an .out file
+def find_stem(src):
+    for name in sorted(os.listdir(src)):
+        stem, ext = os.path.splitext(name)
+        if ext == ".out" and os.path.exists(os.path.join(src, stem+".pcr")):
+            return stem
+    return None
+
+
+# the lines fp2k prints for the cycles of an out file
+def cycle_lines(outfile):
+    lines = []
+    cycle = None
+    for line in open(outfile, errors="replace"):
+        m = CycleRe.search(line)
+        if m != None:
+            cycle = m.group(1)
+            lines.append("  ===================>>> CYCLE:  " + cycle)
+            continue
+        m = RRe.search(line)
+        if m != None and cycle != None:
+            lines.append(" => Rp: {}  Rwp: {}  Rexp: {}  Chi2: {}".format(*m.groups()))
+            cycle = None  # several patterns: the first one is the R of the cycle
+    return lines
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("usage: fakefp2k.py <pcr file>")
+        return 1
+    src = os.environ.get("AUTOFP_FAKE_SRC", "")
+    stem = None
+    if os.path.isdir(src):
+        stem = find_stem(src)
+    if stem == None:
+        print("fakefp2k: no example job in AUTOFP_FAKE_SRC", src)
+        return 1
+    pcr_stem = os.path.splitext(argv[1])[0]
+    for ext in replay_ext:
+        if os.path.exists(os.path.join(src, stem+ext)):
+            shutil.copyfile(os.path.join(src, stem+ext), pcr_stem+ext)
+    for line in cycle_lines(os.path.join(src, stem+".out")):
+        print(line)
+    print(" => Normal end, final calculations and writing...")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
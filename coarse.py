@@ -0,0 +1,85 @@
+import os
+
+tag = "coarse->"
+
+# the data formats (Ins of the pattern) a coarse copy can be made of
+# 0: free format, "Thmin Step Thmax" then the intensities
+# 10: X Y [Sigma] lines, the first lines may be a header
+coarse_ins = [0, 10]
+
+
+# the name of the coarse copy of datafile
+def coarse_name(datafile, k):
+    stem, ext = os.path.splitext(datafile)
+    return stem + "_coarse" + str(k) + ext
+
+
+def is_number(s):
+    try:
+        float(s)
+    except ValueError:
+        return False
+    return True
+
+
+# write the data file src with only every k-th point into dest, as the same
+# format; the step of the coarse data is step*k, the counts are kept
+# return False if the format is not one of coarse_ins or can not be read
+def decimate(src, dest, k, ins):
+    if ins not in coarse_ins or k < 2:
+        return False
+    try:
+        f = open(src, "r")
+        lines = f.read().splitlines()
+        f.close()
+        if ins == 0:
+            text = decimate_free(lines, k)
+        else:
+            text = decimate_xy(lines, k)
+    except (IOError, ValueError, IndexError) as e:
+        print(tag, "can not make the coarse data of", src, e)
+        return False
+    f = open(dest, "w")
+    f.write(text)
+    f.close()
+    return True
+
+
+# Ins=0: the first line is Thmin Step Thmax [comment]
+def decimate_free(lines, k):
+    head = lines[0].split()
+    thmin = float(head[0])
+    step = float(head[1])
+    values = []
+    for line in lines[1:]:
+        values.extend(line.split())
+    values = values[::k]
+    thmax = thmin + (len(values)-1)*step*k
+    comment = " ".join(head[3:])
+    res = ["{:10.8g} {:10.8g} {:10.8g}  {}".format(thmin, step*k, thmax, comment)]
+    for i in range(0, len(values), 10):
+        res.append(" ".join(["{:>8s}".format(v) for v in values[i:i+10]]))
+    text = "\n".join(res)+"\n"
+    # fp2k reads the values in free format: they must read back as written
+    items = text.split()
+    if items[3+len(head[3:]):] != values or \
+            abs(float(items[1])-step*k) > 1e-7*abs(step*k):
+        raise ValueError("the coarse values do not read back")
+    return text
+
+
+# Ins=10: X Y [Sigma], a first line XYDATA is followed by 5 header lines,
+# else the lines before the first data line are the header
+def decimate_xy(lines, k):
+    n = 0
+    if len(lines) > 0 and lines[0].strip().upper().startswith("XYDATA"):
+        n = 6
+    while n < len(lines):
+        items = lines[n].split()
+        if len(items) >= 2 and all([is_number(s) for s in items[:3]]):
+            break
+        n += 1
+    data = [line for line in lines[n:] if line.strip() != ""]
+    if data == []:
+        raise ValueError("no data")
+    return "\n".join(lines[:n] + data[::k])+"\n"
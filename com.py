@@ -9,18 +9,12 @@ import multiprocessing
 
 run_set = setting.run_set
 
-R = {"Rp": 100, "Rwp": 100, "Re": 100, "Chi2": 100}
-target = {"string": 'com.R["Rwp"]', "name": "Rwp"}
-
 plot = None
 show_plot = plot
 sys_stdout = sys.stdout
 
 ui = None
-cycle = 1
 run_mode = 1
-des = False
-Rwplist = []
 
 wait = 0
 autofp_running = False
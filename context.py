@@ -0,0 +1,31 @@
+import os
+from steptimer import StepTimer
+from target import Target
+
+
+class RefinementContext:
+    '''
+    State of one refinement job: R factors, cycle and Rwp lists of autofp.
+    Every file of the job is resolved relative to the job dir, so several
+    Run can be refined at the same time in one process.
+    '''
+
+    def __init__(self, dirname="."):
+        self.dirname = os.path.abspath(dirname)
+        self.R = {"Rp": 100, "Rwp": 100, "Re": 100, "Chi2": 100}
+        self.target = Target('MIN=R_Factor["Rwp"]')
+        self.cycle = 1
+        self.des = False       # des=True: Rwp is not changed, stop the cycles
+        self.Rwplist = []      # good Rwp of all the cycles
+        self.rwplist = []      # good Rwp of this cycle
+        self.rwplist_all = []  # Rwp of all the steps of this cycle
+        self.rwp_all = []      # rwplist of every cycle
+        self.afl = None        # auto.autofp_log of the job
+        self.ncy = None        # ncycontrol.NcyControl of the job, adaptive NCY
+        self.tabu = None       # tabu.TabuTable of the failed trials of the job
+        self.timer = StepTimer()  # time of the phases of every step
+        return
+
+    # the absolute path of a file in the job dir
+    def path(self, name):
+        return os.path.join(self.dirname, name)
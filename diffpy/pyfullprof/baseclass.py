@@ -20,6 +20,80 @@ __id__ = "$Id: baseclass.py 6843 2013-01-09 22:14:20Z juhas $"
 from diffpy.pyfullprof.containerclass import *
 from diffpy.pyfullprof.exception import *
 
+# the kinds of members of a BaseClass
+PARAM, PARAMLIST, OBJECT, OBJECTLIST = 0, 1, 2, 3
+
+
+class Members(object):
+    """Members is the table of the members of a BaseClass subclass, made once
+    from its ParamDict, ParamListDict, ObjectDict and ObjectListDict and
+    shared by all its objects.
+
+    Data member:
+    kinds       -- name -> PARAM, PARAMLIST, OBJECT or OBJECTLIST
+    defaults    -- name -> initial value, of the ParamDict and ObjectDict
+    paramlists  -- (name, minsize, maxsize) of the ParamListDict
+    objectlists -- (name, minsize, maxsize) of the ObjectListDict
+    sizes       -- the sizes of the four dicts when the table is made
+    """
+    __slots__ = ["kinds", "defaults", "paramlists", "objectlists", "sizes"]
+
+    def __init__(self, cls):
+        """Initialization.
+
+        cls -- a BaseClass subclass
+        """
+        self.sizes = memberSizes(cls)
+
+        # the first dict having the name gives its kind, as in get() and set()
+        self.kinds = {}
+        for kind, members in [(OBJECTLIST, cls.ObjectListDict), (OBJECT, cls.ObjectDict),
+                              (PARAMLIST, cls.ParamListDict), (PARAM, cls.ParamDict)]:
+            for name in members:
+                self.kinds[name] = kind
+
+        self.defaults = {}
+        for name, info in cls.ParamDict.items():
+            self.defaults[name] = info.default
+        for name in cls.ObjectDict:
+            self.defaults[name] = None
+
+        self.paramlists = [(name, info.minsize, info.maxsize)
+                           for name, info in cls.ParamListDict.items()]
+        self.objectlists = [(name, info.minsize, info.maxsize)
+                            for name, info in cls.ObjectListDict.items()]
+        return
+
+
+def memberSizes(cls):
+    """Get the sizes of the member dicts of a class.
+
+    cls -- a BaseClass subclass
+    return: a tuple of 4 integers
+    """
+    return (len(cls.ParamDict), len(cls.ParamListDict), len(cls.ObjectDict),
+            len(cls.ObjectListDict))
+
+
+# class -> Members
+member_tables = {}
+
+
+def getMembers(cls):
+    """Get the table of the members of a class. The table is made again when
+    a member is added to the dicts of the class, e.g. by the module of the
+    class after its definition or by an object in its __init__.
+
+    cls -- a BaseClass subclass
+    return: a Members object
+    """
+    members = member_tables.get(cls)
+    if members is None or members.sizes != memberSizes(cls):
+        members = Members(cls)
+        member_tables[cls] = members
+    return members
+
+
 class BaseClass:
     """BaseClass defines the basic parameters and objects(i.e., subclasses in the 
     SubClassDict and ObjectListDict). The definition can be used for initializing
@@ -34,6 +108,12 @@ class BaseClass:
     ObjectDict  = {}
     ObjectListDict = {}
 
+    # number of set() calls on the objects of a tree, and of the ones made
+    # by Constraint.setRefinedValue(), kept on the root; lets a writer cache
+    # tell whether anything but Constraint values and code words has changed
+    _revision = 0
+    _refined = 0
+
     def __init__(self, parent=None):
         """
         Initialization.
@@ -43,17 +123,14 @@ class BaseClass:
         # parent and key record the location of the object
         self.parent = parent
 
-        for name,info in self.ParamDict.items():
-            self.__dict__[name] = info.default
+        members = getMembers(self.__class__)
+        self.__dict__.update(members.defaults)
 
-        for name,info in self.ParamListDict.items():
-            self.__dict__[name] = ParamList(self, info.minsize, info.maxsize, name)
+        for name, minsize, maxsize in members.paramlists:
+            self.__dict__[name] = ParamList(self, minsize, maxsize, name)
 
-        for name in self.ObjectDict.keys():
-            self.__dict__[name] = None
-
-        for name,info in self.ObjectListDict.items():
-            self.__dict__[name] = ObjectList(self, info.minsize, info.maxsize, name)
+        for name, minsize, maxsize in members.objectlists:
+            self.__dict__[name] = ObjectList(self, minsize, maxsize, name)
 
         return
 
@@ -283,6 +360,21 @@ class BaseClass:
         return range(start, stop, step)     
         
 
+    def _kind(self, name):
+        """Get the kind of a member.
+
+        name -- the member name
+        return: PARAM, PARAMLIST, OBJECT, OBJECTLIST or None
+        """
+        members = member_tables.get(self.__class__)
+        if members is not None:
+            kind = members.kinds.get(name)
+            if kind is not None:
+                return kind
+        # no table yet, or a member added after it was made
+        return getMembers(self.__class__).kinds.get(name)
+
+
     def get(self, name, index=None):
         """Get a value
 
@@ -293,79 +385,64 @@ class BaseClass:
                 2. ObjectDict: return the RietveldClass object
                 3. ObjectListDict: return the RietveldClass object(s)
         """
-        if name in self.ParamDict:
+        kind = self._kind(name)
+        if kind == PARAM:
             if index is not None:
                 raise RietError('The parameter "%s" is not a list.'%name)
             value = self.__dict__[name]
-        elif name in self.ParamListDict:
+        elif kind == PARAMLIST:
             value = self.__dict__[name].get(index)
-        elif name in self.ObjectDict:
+        elif kind == OBJECT:
             if index is not None:
                 raise RietError('The object "%s" is not a list.'%name)
             value = self.__dict__[name]
-        elif name in self.ObjectListDict:
+        elif kind == OBJECTLIST:
             value = self.__dict__[name].get(index)
         else:
             errmsg = "Class '%-15s' does not have '%-15s'"%\
                      (self.__class__.__name__, str(name))
             raise RietError(errmsg)
 
-        # begin python 2 -> python 2 + 3
-        import sys
-        v  = value
-        if sys.version_info[0] >= 3:
-            if isinstance(v,bytes):
-                v = value.decode("utf-8")
-        # return value
-        return v
-        #end 
+        # the strings are stored as bytes, return them as str
+        if isinstance(value, bytes):
+            return value.decode("utf-8")
+        return value
 
 
     def set(self, name, value, index=None):
-        import sys
         """Set the value for a member.
 
         name  --  a key in ParamDict, ParamListDict, ObjectDict or ObjectListDict
         value --  the value/object to be set
         index --  only for ObjectListDict object, to give the location of the object
         """
-        if name in self.ParamDict:
+        self.getRoot()._revision += 1
+        kind = self._kind(name)
+        # the values are put in __dict__: a parameter may have the name of a
+        # read-only property of the class, e.g. Variable.name
+        if kind == PARAM:
             if index is not None:
                 raise RietError('The parameter "%s" is not a list.'%name)
-
-            # begin python 2 - > python 2 + 3
-            # To resolve the conflict between Python 2 and Python 3, Python 3 imposes stricter restrictions on attributes, prohibiting the use of setters to access read-only attributes and preventing conflicts in variable names.
-            # setattr(self, name, self.ParamDict[name].convert(value))
-            if sys.version_info[0] >= 3 and hasattr(type(self), name):
-                self.__dict__[name] = self.ParamDict[name].convert(value)  # Python 3
-            else:
-                setattr(self, name, self.ParamDict[name].convert(value))  # Python 2
-            # end
-
-        elif name in self.ParamListDict:
-            getattr(self, name).set(self.ParamListDict[name].convert(value),index)
-        elif name in self.ObjectDict:
+            self.__dict__[name] = self.ParamDict[name].convert(value)
+        elif kind == PARAMLIST:
+            self.__dict__[name].set(self.ParamListDict[name].convert(value),index)
+        elif kind == OBJECT:
             if index is not None:
                 raise RietError('The object "%s" is not a list.'%name)
             self.ObjectDict[name].validate(value)
-            object = getattr(self, name)
+            object = self.__dict__[name]
             if object is not None:
                 object.clear()
-            
-            # setattr(self, name, value)
-            if sys.version_info[0] >= 3 and hasattr(type(self), name):
-                self.__dict__[name] = value  # Python 3
-            else:
-                setattr(self, name, value)  # Python 2
+            self.__dict__[name] = value
 
             value.parent = self
             value.key = name
             _param_indices = getattr(self.getRoot(), '_param_indices',  None)
             if  _param_indices is not None:
                 value.updateParamIndices(_param_indices)
-        elif name in self.ObjectListDict:
+        elif kind == OBJECTLIST:
             self.ObjectListDict[name].validate(value)
-            getattr(self, name).set(value, index)
+            self.__dict__[name].set(value, index)
             value.parent = self
             value.key = name
             _param_indices = getattr(self.getRoot(), '_param_indices',  None)
@@ -413,6 +490,16 @@ class BaseClass:
         return rvalue
 
     
+    def getRevision(self):
+        '''Get the revision of the tree.
+
+        return: the number of set() calls on the objects of the tree,
+                but the ones of Constraint.setRefinedValue()
+        '''
+        root = self.getRoot()
+        return root._revision - root._refined
+
+
     def getRoot(self):
         '''Get the root object.
         
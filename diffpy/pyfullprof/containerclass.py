@@ -30,6 +30,8 @@ class ObjectList(object):
     key -- the corresponding key in its parent object
     _list -- the data storate, a list
     """
+    __slots__ = ["parent", "min", "max", "key", "_list"]
+
     def __init__(self, parent, min, max, key):
         """Initialization.
         
@@ -226,6 +228,8 @@ class ParamList(object):
     key -- the corresponding key in its parent class
     _list -- the data storate, a list
     '''
+    __slots__ = ["parent", "min", "max", "key", "_list"]
+
     def __init__(self, parent, min, max, key):
         """Initialization.
         
@@ -26,6 +26,7 @@ __id__ = "$Id: fit.py 6843 2013-01-09 22:14:20Z juhas $"
 import os
 import glob
 import shutil
+import numpy
 
 from diffpy.pyfullprof.refine import Refine
 from diffpy.pyfullprof.rietveldclass import RietveldClass
@@ -202,6 +203,49 @@ class Fit(RietveldClass):
     def getParamList(self):
         return self.Refine.constraints
 
+    def snapshot(self):
+        """Save the numeric state of the fit: the value, real value, code word
+        and sigma of every constraint, in the order of Refine.constraints.
+
+        return: a flat numpy array of 4*n floats, n the number of constraints
+        """
+        constraints = self.get("Refine").constraints
+        n = len(constraints)
+        state = numpy.empty(4*n)
+        state[:n]    = [c.getValue() for c in constraints]
+        state[n:2*n] = [c.realvalue for c in constraints]
+        state[2*n:3*n] = [c.codeWord for c in constraints]
+        state[3*n:]  = [c.sigma for c in constraints]
+        return state
+
+    def restore(self, state):
+        """Set a state saved by snapshot() back. The state may come from
+        another fit of the same structure, e.g. a copy of this one, so one
+        tree can take any number of states in turn. Only the values which
+        differ are set into the tree.
+
+        state -- a numpy array made by snapshot()
+        """
+        constraints = self.get("Refine").constraints
+        n = len(constraints)
+        if len(state) != 4*n:
+            raise RietError("A state of %i values does not fit a fit of %i constraints."
+                            %(len(state), n))
+
+        # 1. the values in the tree
+        values = state[:n].tolist()
+        for i in range(n):
+            if constraints[i].getValue() != values[i]:
+                constraints[i].setRefinedValue(values[i])
+
+        # 2. the numbers of the constraints
+        for c, realvalue, codeword, sigma in zip(constraints, state[n:2*n].tolist(),
+                                                 state[2*n:3*n].tolist(), state[3*n:].tolist()):
+            c.realvalue = realvalue
+            c.codeWord = codeword
+            c.sigma = sigma
+        return
+
     def updateFit(self, newfit):
         """Update self with the new fit, which is the resultant Fit instance.
         
@@ -20,13 +20,201 @@ from __future__ import print_function
 
 __id__ = "$Id: fpoutputfileparsers.py 6843 2013-01-09 22:14:20Z juhas $"
 
+import os
+import re
+import mmap
+import numpy
 
-def prfParser(prffname):
+
+def prfParser(prffname, usemmap=False):
     """
     parse Fullprof output .prf file as the plots of 
     2theta/TOF - (Yobs, Ycal, Yobs-Ycal)
     reflection list
 
+    same as prfParserLines, but the diffraction pattern is converted by
+    numpy in one call instead of line by line
+
+    Arguments:
+    prffname    :   string, name of the prf file
+    usemmap     :   bool, map the file in memory instead of reading it
+
+    return  --  2-tuple (2-D array)
+                reflection list
+                X variable
+                excluded region list
+    """
+    # 1. import file
+    prffile = open(prffname, "rb")
+    if usemmap is True and os.path.getsize(prffname) > 0:
+        buf = mmap.mmap(prffile.fileno(), 0, access=mmap.ACCESS_READ)
+    else:
+        buf = prffile.read()
+    prffile.close()
+
+    # 1.1 start and end of every line
+    raw  = numpy.frombuffer(buf, dtype=numpy.uint8)
+    ends = numpy.flatnonzero(raw == 10)
+    del raw
+    if len(buf) > 0 and buf[-1:] != b"\n":
+        ends = numpy.append(ends, len(buf))
+    starts = numpy.concatenate(([0], ends[:-1]+1))
+
+    def getline(lineindex):
+        return buf[starts[lineindex]:ends[lineindex]].decode("latin-1")
+
+    # 2. determine the information
+    patpointnum = -1
+    phasenumber = -1
+    reflpeaknum = -1
+    infoline    = -1
+
+    # 2.1 determine information line
+    pos = buf.find(b"Ycal")
+    while pos >= 0:
+        lineindex = int(numpy.searchsorted(ends, pos))
+        line = getline(lineindex)
+        if line.count("Yobs") == 2 and line.count("Ycal") == 2:
+            infoline = lineindex
+            break
+        pos = buf.find(b"Ycal", ends[lineindex])
+    if infoline < 0:
+        errmsg = "prfParser():  Unable to find line ... Yobs Ycal Yobs-Ycal in File %-10s"% (prffname)
+        raise NotImplementedError(errmsg)
+    lines = [getline(lineindex) for lineindex in range(infoline+1)]
+
+    # 2.2 determine the X-axis variable
+    diffunit = lines[infoline].strip().split()[0]
+
+    # 2.3 excluded region
+    excludedregions = []
+    for lineindex in range(infoline-1, -1, -1):
+        line  = lines[lineindex]
+        terms = line.strip().split()
+        if len(terms) == 2:
+            st = float(terms[0])
+            ed = float(terms[1])
+            excludedregions.append( (st, ed) )
+        else:
+            break
+
+    # 2.4.1 reflection list info, inherit line and terms from broken loop above
+    refterms = terms
+
+    # 2.5 diffraction pattern info
+    lineindex = lineindex - 1
+    terms     = lines[lineindex].strip().split()
+    phasenumber = int(terms[0])
+    patpointnum = int(terms[1])
+    
+    # 2.4.2
+    if len(refterms) != phasenumber*2+1:
+        errmsg = "prfParser():  Unrecognizable line:  should be < Reflection-Number, 0, 1>, now %-30s"% (line)
+        raise NotImplementedError(errmsg)
+    reflpeaknum = 0
+    for pindex in range(phasenumber):
+        reflpeaknum += int(refterms[pindex])
+
+    # 3. determine where the reflection list is
+    refmode = -1
+    # a) search in the diffraction line
+    stline = infoline+1
+    terms = getline(stline).split()
+    if len(terms) > 5 and getline(stline).count(")") == 1:
+        # good line is found
+        refmode = 1
+    else:
+        stline = stline+patpointnum
+        terms = getline(stline).split()
+        if len(terms) > 5 and getline(stline).count(")") == 1:
+            # good line is found
+            refmode = 2
+    edline = stline+reflpeaknum-1
+
+    # 4. read diffraction, the lines with a reflection are read one by one
+    diffpatternarray = numpy.zeros((4, patpointnum))
+    headnum = 0
+    if refmode == 1:
+        headnum = min(reflpeaknum, patpointnum)
+    if headnum < patpointnum:
+        block = buf[starts[infoline+1+headnum]:ends[infoline+patpointnum]]
+        columns = _prfColumns(block, patpointnum-headnum)
+        if columns is None:
+            headnum = patpointnum
+        else:
+            diffpatternarray[:, headnum:] = columns
+    for pindex in range(headnum):
+        diffpatternarray[:, pindex] = _prfPoint(getline(infoline+1+pindex))
+
+    # 5. read reflection
+    reflections = []
+    if refmode == -1:
+        # cannot find reflection
+        wmsg = "pcrParser()  Warning:  Reflection List Cannot Be Found" 
+        print (wmsg)
+
+    else:
+        if refmode == 1:
+            stcol = 5
+        else:
+            stcol = 0
+        for lineindex in range(stline, edline+1):
+            terms = getline(lineindex).split()
+            reflections.append(float(terms[stcol]))
+
+    if isinstance(buf, mmap.mmap):
+        buf.close()
+
+    # 6.  organize return
+    reflectionarray  = numpy.array(reflections)
+
+    return ( (patpointnum, reflpeaknum, diffpatternarray, reflectionarray, diffunit, excludedregions) )
+
+
+def _prfColumns(block, pointnum):
+    """
+    convert the diffraction lines of a prf file in one numpy call
+
+    return  --  2-D array (4 x pointnum) of X, Yobs, Ycal, Yobs-Ycal, 
+                None if a line is not numbers (it is read by _prfPoint)
+    """
+    import io
+    try:
+        values = numpy.loadtxt(io.BytesIO(block), usecols=(0, 1, 2, 3),
+                               comments=None, ndmin=2)
+    except ValueError as err:
+        return None
+    if values.shape[0] != pointnum:
+        return None
+
+    return values.T
+
+
+def _prfPoint(line):
+    """
+    X, Yobs, Ycal, Yobs-Ycal of a diffraction line of a prf file
+    """
+    terms = line.split()
+    x     = float(terms[0])
+    yobs  = float(terms[1])
+    try:
+        ycal  = float(terms[2])
+    except ValueError as err:
+        ycal  = 0.0
+    try:
+        ydif  = float(terms[3])
+    except ValueError as err:
+        ydif  = 0.0
+
+    return (x, yobs, ycal, ydif)
+
+
+def prfParserLines(prffname):
+    """
+    parse Fullprof output .prf file as the plots of 
+    2theta/TOF - (Yobs, Ycal, Yobs-Ycal)
+    reflection list, line by line
+
     return  --  2-tuple (2-D array)
                 reflection list
                 X variable
@@ -287,6 +475,67 @@ def parseHKLn(fullname, phaseno, singlepattern, patno, hklrange):
     return reflectdict
 
 
+class FPOutFileIndex:
+    """
+    Index of a Fullprof .out file, built from one read of the file.
+    It is shared by FPOutFileParser, FPUncertainty, outfilecheckerror.check
+    and wphase.get_volume, so that the file is read once for all of them
+    """
+    # error flags searched in the whole file
+    Flags           = ["Singular matrix", "NO REFLECTIONS FOUND", "Strong DIVERGENCE",
+                       "Asymmetry parameters usage invalid", "Rwp"]
+    VolumeRe        = re.compile(r'Direct Cell Volume =\s*\w*\d')
+    UncertaintyFlag = "SYMBOLIC NAMES AND FINAL VALUES AND SIGMA OF REFINED PARAMETERS"
+    ParameterFlag   = "Parameter number"
+
+    def __init__(self, outfilename):
+        """
+        initialization
+
+        Arguments:
+        - outfilename   :   str, .out file
+        """
+        outfile = open(outfilename, "r")
+        text    = outfile.read()
+        outfile.close()
+
+        # 1. error flags and cell volumes
+        self._flags = {}
+        for flag in self.Flags:
+            self._flags[flag] = text.find(flag) != -1
+        self.volumes = []
+        for volume in self.VolumeRe.findall(text):
+            self.volumes.append(float(volume.split(' ')[-1]))
+
+        # 2. the lines starting with "=", as the cycle blocks are made of them
+        self.lines = [line for line in map(str.strip, text.splitlines()) if line[:1] == "="]
+
+        # 3. "Parameter number" lines of the final values and sigmas, till "=>"
+        self.uncertaintyLines = []
+        pos = text.find(self.UncertaintyFlag)
+        self.uncertaintyFound = pos != -1
+        if self.uncertaintyFound is True:
+            for line in text[pos:].splitlines()[1:]:
+                cline = line.strip()
+                if cline[:2] == "=>":
+                    break
+                if cline.count(self.ParameterFlag) > 0:
+                    self.uncertaintyLines.append(cline)
+
+        return
+
+
+    def hasFlag(self, flag):
+        """
+        Whether an error flag of FPOutFileIndex.Flags is in the file
+
+        Return  :   bool
+        """
+        return self._flags[flag]
+
+# END-CLASS FPOutFileIndex
+
+
 class FPOutFileParser:
     """
     Parser class to read and interpret a Fullprof refine.out file
@@ -299,15 +548,17 @@ class FPOutFileParser:
     ErrorFlag1      = "Singular matrix"
     ErrorFlag2      = "NO REFLECTIONS FOUND"
 
-    def __init__(self, thisfit, outfilename):
+    def __init__(self, thisfit, outfilename, outindex=None):
         """
         initialization
 
         Arguments:
         - thisfit       :   PyFullProf.Fit
         - outfilename   :   str, .out file
+        - outindex      :   FPOutFileIndex of the .out file, None to read it
         """
         self._myFit = thisfit
+        self._outIndex = outindex
 
         # 2. init
         #xpc change the code begin
@@ -354,35 +605,28 @@ class FPOutFileParser:
         Return          :   None
         """
         # 1. get file 
-        outfile = open(outfilename, "r")
-        rlines  = outfile.readlines()
-        outfile.seek(0)
-        xpc_context=outfile.read()
+        if self._outIndex is None:
+            self._outIndex = FPOutFileIndex(outfilename)
         XPC_ErrorFlag3="Strong DIVERGENCE"
-        outfile.close()
 
-        # 2. filter
-        lines = []
-        for line in rlines:
-            cleanline = line.strip()
-            if cleanline != "" and cleanline[0] == "=":
-                lines.append(cleanline)
+        # 2. filter: the lines starting with "="
+        lines = self._outIndex.lines
         self._lines = lines
 
         # 3. check last line: blocks or no blocks
         lastline  = self._lines[-1]
         errorcode = 0
-        if lastline.count(self.ErrorFlag1) >= 1 or xpc_context.rfind(self.ErrorFlag1)!=-1:
+        if lastline.count(self.ErrorFlag1) >= 1 or self._outIndex.hasFlag(self.ErrorFlag1):
             # Singular matrix
             self._error  = True
             self._errmsg = "Singular matrix"
             errorcode    = -1
-        elif lastline.count(self.ErrorFlag2) >= 1 or xpc_context.rfind(self.ErrorFlag1)!=-1:
+        elif lastline.count(self.ErrorFlag2) >= 1:
             # NO REFLECTIONS FOUND
             self._error   = True
             self._errmsg = "No Reflections Found"
             errorcode    = -3
-        elif xpc_context.rfind(XPC_ErrorFlag3)!=-1:
+        elif self._outIndex.hasFlag(XPC_ErrorFlag3):
             self._error=True
             self._errmsg= XPC_ErrorFlag3
             errorcode = -11
@@ -457,6 +701,15 @@ class FPOutFileParser:
         return
 
 
+    def getOutIndex(self):
+        """
+        Get the FPOutFileIndex of the .out file
+
+        Return  :   FPOutFileIndex
+        """
+        return self._outIndex
+
+
     def getNumCycles(self):
         """
         Get the number of least square refinement cycles
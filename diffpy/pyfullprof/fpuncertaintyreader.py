@@ -22,6 +22,7 @@ from __future__ import print_function
 __id__="$Id: fpuncertaintyreader.py 6843 2013-01-09 22:14:20Z juhas $"
 
 from diffpy.pyfullprof.exception import RietError
+from diffpy.pyfullprof.fpoutputfileparsers import FPOutFileIndex
 
 class FPUncertainty(object):
     """
@@ -70,9 +71,21 @@ class FPUncertainty(object):
                     "W-Cagl":   "W",
                     "U-Cagl":   "U",
                     "V-Cagl":   "V",
+                    "X-tan" :   "X",
+                    "Y-cos" :   "Y",
+                    "Asym1" :   "PA1",
+                    "Asym2" :   "PA2",
+                    "Asym3" :   "PA3",
+                    "Asym4" :   "PA4",
+                    "bet11" :   "B11",
+                    "bet22" :   "B22",
+                    "bet33" :   "B33",
+                    "bet12" :   "B12",
+                    "bet13" :   "B13",
+                    "bet23" :   "B23",
                     }
 
-    def __init__(self, filename, filetype="out"):
+    def __init__(self, filename, filetype="out", outindex=None):
         """
         initialization:
 
@@ -80,8 +93,10 @@ class FPUncertainty(object):
         - filename  :   str
         - filetype  :   str, "out" for .out file
                              "sum" for .sum file
+        - outindex  :   FPOutFileIndex of the .out file, None to read it
         """
         self._ParameterList = []
+        self._outindex = outindex
 
         if filetype == "out":
             self._outfilename = filename
@@ -117,31 +132,15 @@ class FPUncertainty(object):
 
         Return  :   None
         """
-        lineslist = self.readFile(self._outfilename)
+        if self._outindex is None:
+            self._outindex = FPOutFileIndex(self._outfilename)
 
         # 1. File Flag Line
-        startlinenum = -1
-        for lindex in range( len(lineslist) ):
-            if lineslist[lindex].count(self._FLAG2) == 1:
-                startlinenum = lindex
-                break
-       
-        if startlinenum < 0:
+        if self._outindex.uncertaintyFound is False:
             raise RietError()
         
-        # 2. Get Informative Lines:
-        infolineslist = []
-        for lindex in range( startlinenum+1, len(lineslist) ):
-            candline = lineslist[lindex]
-            # 1. Find stop line
-            if candline[0]=="=" and candline[1]==">":
-                break
-
-            # 2. Judge
-            if candline.count(self._FLAG3) > 0:
-                infolineslist.append(candline)
-
-        # LOOP-OVER: for lindex in range( startlinenum+1, len(lineslist) )
+        # 2. Get Informative Lines: the "Parameter number" lines after _FLAG2
+        infolineslist = self._outindex.uncertaintyLines
 
         # 3. Parse to standard database
         for line in infolineslist:
@@ -214,110 +213,171 @@ class FPUncertainty(object):
 
         Return  :   None
         """
-        import diffpy.pyfullprof.pattern as PTN
+        for nameinfotuple, val, sig in self._ParameterList:
+            constraint = self.locateConstraint(myfit, nameinfotuple)
+            if constraint is not None:
+                constraint.sigma = sig
+
+        # LOOP-OVER: for nameinfotuple, val, sig in self._ParameterList
+
+        return
+
 
+    def exportValuesToFit(self, myfit, constraints=None):
+        """
+        Export the refined values and sigmas to the constraints of a Fit
+        object, in place of reading the new pcr file again.  Every refined
+        parameter must be found once and only once, nothing is changed
+        otherwise.
+
+        Argument:
+        - myfit         :   diffpy.pyfullprof.Fit instance
+        - constraints   :   list of Constraint, if given, the refined 
+                            parameters must be exactly these constraints
+
+        Return  :   number of the updated constraints
+        """
+        updated = []
         for nameinfotuple, val, sig in self._ParameterList:
-        
-            # 1. From the suffix of the name, determine if the parameter
-            #    belongs to pattern, phase, or contribution
+            constraint = self.locateConstraint(myfit, nameinfotuple)
+            if constraint is None:
+                raise RietError("Parameter %s can not be found in the fit object."%str(nameinfotuple))
+            if constraint in updated:
+                raise RietError("Parameter %s is refined twice."%str(nameinfotuple))
+            updated.append(constraint)
+
+        if constraints is not None:
+            if len(constraints) != len(updated):
+                raise RietError("%i parameters are refined, %i expected."%(len(updated), len(constraints)))
+            for constraint in constraints:
+                if constraint not in updated:
+                    raise RietError("Parameter %s is not refined."%constraint.path)
+
+        for constraint, (nameinfotuple, val, sig) in zip(updated, self._ParameterList):
+            constraint.setRefinedValue(val)
+            constraint.sigma = sig
+
+        return len(updated)
+
+
+    def locateConstraint(self, myfit, nameinfotuple):
+        """
+        Find the constraint of a parsed symbolic name
+
+        Argument:
+        - myfit         :   diffpy.pyfullprof.Fit instance
+        - nameinfotuple :   list, returned by parseNameOutFile
+
+        Return  :   Constraint instance or None
+        """
+        import diffpy.pyfullprof.pattern as PTN
+
+        # 1. From the suffix of the name, determine if the parameter
+        #    belongs to pattern, phase, or contribution
+        ispattern = False
+        isphase = False
+        iscontribution = False
+        if nameinfotuple.count("pat") > 0:
+            ispattern = True
+        if nameinfotuple.count("ph") > 0:
+            isphase = True
+        if ispattern and isphase:
+            iscontribution = True
             ispattern = False
             isphase = False
-            iscontribution = False
-            if nameinfotuple.count("pat") > 0:
-                ispattern = True
-            if nameinfotuple.count("ph") > 0:
-                isphase = True
-            if ispattern and isphase:
-                iscontribution = True
-                ispattern = False
-                isphase = False
-
-            # 2. Get parameter and its index
-            parname = None
-            index = None
-
-            if ispattern:
-                # background
-                patnum  = nameinfotuple[1]
-                pattern = myfit.get("Pattern")[patnum-1]
-                if nameinfotuple[-1] == "Bck":
-                    rietobj = pattern.get("Background")
-                    bcknum  = nameinfotuple[-2]+1
-                    if isinstance(rietobj, PTN.BackgroundPolynomial):
-                        parname = "BACK"
-                        index = bcknum-1
-                    elif isinstance(rietobj, PTN.BackgroundUserDefined):
-                        parname = "BCK"
-                        index = bcknum-1
-                    else:
-                        errmsg = "1045-1:  Object Instance %-10s Unrecoganizable"% (rietobj.__class__.__name__)
-                        print(errmsg)  
-                else:
-                    iname = nameinfotuple[-1]
-                    if iname in FPUncertainty._NAMEMAPDICT:
-                        iname = FPUncertainty._NAMEMAPDICT[iname]
-                    rietobj, parname = pattern.locateParameter(iname)
-            elif isphase:
-                phanum = nameinfotuple[1]
-                phase  = myfit.get("Phase")[phanum-1]
-                # a. get all atom's name
-                atomindexmap  = {}
-                for atom in phase.get("Atom"):
-                    atomname = atom.get("Name")
-                    atomindexmap[atomname] = atom
-
-                # b. see whether belonging to Atom's property
-                atomnameslist = atomindexmap.keys()
-                if atomnameslist.count(nameinfotuple[-2]) == 1:
-                    atom = atomindexmap[nameinfotuple[-2]]
-                    rietobj, parname = atom.locateParameter(nameinfotuple[-1])
-
-                # c. if not atom's
-                if rietobj is None:
-                    iname = nameinfotuple[-1]
-                    if iname in FPUncertainty._NAMEMAPDICT:
-                        iname = FPUncertainty._NAMEMAPDICT[iname]
-                    rietobj, parname = phase.locateParameter(iname)
-            elif iscontribution:
-                patnum  = nameinfotuple[1]
-                phanum  = nameinfotuple[3]
-                pattern = myfit.get("Pattern")[patnum-1]
-                phase   = myfit.get("Phase")[phanum-1]
-                contrib = myfit.getContribution(pattern, phase)
-                # a. Lattice
-                if nameinfotuple[-1] == "Cell":
-                    rietobj, parname = phase.locateParameter(nameinfotuple[-2])
+
+        # 2. Get parameter and its index
+        rietobj = None
+        parname = None
+        index = None
+
+        if ispattern:
+            # background
+            patnum  = nameinfotuple[1]
+            pattern = myfit.get("Pattern")[patnum-1]
+            if nameinfotuple[-1] == "Bck":
+                rietobj = pattern.get("Background")
+                bcknum  = nameinfotuple[-2]+1
+                if isinstance(rietobj, PTN.BackgroundPolynomial):
+                    parname = "BACK"
+                    index = bcknum-1
+                elif isinstance(rietobj, PTN.BackgroundUserDefined):
+                    parname = "BCK"
+                    index = bcknum-1
                 else:
-                    iname = nameinfotuple[-1]
-                    if iname in FPUncertainty._NAMEMAPDICT:
-                        iname = FPUncertainty._NAMEMAPDICT[iname]
-                    rietobj, parname = contrib.locateParameter(iname)
+                    errmsg = "1045-1:  Object Instance %-10s Unrecoganizable"% (rietobj.__class__.__name__)
+                    print(errmsg)  
             else:
-                raise RietError("Parameter %s does not belong to a known case."%str(nameinfotuple))
-            
-            if parname is None:
-                rstring = "%-20s ispat = %-10s ispha = %-10s iscon = %-10s"% \
-                    (nameinfotuple, ispat, ispha, iscon)
-                print("# 1045-Warning:  Implement this case! %-50s"% (rstring))
+                iname = nameinfotuple[-1]
+                if iname in FPUncertainty._NAMEMAPDICT:
+                    iname = FPUncertainty._NAMEMAPDICT[iname]
+                rietobj, parname = pattern.locateParameter(iname)
+        elif isphase:
+            phanum = nameinfotuple[1]
+            phase  = myfit.get("Phase")[phanum-1]
+            # a. get all atom's name
+            atomindexmap  = {}
+            for atom in phase.get("Atom"):
+                atomname = atom.get("Name")
+                atomindexmap[atomname] = atom
+
+            # b. see whether belonging to Atom's property
+            if nameinfotuple[-2] in atomindexmap:
+                atom = atomindexmap[nameinfotuple[-2]]
+                iname = nameinfotuple[-1]
+                if iname in FPUncertainty._NAMEMAPDICT:
+                    iname = FPUncertainty._NAMEMAPDICT[iname]
+                rietobj, parname = atom.locateParameter(iname)
+
+            # c. if not atom's
+            if rietobj is None:
+                iname = nameinfotuple[-1]
+                if iname in FPUncertainty._NAMEMAPDICT:
+                    iname = FPUncertainty._NAMEMAPDICT[iname]
+                rietobj, parname = phase.locateParameter(iname)
+        elif iscontribution:
+            patnum  = nameinfotuple[1]
+            phanum  = nameinfotuple[3]
+            pattern = myfit.get("Pattern")[patnum-1]
+            phase   = myfit.get("Phase")[phanum-1]
+            contrib = myfit.getContribution(pattern, phase)
+            # a. Lattice
+            if nameinfotuple[-1] == "Cell":
+                rietobj, parname = phase.locateParameter(nameinfotuple[-2])
             else:
-                if rietobj is None:
-                    raise RietError("Parameter %s can not be found in the fit object."%parname)
-                constraint = rietobj.getConstraint(parname, index)
-                if constraint:
-                    constraint.sigma = sig
-                else:
-                    raise RietError("No constraint is bound to the parameter '%s'"%parname)
-            
-            if 0:   # 1501
-                print("1501:Par = %-10s  Val = %-15s  vs. input Val = %-15s  Sig = %-15s"% \
-                    (parname, rietobj.get(parname).value(), val, sig))
-            # END-DEBUG
-
-        # LOOP-OVER: for nameinfotuple, val, sig in self._ParameterList
-
-        return
+                iname = nameinfotuple[-1]
+                if iname in FPUncertainty._NAMEMAPDICT:
+                    iname = FPUncertainty._NAMEMAPDICT[iname]
+                rietobj, parname = contrib.locateParameter(iname)
+        else:
+            raise RietError("Parameter %s does not belong to a known case."%str(nameinfotuple))
+        
+        if parname is None:
+            rstring = "%-20s ispat = %-10s ispha = %-10s iscon = %-10s"% \
+                (nameinfotuple, ispattern, isphase, iscontribution)
+            print("# 1045-Warning:  Implement this case! %-50s"% (rstring))
+            return None
+
+        if rietobj is None:
+            raise RietError("Parameter %s can not be found in the fit object."%parname)
+
+        if isinstance(rietobj, list):
+            # several owners of the name: take the only one bound to a constraint
+            constraints = []
+            for obj, name in zip(rietobj, parname):
+                if obj.getConstraint(name, index):
+                    constraints.append(obj.getConstraint(name, index))
+            if len(constraints) != 1:
+                raise RietError("Parameter %s is not unique in the fit object."%str(nameinfotuple))
+            return constraints[0]
+
+        constraint = rietobj.getConstraint(parname, index)
+        if not constraint:
+            raise RietError("No constraint is bound to the parameter '%s'"%parname)
+
+        return constraint
     
-    # END-DEF exportToFit(self, myfit)
+    # END-DEF locateConstraint(self, myfit, nameinfotuple)
 
     def readFile(self, fname):  
         """
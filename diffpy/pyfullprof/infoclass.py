@@ -15,6 +15,7 @@
 
 __id__ = "$Id: infoclass.py 6843 2013-01-09 22:14:20Z juhas $"
 
+import sys
 import numpy
 
 class ParameterInfo:
@@ -397,8 +398,6 @@ class StringInfo(ParameterInfo):
         return: the converted value
         raise: ValueError if the object has the wrong type
         """
-        import sys
-
         # begin python 2 - > python 2 + 3
         if sys.version_info.major >= 3:
             if isinstance(value, str):
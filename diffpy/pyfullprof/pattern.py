@@ -28,6 +28,7 @@ from diffpy.pyfullprof.infoclass import StringInfo
 from diffpy.pyfullprof.infoclass import ObjectInfo
 from diffpy.pyfullprof.utilfunction import verifyType
 from diffpy.pyfullprof.exception import RietError
+from diffpy.pyfullprof.fpoutputfileparsers import prfParser
 
 class Pattern(RietveldClass):
     """
@@ -402,14 +403,26 @@ class Pattern(RietveldClass):
         """
         # import file
         try:
-            pfile = open(prffname, "r")
-            lines = pfile.readlines()
-            pfile.close()
+            prfinfo = prfParser(prffname)
         except IOError as err:
             errmsg = "Prf File: %-15s Cannot be Located"%(prffname)
             print("pyfullprof.Pattern.importPrfFile(): %40s"%(errmsg))
             rdict = {}
             return rdict
+        except NotImplementedError as err:
+            # not a prf file with title line ... Yobs Ycal Yobs-Ycal
+            prfinfo = None
+
+        if prfinfo is not None:
+            diffpatternarray = prfinfo[2]
+            self._xobs = diffpatternarray[0].tolist()
+            self._yobs = diffpatternarray[1].tolist()
+            self._ycal = diffpatternarray[2].tolist()
+            return
+
+        pfile = open(prffname, "r")
+        lines = pfile.readlines()
+        pfile.close()
 
         # read information
         contents = []
@@ -28,6 +28,11 @@ from diffpy.pyfullprof.fit import Fit
 from diffpy.pyfullprof.stringop import StringOP
 from diffpy.pyfullprof.exception import RietPCRError, RietError
 import diffpy.pyfullprof.warning as warning
+import pickle
+import threading
+
+# the PcrTemplate recorded by the current thread's ImportFitFromFullProf, if any
+_recording = threading.local()
 
 
 def toFloat(fnumber):
@@ -48,6 +53,9 @@ def toFloat(fnumber):
             str(fnumber), str(err))
         raise RietPCRError(errmsg)
 
+    template = getattr(_recording, "template", None)
+    if template is not None:
+        template.convert(fnumber, rnumber)
     return rnumber
 
 
@@ -63,10 +71,11 @@ class ImportFitFromFullProf:
     """ Import an existing Fit from FullProf PCR file
     """
 
-    def __init__(self, pcrfname):
+    def __init__(self, pcrfname, text=None):
         # print("this is pcr file "+pcrfname)
         self.Name = ""
         self.PCR = pcrfname
+        self.Text = text        # content of the file, None to read the file
         self.Style = "new"      # default to new style
         self.LineContent = {}   # dictionary
         self.LineNumber = 0
@@ -141,6 +150,26 @@ class ImportFitFromFullProf:
 
         return True
 
+    def ImportTemplate(self, fit, template):
+        """
+        Import a FullProf PCR file as ImportFile() and record the
+        PcrTemplate of it
+
+        arguement:
+        - fit       :   pyfullprof.Fit instance
+        - template  :   PcrTemplate instance, empty
+
+        return  --  as ImportFile()
+        """
+        _recording.template = template
+        try:
+            goodimport = self.ImportFile(fit)
+        finally:
+            _recording.template = None
+        if goodimport is True:
+            template.record(self, fit)
+        return goodimport
+
     # ---------  Internal Function  -------------#
 
     def FilterFile(self):
@@ -149,9 +178,12 @@ class ImportFitFromFullProf:
         """
         # print "File Filter:"
         try:
-            pcrfile = open(self.PCR, 'r', 1)
-            original = pcrfile.readlines()
-            pcrfile.close()
+            if self.Text is None:
+                pcrfile = open(self.PCR, 'r', 1)
+                original = pcrfile.readlines()
+                pcrfile.close()
+            else:
+                original = self.Text.splitlines(True)
         except IOError as err:
             errmsg = "Fails to read file %-10s\n" % (self.PCR)
             errmsg += "Error Message: %-30s" % (err)
@@ -4150,6 +4182,9 @@ class ImportFitFromFullProf:
             raise KeyError
         words = StringOP.SplitString(newline, ',')
 
+        template = getattr(_recording, "template", None)
+        if template is not None:
+            template.split(index, words)
         return words
 
     # end of SplitNewLine
@@ -5062,12 +5097,135 @@ class ImportFitFromFullProf:
             # 4. Link
             constraint = objref.setConstraint(param_name, refinefunction, codeword_tmp,
                                               value=init_value, damping=None, index=index)
+
+            template = getattr(_recording, "template", None)
+            if template is not None:
+                template.value(constraint, init_value)
         else:
             objref.set(param_name, init_value, index=index)
 
         return
 
 
+class PcrTemplate:
+    """
+    the filtered lines of a pcr file read by ImportFitFromFullProf, the
+    position (line, word) of the value of every Constraint in them and the
+    fit read from them; a pcr file whose lines differ only in these values
+    has the same layout, and its fit is a copy of this one with the values set
+    """
+    def __init__(self):
+        self.lines  = {}    # line index -> filtered line
+        self.words  = {}    # line index -> words of the line
+        self.spans  = {}    # (line, word) -> index in Refine.constraints
+        self.chi2   = None
+        self.fit    = None  # pickled fit
+        # while the file is read
+        self.tokens = {}    # id(word) -> (word, (line, word))
+        self.floats = {}    # id(float) -> (float, (line, word))
+        self.found  = {}    # (line, word) -> constraint, None if not one
+        return
+
+    def split(self, index, words):
+        """
+        words of line index are read
+        """
+        for k in range(len(words)):
+            word = words[k]
+            # one char strings are shared by python, they cannot be told apart
+            if len(word) > 1:
+                self.tokens[id(word)] = (word, (index, k))
+        return
+
+    def convert(self, fnumber, rnumber):
+        """
+        the string fnumber is converted to the float rnumber
+        """
+        token = self.tokens.get(id(fnumber))
+        if token is not None and token[0] is fnumber:
+            self.floats[id(rnumber)] = (rnumber, token[1])
+        return
+
+    def value(self, constraint, init_value):
+        """
+        init_value is the value of constraint
+        """
+        item = self.floats.get(id(init_value))
+        if item is None or item[0] is not init_value:
+            return
+        if item[1] in self.found:
+            self.found[item[1]] = None
+        else:
+            self.found[item[1]] = constraint
+        return
+
+    def record(self, reader, fit):
+        """
+        keep the lines of reader and a copy of fit
+        """
+        constraints = fit.get("Refine").constraints
+        position = {}
+        for i in range(len(constraints)):
+            position[id(constraints[i])] = i
+        for pos, constraint in self.found.items():
+            if constraint is not None and id(constraint) in position:
+                self.spans[pos] = position[id(constraint)]
+        self.lines = dict(reader.LineContent)
+        self.chi2 = reader.chi2
+        self.fit = pickle.dumps(fit, pickle.HIGHEST_PROTOCOL)
+        self.tokens = {}
+        self.floats = {}
+        self.found = {}
+        return
+
+    def read(self, reader):
+        """
+        make the fit of the filtered lines of reader
+
+        return  --  Fit instance, None if the layout of the lines is not
+                    the one of the template
+        """
+        lines = reader.LineContent
+        if self.fit is None or len(lines) != len(self.lines):
+            return None
+        if (reader.chi2 is None) != (self.chi2 is None):
+            return None
+
+        # 1. the values at the known positions, all other words are the same
+        values = {}
+        for index, line in lines.items():
+            old = self.lines.get(index)
+            if old == line:
+                continue
+            if old is None:
+                return None
+            if index not in self.words:
+                self.words[index] = StringOP.SplitString(old, ',')
+            oldwords = self.words[index]
+            words = StringOP.SplitString(line, ',')
+            if len(words) != len(oldwords):
+                return None
+            for k in range(len(words)):
+                if words[k] == oldwords[k]:
+                    continue
+                if (index, k) not in self.spans:
+                    return None
+                try:
+                    values[self.spans[(index, k)]] = float(words[k])
+                except ValueError:
+                    return None
+
+        # 2. copy the fit and set the values
+        fit = pickle.loads(self.fit)
+        constraints = fit.get("Refine").constraints
+        for i, value in values.items():
+            constraints[i].setRefinedValue(value)
+            constraints[i].temprealvalue = value
+        if reader.chi2 is not None:
+            fit.set("Chi2", reader.chi2)
+        return fit
+
+
 """     External Functions      """
 
 
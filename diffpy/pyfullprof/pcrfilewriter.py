@@ -20,6 +20,9 @@
     2. printLines(Line)
     3. StringOutput(value)
     4. getRefine(objref, param_name)
+
+    IncrementalPcrWriter keeps the lines of the last written file and only
+    patches the values and code words of the changed Constraints.
 """
 from __future__ import print_function
 # from __future__ import unicode_literals
@@ -35,7 +38,11 @@ from diffpy.pyfullprof.atom import AtomicDisplacementFactorIsotropic
 from diffpy.pyfullprof.contribution import Profile
 from diffpy.pyfullprof.contribution import StrainModelAnisotropic
 from diffpy.pyfullprof.laue import LaueStrainModel
+import re
+import threading
 
+# the PcrLayout recorded by the current thread's pcrFileWriter, if any
+_recording = threading.local()
 
 
 class RefineCode:
@@ -96,6 +103,22 @@ def pcrFileWriter(fit, filename, userinfo=None, srtype="r"):
 
     validateConstraints(fit)
 
+    Line = writeBlocks(fit, srtype)
+
+    if isinstance(filename, str):
+        printLineToFile(Line, filename, userinfo)
+    elif filename is not None:
+        raise NotImplementedError("filename is not a string nor None")
+
+    return True
+
+
+def writeBlocks(fit, srtype="r"):
+    """
+    convert a fit object to the lines of all the blocks of a pcr file
+
+    return  --  dictionary for line number
+    """
     Line = {}  # a dictionary for line number
 
     Line = writeBlock1(fit, Line)
@@ -110,12 +133,7 @@ def pcrFileWriter(fit, filename, userinfo=None, srtype="r"):
 
     Line = writeBlock6(fit, Line)
 
-    if isinstance(filename, str):
-        printLineToFile(Line, filename, userinfo)
-    elif filename is not None:
-        raise NotImplementedError("filename is not a string nor None")
-
-    return True
+    return Line
 
 
 def writeBlock1(fit, Line):
@@ -438,13 +456,8 @@ def writeBlock2(fit, Line):
     _dbline13 = False
     refine = fit.get("Refine")
     variablelist = refine.get("Variable")
-    param_listnum=refine.constraints
-    Maxs=0
-    for param_tmp in param_listnum:
-        if abs(param_tmp.codeWord)>1E-9:
-            Maxs+=1
     #Maxs = len(variablelist)
-    Line[13] = "  %-5s ! Number of refined parameters"%(StringOutput(Maxs))
+    Line[13] = getRefinedNumberLine(fit)
     if _dbline13:
         dbgmsg  = "\n--------  Print Line 13  --------------"
         dbgmsg += refine.simpleInformation()
@@ -2072,6 +2085,20 @@ def writeBlock6(fit, Line):
     return Line
 
 
+def getRefinedNumberLine(fit):
+    """
+    Line 13:  the number of the refined parameters (code word is not 0)
+
+    return  --  string
+    """
+    param_listnum=fit.get("Refine").constraints
+    Maxs=0
+    for param_tmp in param_listnum:
+        if abs(param_tmp.codeWord)>1E-9:
+            Maxs+=1
+    return "  %-5s ! Number of refined parameters"%(StringOutput(Maxs))
+
+
 def getRefine(objref, param_name, index=None):
     """
     read object (objref) 's parameter (param_name) 
@@ -2131,6 +2158,11 @@ def getRefine(objref, param_name, index=None):
     
     refinecode.value=constraint.realvalue
     #print("write:"+param_name+" value: "+str(refinecode.value)+" CodeWord:"+str(refinecode.code))
+
+    layout = getattr(_recording, "layout", None)
+    if layout is not None:
+        refinecode.value = layout.tag(constraint, "value", refinecode.value)
+        refinecode.code  = layout.tag(constraint, "code", refinecode.code)
     return refinecode
 
 
@@ -2322,6 +2354,8 @@ def StringOutput(value):
             rstring = '%1.10f'% (value)
         else:
             rstring = "%1.7E"% (value)
+        if isinstance(value, TaggedFloat):
+            rstring = value.layout.mark(value, rstring)
     else:
         rstring = str(value)
 
@@ -2399,6 +2433,22 @@ def printLineToFile(Line, filename, userinfo):
     """
 
     fout = open(filename, "w")
+    fout.write(formatLines(Line, userinfo))
+    fout.close()
+
+    return
+
+
+def formatLines(Line, userinfo):
+    """
+    join a list of lines to the text of a pcr file
+
+    Line:       a list of string;
+    userinfo:   list, each element in userinfo is a line for comments from user
+
+    return  --  string
+    """
+    fout = []
 
     # determine phase loop number
     block1_i  = 1
@@ -2412,13 +2462,13 @@ def printLineToFile(Line, filename, userinfo):
 
     for l in range(block1_i, block1_f+1):
         if l in Line.keys():
-            fout.write(Line[l]+"\n")
-    fout.write("!\n")
+            fout.append(Line[l]+"\n")
+    fout.append("!\n")
 
     for l in range(block2_i, block2_f+1):
         if l in Line.keys():
-            fout.write(Line[l]+"\n")
-        fout.write("!\n")
+            fout.append(Line[l]+"\n")
+        fout.append("!\n")
 
     phaseloop = len(Line[18])
     for phasecount in range(1, phaseloop+1):
@@ -2431,41 +2481,223 @@ def printLineToFile(Line, filename, userinfo):
         # write:  line for phase only < 26
         for l in range(block3_i, 25+1):
             if l in Line and phasecount in Line[l]:
-                fout.write(Line[l][phasecount]+"\n")
-                fout.write("!\n")
+                fout.append(Line[l][phasecount]+"\n")
+                fout.append("!\n")
 
         # write:  contribution
         for n in range(1, contribloop+1):
             for l in range(26, 42+1):
                 if l in Line and phasecount in Line[l] and n in Line[l][phasecount]:
-                    fout.write(Line[l][phasecount][n]+"\n")
-                    fout.write("!\n")
+                    fout.append(Line[l][phasecount][n]+"\n")
+                    fout.append("!\n")
 
         # write:  line for phase only > 43
         for l in range(43, block3_f+1):
             if l in Line and phasecount in Line[l]:
-                fout.write(Line[l][phasecount]+"\n")
-                fout.write("!\n")
+                fout.append(Line[l][phasecount]+"\n")
+                fout.append("!\n")
     # end -for phasecount 
 
     # write block 4
     for l in range(block4_i, block4_f+1):
         if l in Line.keys():
-            fout.write(Line[l]+"\n")
-            fout.write("!\n")
+            fout.append(Line[l]+"\n")
+            fout.append("!\n")
 
     # write extra problemaic block 6
     if "ext" in Line:
-        fout.write(Line["ext"]+"\n")
+        fout.append(Line["ext"]+"\n")
 
     # write extra user information
     for line in userinfo:
         content = line.split(".")[0]
-        fout.write("! %-60s\n"%(content))
+        fout.append("! %-60s\n"%(content))
 
-    fout.close()
-                
-    return
+    return "".join(fout)
+
+
+class TaggedFloat(float):
+    """
+    a value or code word of a Constraint, tagged by PcrLayout so that
+    StringOutput() can mark where it is written in the pcr file
+    """
+    def __new__(cls, value, layout, key):
+        obj = float.__new__(cls, value)
+        obj.layout = layout
+        obj.key    = key
+        return obj
+
+
+class PcrLayout:
+    """
+    the lines of a written pcr file and the span (line, column, width) of
+    the value and code word of every Constraint in them
+    """
+    MarkRe = re.compile("\x02([0-9]+)\x03")
+
+    def __init__(self, fit):
+        self.fit      = fit
+        self.lines    = []
+        self.spans    = {}     # (id(constraint), field) -> [(line, col, width)]
+        self.written  = {}     # id(constraint) -> (value, code) in the lines
+        self.untracked = set() # id(constraint) whose fields were not found
+        self.tagged   = set()  # (id(constraint), field) given to writeBlocks
+        self.marks    = []     # mark number -> (key, string)
+        self.revision = fit.getRevision()
+        self.srtype   = None
+        self.userinfo = None
+        return
+
+    def tag(self, constraint, field, value):
+        """
+        tag a value of constraint to be marked in StringOutput()
+        """
+        if type(value) is not float:
+            self.untracked.add(id(constraint))
+            return value
+        key = (id(constraint), field)
+        self.tagged.add(key)
+        return TaggedFloat(value, self, key)
+
+    def mark(self, value, rstring):
+        """
+        replace the string of a tagged value by a mark of the same width
+        """
+        index = len(self.marks)
+        width = len(rstring) - 2
+        if width < len(str(index)):
+            self.untracked.add(value.key[0])
+            return rstring
+        self.marks.append((value.key, rstring))
+        return "\x02" + "%0*d"% (width, index) + "\x03"
+
+    def record(self, fit, srtype="r", userinfo=[]):
+        """
+        write the fit with marks, and find the span of every mark
+        """
+        self.srtype   = srtype
+        self.userinfo = list(userinfo)
+        for constraint in fit.get("Refine").constraints:
+            self.written[id(constraint)] = (constraint.realvalue, constraint.codeWord)
+
+        _recording.layout = self
+        try:
+            Line = writeBlocks(fit, srtype)
+        finally:
+            _recording.layout = None
+        lines = formatLines(Line, userinfo).split("\n")
+
+        for lineno in range(len(lines)):
+            line = lines[lineno]
+            if line.find("\x02") == -1:
+                continue
+            for match in self.MarkRe.finditer(line):
+                key, rstring = self.marks[int(match.group(1))]
+                self.spans.setdefault(key, []).append(
+                    (lineno, match.start(), len(rstring)))
+            lines[lineno] = self.MarkRe.sub(
+                lambda match: self.marks[int(match.group(1))][1], line)
+        # Line 13 depends on all the code words
+        self.line13 = None
+        for lineno in range(len(lines)):
+            if lines[lineno].find("! Number of refined parameters") != -1:
+                self.line13 = lineno
+                break
+        # a value not written by StringOutput() cannot be patched
+        for key in self.tagged:
+            if key not in self.spans:
+                self.untracked.add(key[0])
+        self.lines = lines
+        self.marks = []
+        return
+
+    def patch(self):
+        """
+        patch the values and code words changed since the lines were written
+
+        return  --  True if the lines are up to date, 
+                    False if the pcr file must be written again
+        """
+        if self.fit.getRevision() != self.revision:
+            return False
+        constraints = self.fit.get("Refine").constraints
+        if len(constraints) != len(self.written):
+            return False
+
+        codechanged = False
+
+        for constraint in constraints:
+            cid = id(constraint)
+            if cid not in self.written:
+                return False
+            value, code = self.written[cid]
+            if value == constraint.realvalue and code == constraint.codeWord:
+                continue
+            if cid in self.untracked:
+                return False
+            for field, new in [("value", constraint.realvalue), ("code", constraint.codeWord)]:
+                if type(new) is not float:
+                    return False
+                rstring = StringOutput(new)
+                for lineno, col, width in self.spans.get((cid, field), []):
+                    if len(rstring) != width:
+                        return False
+                    line = self.lines[lineno]
+                    self.lines[lineno] = line[:col] + rstring + line[col+width:]
+            self.written[cid] = (constraint.realvalue, constraint.codeWord)
+            codechanged = True
+
+        if codechanged and self.line13 is not None:
+            self.lines[self.line13] = getRefinedNumberLine(self.fit)
+        return True
+
+
+class IncrementalPcrWriter:
+    """
+    write a fit object to a pcr file as pcrFileWriter(); when only values and
+    code words of Constraints have changed since the last write, only their
+    fields are patched in the cached lines
+    """
+    def __init__(self):
+        self.layout   = None
+        self.numfull  = 0
+        self.numpatch = 0
+        return
+
+    def write(self, fit, filename, userinfo=None, srtype="r"):
+        """
+        write fit to the file filename
+
+        return  --  True
+        """
+        if userinfo is not None:
+            verifyType(userinfo, list)
+        else:
+            userinfo = []
+
+        layout = self.layout
+        if layout is None or layout.fit is not fit or layout.srtype != srtype \
+                or layout.userinfo != userinfo or layout.patch() is False:
+            validateConstraints(fit)
+            layout = PcrLayout(fit)
+            layout.record(fit, srtype, userinfo)
+            self.numfull += 1
+        else:
+            self.numpatch += 1
+        self.layout = layout
+
+        fout = open(filename, "w")
+        fout.write("\n".join(layout.lines))
+        fout.close()
+
+        return True
+
+    def invalidate(self):
+        """
+        write the whole file next time
+        """
+        self.layout = None
+        return
 
 
 def validateConstraints(fit):
@@ -210,6 +210,20 @@ class Constraint(object):
         self.owner.set(self.parname, value, self.index)
         
 
+    def setRefinedValue(self, value):
+        """Set the refined value to the parameter and to realvalue.
+        The pcr writer takes the value from realvalue, so the owner value
+        is set without counting a change of the tree (getRevision()).
+        
+        value -- a float number.
+        """
+        root = self.owner.getRoot()
+        revision = root._revision
+        self.setValue(value)
+        root._refined += root._revision - revision
+        self.realvalue = value
+        
+
     def makeFormula(self):
         """make the constraint formula for fullprof program
         
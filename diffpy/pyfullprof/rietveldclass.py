@@ -20,6 +20,22 @@ from diffpy.pyfullprof.refine import Constraint
 from diffpy.pyfullprof.baseclass import BaseClass
 from diffpy.pyfullprof.exception import RietError
 
+# diffpy.pyfullprof.fit.Fit, fit imports this module
+_Fit = None
+
+
+def fitClass():
+    """Get the Fit class, imported once.
+
+    return: the class diffpy.pyfullprof.fit.Fit
+    """
+    global _Fit
+    if _Fit is None:
+        from diffpy.pyfullprof.fit import Fit
+        _Fit = Fit
+    return _Fit
+
+
 class RietveldClass(BaseClass):
     """RietveldClass extends BaseClass, and serves as the base class for all
     classes designed for Rietveld refinement.
@@ -183,7 +199,7 @@ class RietveldClass(BaseClass):
         
         return: a Fit instance
         """
-        from diffpy.pyfullprof.fit import Fit
+        Fit = fitClass()
         root = self
         while not isinstance(root,  Fit):
             root = root.parent
@@ -3,6 +3,9 @@ doc=[
     "how to use? for example:  autofp -c 0 -a *.PCR",
     "-c n, run n cycles, cycle=0 represent auto-select the cycles number; cycle=n>0 represent run n cycles",
     "-a autoselect the parameters",
+    "-b batch mode, autofp all the PCR files, for example:  autofp -b -j 4 -c 0 -a dir/*.pcr",
+    "-j n, batch mode, run n PCR files at the same time, default is the number of CPU",
+    "-o dir, batch mode, working dir of the PCR files, default is batch",
     "AutoFP version 1.3.x",
     "Website: http://physiworld.vipsinaapp.com/autofp.html",
     "Source: https://github.com/xpclove/autofp"
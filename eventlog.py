@@ -0,0 +1,104 @@
+import json
+import time
+import queue
+import threading
+
+tag = "eventlog->"
+
+
+class EventLog:
+    '''
+    An append-only log of events, one JSON object per line (JSON Lines), and
+    the history files of autorun. emit(), append() and replace() only put
+    the work on a queue; a background thread writes everything queued in one
+    batch, so a step never waits for the disk. Of several replace() of one
+    file in a batch only the last is written. flush() waits until all is
+    written. The file of the events is made empty when the log is made.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.t0 = time.time()
+        f = open(path, "w")  # the events of a run before are not kept
+        f.close()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.writer, name="eventlog", daemon=True)
+        self.thread.start()
+        return
+
+    # event: a dict which json can dump, "t" is added: seconds since the start
+    def emit(self, event):
+        event = dict(event)
+        event["t"] = round(time.time()-self.t0, 3)
+        self.queue.put(("event", self.path, event))
+        return
+
+    # add text at the end of the file path
+    def append(self, path, text):
+        self.queue.put(("append", path, text))
+        return
+
+    # write the file path again with text
+    def replace(self, path, text):
+        self.queue.put(("replace", path, text))
+        return
+
+    def flush(self):
+        self.queue.join()
+        return
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        return
+
+    def writer(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+            try:
+                self.write(batch)
+            except Exception as e:
+                print(tag, "cannot write the log:", e)
+            for item in batch:
+                self.queue.task_done()
+        return
+
+    def write(self, batch):
+        # path -> text to append, path -> text of the file, in order
+        appends = {}
+        replaces = {}
+        order = []
+        for item in batch:
+            if item == None:
+                continue
+            kind, path, data = item
+            if kind == "event":
+                text = json.dumps(data, default=float)+"\n"
+                kind = "append"
+            else:
+                text = data
+            if kind == "replace":
+                replaces[path] = text
+                appends.pop(path, None)  # the text before is replaced
+            else:
+                appends[path] = appends.get(path, "")+text
+            if path not in order:
+                order.append(path)
+        for path in order:
+            if path in replaces:
+                f = open(path, "w")
+                f.write(replaces[path]+appends.get(path, ""))
+                f.close()
+            elif path in appends:
+                f = open(path, "a")
+                f.write(appends[path])
+                f.close()
+        return
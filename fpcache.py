@@ -0,0 +1,215 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+import setting
+
+tag = "fpcache->"
+
+# files read by fp2k besides the pcr file; the other input files of a job
+# (run.job_input_files: .bac, .hkl, .int...) are not in the key, so the
+# cache is off by default
+input_ext = [".dat", ".irf"]
+
+# sha1 of a file, by (path, size, mtime)
+hash_memo = {}
+hash_lock = threading.Lock()
+
+g_cache = None
+g_lock = threading.Lock()
+
+
+def file_hash(path):
+    st = os.stat(path)
+    memo_key = (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+    with hash_lock:
+        if memo_key in hash_memo:
+            return hash_memo[memo_key]
+    h = hashlib.sha1()
+    f = open(path, "rb")
+    block = f.read(1 << 20)
+    while block:
+        h.update(block)
+        block = f.read(1 << 20)
+    f.close()
+    with hash_lock:
+        hash_memo[memo_key] = h.hexdigest()
+    return hash_memo[memo_key]
+
+
+# (size, mtime) of every file of a dir
+def dir_state(dirname):
+    state = {}
+    for entry in os.scandir(dirname):
+        if entry.is_file():
+            st = entry.stat()
+            state[entry.name] = (st.st_size, st.st_mtime_ns)
+    return state
+
+
+# the cache of the settings, None if it is off
+def get_cache():
+    global g_cache
+    if setting.run_set.fp_cache == False:
+        return None
+    with g_lock:
+        if g_cache == None:
+            path = setting.run_set.fp_cache_dir
+            if path == "":
+                path = os.path.join(os.path.expanduser("~"), ".autofp", "fpcache")
+            g_cache = FpCache(path, setting.run_set.fp_cache_size*1024*1024)
+    return g_cache
+
+
+class CacheEntry:
+    '''
+    The cache slot of one fp2k run: load() puts a stored result into the job
+    dir, save() stores the files written by fp2k since the entry was made.
+    '''
+
+    def __init__(self, cache, key, dirname, stem):
+        self.cache = cache
+        self.key = key
+        self.dirname = dirname
+        self.stem = stem
+        self.cycles = []
+        self.before = dir_state(dirname)
+
+    def load(self):
+        path = self.cache.get_path(self.key)
+        try:
+            names = os.listdir(path)
+            for name in names:
+                if name != "cycles.json":
+                    shutil.copyfile(os.path.join(path, name),
+                                    os.path.join(self.dirname, name))
+            self.cycles = json.load(open(os.path.join(path, "cycles.json")))
+            os.utime(path)  # most recently used
+        except (IOError, OSError, ValueError):
+            self.cache.count("miss")
+            return False
+        self.cache.count("hit")
+        return True
+
+    def save(self, cycles=[]):
+        after = dir_state(self.dirname)
+        names = []
+        for name in after:
+            if os.path.splitext(name)[1].lower() in input_ext:
+                continue
+            if name.startswith(self.stem) and after[name] != self.before.get(name):
+                names.append(name)
+        self.cache.put(self.key, self.dirname, names, cycles)
+        return
+
+
+class FpCache:
+    '''
+    Results of fp2k runs on disk, keyed by the content of the pcr file, of the
+    input files and of fp2k. The least recently used results are removed
+    when the cache is larger than max_size bytes.
+    '''
+
+    def __init__(self, path, max_size=1024*1024*1024):
+        self.path = path
+        self.max_size = max_size
+        self.size = None  # bytes, None: not scanned yet
+        self.lock = threading.Lock()
+        self.counter = {"hit": 0, "miss": 0, "save": 0, "evict": 0}
+        if os.path.exists(path) == False:
+            os.makedirs(path)
+        return
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counter[name] += n
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counter)
+
+    def get_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    # the entry of the pcr file in dirname, as it is now
+    def entry(self, dirname, pcrname, fp2k_path):
+        h = hashlib.sha1()
+        h.update(pcrname.encode("utf-8"))
+        f = open(os.path.join(dirname, pcrname), "rb")
+        h.update(f.read())
+        f.close()
+        for name in sorted(os.listdir(dirname)):
+            if os.path.splitext(name)[1].lower() in input_ext:
+                h.update(name.encode("utf-8"))
+                h.update(file_hash(os.path.join(dirname, name)).encode())
+        if os.path.dirname(fp2k_path) != "":
+            fp2k_path = os.path.join(dirname, fp2k_path)  # as fp2k is run in dirname
+        fp2k = shutil.which(fp2k_path)
+        if fp2k == None:
+            return None
+        h.update(file_hash(fp2k).encode())
+        stem = os.path.splitext(pcrname)[0]
+        return CacheEntry(self, h.hexdigest(), dirname, stem)
+
+    def put(self, key, dirname, names, cycles=[]):
+        path = self.get_path(key)
+        if os.path.exists(path):
+            return
+        # write to a tmp dir first, other processes may read the cache
+        tmp = path+".tmp{}_{}".format(os.getpid(), threading.get_ident())
+        size = 0
+        try:
+            os.makedirs(tmp)
+            for name in names:
+                shutil.copyfile(os.path.join(dirname, name), os.path.join(tmp, name))
+                size += os.path.getsize(os.path.join(tmp, name))
+            json.dump(cycles, open(os.path.join(tmp, "cycles.json"), "w"))
+            os.rename(tmp, path)
+        except (IOError, OSError) as e:
+            print(tag, "save error", e)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.count("save")
+        with self.lock:
+            if self.size != None:
+                self.size += size
+            full = self.size == None or self.size > self.max_size
+        if full:
+            self.evict()
+        return
+
+    # remove the least recently used results, down to 80% of max_size
+    def evict(self):
+        entries = []
+        total = 0
+        for sub in os.listdir(self.path):
+            subpath = os.path.join(self.path, sub)
+            if os.path.isdir(subpath) == False:
+                continue
+            for key in os.listdir(subpath):
+                path = os.path.join(subpath, key)
+                if key.find(".tmp") != -1:
+                    continue
+                try:
+                    size = 0
+                    for name in os.listdir(path):
+                        size += os.path.getsize(os.path.join(path, name))
+                    entries.append((os.path.getmtime(path), size, path))
+                except OSError:
+                    continue
+                total += size
+        n = 0
+        if total > self.max_size:
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= self.max_size*0.8:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                n += 1
+        with self.lock:
+            self.size = total
+        if n > 0:
+            self.count("evict", n)
+        return
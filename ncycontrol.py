@@ -0,0 +1,52 @@
+import setting
+
+tag = "ncycontrol->"
+
+
+class NcyControl:
+    '''
+    The number of cycles (NCY) of the steps of autorun, by group of the
+    order. A group starts at the NCY of the settings; after a step, a run
+    which used all its cycles with the Rwp still moving at the last one
+    gives the next step of the group twice the cycles, a run which
+    converged before gives it the cycles it needed, plus one. NCY is kept
+    in [ncy_min, ncy_max].
+    '''
+    eps = 0.01  # Rwp changes less than eps (absolute, in %): converged
+
+    def __init__(self, ncy=None, ncy_min=None, ncy_max=None):
+        if ncy == None:
+            ncy = setting.run_set.NCY
+        if ncy_min == None:
+            ncy_min = setting.run_set.ncy_min
+        if ncy_max == None:
+            ncy_max = setting.run_set.ncy_max
+        self.ncy_min = ncy_min
+        self.ncy_max = max(ncy_min, ncy_max)
+        self.ncy = self.clamp(ncy)
+        self.groups = {}  # group -> NCY of its next step
+        return
+
+    def clamp(self, ncy):
+        return min(max(ncy, self.ncy_min), self.ncy_max)
+
+    def get(self, group):
+        return self.groups.get(group, self.ncy)
+
+    # cycles: R factors of every cycle of the run of a step of group, as
+    # Run.cycles, ncy: the NCY of the run
+    def update(self, group, cycles, ncy):
+        n = len(cycles)
+        if n == 0:
+            return self.get(group)
+        converged = n  # the cycles which made the Rwp better
+        for k in range(1, n):
+            if abs(cycles[k]["Rwp"]-cycles[k-1]["Rwp"]) < self.eps:
+                converged = k
+                break
+        if n >= ncy and converged == n:
+            new = ncy*2  # still moving at the limit
+        else:
+            new = converged+1
+        self.groups[group] = self.clamp(new)
+        return self.groups[group]
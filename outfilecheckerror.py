@@ -1,17 +1,20 @@
 from __future__ import print_function
-def check(str):
-    p = open(str, "r")
-    c = p.read()
-    p.close()
+from diffpy.pyfullprof.fpoutputfileparsers import FPOutFileIndex
+
+
+# outindex: FPOutFileIndex of the out file, None to read it
+def check(str, outindex=None):
+    if outindex == None:
+        outindex = FPOutFileIndex(str)
     err = 0
 
-    if c.find("Asymmetry parameters usage invalid") != -1:
+    if outindex.hasFlag("Asymmetry parameters usage invalid"):
         err = -31
     else:
-        if c.rfind("Rwp") == -1:
+        if outindex.hasFlag("Rwp") == False:
             err = -32
 
-    if c.find("Singular matrix") != -1:
+    if outindex.hasFlag("Singular matrix"):
         err = -33
 
     if err < 0:
@@ -1,9 +1,11 @@
 import re
 import com
 import os
+import threading
 import paramgroup_xray
 import paramgroup_cw
 import paramgroup_tof
+from target import Target
 
 Pgs = [
     paramgroup_xray,
@@ -24,26 +26,20 @@ def load_strategy(sfolder=os.path.join(com.root_path, "strategy")):
 
         files = open(sfilemodule)
         con = files.read()
-        exec(con, globals())
-        s_xray = strategy[key]
+        files.close()
+        namespace = {}
+        exec(con, namespace)
+        s_xray = namespace["strategy"][key]
         print(s_xray.keys())
 
         group = s_xray["param_group"]
         order = s_xray["param_order"]
-        target_s = s_xray["target"]
-        target_s = re.sub(r"R_Factor", r'com.R', target_s)
-        print("target=", target_s)
-        target_s = target_s
         n = Pgs_key[key]
         Pgs[n].Param_Order_Group_Name = []
         Pgs[n].Param_Order_Group = []
-        Pgs[n].target["string"] = target_s
-        target_name = re.sub("MIN=", "", target_s)
-        target_name = re.sub('com.R', '', target_name)
-        target_name = re.sub(r'"', r'', target_name)
-        target_name = re.sub(r'[\[\]]', r'', target_name)
-        print(target_name)
-        Pgs[n].target["name"] = target_name
+        # compiled once, autorun calls it with the R factors of every step
+        Pgs[n].target = Target(s_xray["target"])
+        print("target=", Pgs[n].target.string)
         for item in order:
             Pgs[n].Param_Order_Group_Name.append(item)
             Pgs[n].Param_Order_Group.append(group[item])
@@ -94,6 +90,7 @@ Param_Num_Order = range(0, len(Param_Order_Group))
 atom = -1
 back = -1
 phase_last = 0
+alias_lock = threading.Lock()  # the alias count is shared by all ParamList
 
 order = []
 
@@ -143,22 +140,21 @@ def name_to_alias(name="", phase=0, fit=None):
 
 # get a order for the rietveld
 def get_order(params, param_switch, param_order_num=Param_Num_Order, job=0):
-    s = ""
     global order
+    order = []
     Param_Order = []
     for i in param_order_num:
-        Param_Order.extend(Param_Order_Group_X[i])
+        Param_Order.extend(Param_Order_Group[i])
     for i in range(0, len(Param_Order)):
-        for j in range(0, len(params.paramlist)):
-            s = params.alias[j]
-            if (s.find(Param_Order[i]) != -1 and param_switch[j] == True):
+        for j in params.find_alias(Param_Order[i]):
+            if param_switch[j] == True:
                 order.append(j)
+    return order
 
 # get a order_group_n for the rietveld
 
 
 def get_order_group_n(params, param_switch, group_n, param_order_num=None, job=0):
-    s = ""
     global order
     order = []
     Param_Order = []
@@ -170,8 +166,8 @@ def get_order_group_n(params, param_switch, group_n, param_order_num=None, job=0
         Param_Order.extend(pog[i])
     for i in range(0, len(Param_Order)):
         group = []
-        for j in range(0, len(params.paramlist)):
-            s = params.alias[j]
-            if (s.find(Param_Order[i]) != -1 and param_switch[j] == True):
+        for j in params.find_alias(Param_Order[i]):
+            if param_switch[j] == True:
                 group.append(j)
         order.append(group)
+    return order
@@ -1,4 +1,5 @@
 import re
+from target import Target
 Param_Group=[
     ["Profile","Background","Contribution","Phase"],
     ["Pattern"],
@@ -44,7 +45,7 @@ Param_Order_Group=[
     ]
     ]
 Param_Num_Order=range(0,len(Param_Order_Group))
-target={}
+target=Target()
 #for the alias count
 atom=-1
 back=-1
@@ -74,16 +75,12 @@ def name_to_alias(name=""):
 
 #get a order for the rietveld
 def get_order(params,param_switch,param_order_num=Param_Num_Order):
-    s=""
-    global order
     order=[] # init the order[]
     Param_Order=[]
     for i in param_order_num:
         Param_Order.extend(Param_Order_Group[i])	
     for i in range(0,len(Param_Order)):
-        for j in range(0,len(params.paramlist)):
-            s=params.alias[j]
-            if (s.find(Param_Order[i])!=-1 and param_switch[j]==True ):
+        for j in params.find_alias(Param_Order[i]):
+            if param_switch[j]==True:
                 order.append(j)
-
-        
\ No newline at end of file
+    return order
@@ -1,4 +1,5 @@
 import re
+from target import Target
 Param_Order_Group=[
     ["Scale"],
     ["Transparency","Zero"],
@@ -53,7 +54,7 @@ Param_Order_Group_Name=[
 ]
 
 Param_Num_Order=range(0,len(Param_Order_Group))
-target={}
+target=Target()
 #for the alias count
 atom=-1
 back=-1
@@ -83,17 +84,12 @@ def name_to_alias(name="",fit=None):
 
 #get a order for the rietveld
 def get_order(params,param_switch,param_order_num=Param_Num_Order,job=0):
-    s=""
-    global order
     order=[]#init order
     Param_Order=[]
     for i in param_order_num:
         Param_Order.extend(Param_Order_Group[i])	
     for i in range(0,len(Param_Order)):
-        for j in range(0,len(params.paramlist)):
-            s=params.alias[j]
-            if (s.find(Param_Order[i])!=-1 and param_switch[j]==True):
+        for j in params.find_alias(Param_Order[i]):
+            if param_switch[j]==True:
                 order.append(j)
-                print ("order-",s,param_switch[j])
-
-        
\ No newline at end of file
+    return order
@@ -1,5 +1,7 @@
 import os
 import sys
+import bisect
+import numpy
 import paramgroup
 class ParamList:
     '''
@@ -10,6 +12,15 @@ class ParamList:
         ["Str1","Str2","Str3","PA1","PA2","PA3","PA4","S_L","D_L"]
         
     ] # now don't use Param_Dict ,now use paramgroup.Param_Group
+
+    The params are the Constraints of the fit, their values, sigmas and code
+    words stay in them (the pcr writer and the out file reader use them).
+    By param index, numpy arrays: param_group (group of paramgroup.Param_Group),
+    param_phase, param_onoff_list (1: code word > 0). param_onoff_list is
+    kept up to date by the methods of ParamList, get_all_param_onoff() reads
+    it again from the code words changed elsewhere. get_values(),
+    get_sigmas() and get_codewords() return the numbers of all the params,
+    select() makes a mask and set_params_onoff() turns a mask on or off.
     '''
     def __init__(self,paramlist,job=0,fit=None):
         self.paramlist= None
@@ -21,6 +32,9 @@ class ParamList:
         self.param_num=len(self.paramlist)
         self.Pg=paramgroup.Pgs[job] #?paramgroup_job
         self.fit=fit
+        self.alias_text=None # all the aliases in one string, for find_alias
+        self.alias_start=[]  # start of every alias in alias_text
+        self.alias_index={}  # pattern -> indices of the params whose alias has it
         phase=0
         atom_sig=0
         for i in self.paramlist:
@@ -32,17 +46,18 @@ class ParamList:
             # varfullname+="-phase["+str(phase)+"]"
             self.fullname.append(varfullname)
             self.param_phase.append(phase)
-        
-        self.param_onoff_list=[]
+        self.param_phase=numpy.array(self.param_phase,dtype=int)
+
+        self.param_onoff_list=numpy.zeros(self.param_num,dtype=numpy.int8)
         self.get_all_param_onoff()
         self.get_all_alias()
         self.subgroup()
         return
     def get_phase(self,index):
-        varfn=self.param_phase[index]
+        varfn=int(self.param_phase[index])
         return varfn
     def get_param_group(self, index):
-        return self.param_group[index]
+        return int(self.param_group[index])
     def get_param_fullname(self,index):
         return self.fullname[index]
     def get_param_value(self,index):
@@ -50,52 +65,105 @@ class ParamList:
         return value
     def get_all_alias(self):
         Pg=paramgroup
-        for i in range(0,len(self.paramlist)):
-            name=""
-            name=self.get_param_fullname(i)
-            name=Pg.name_to_alias(name,self.get_phase(i),self.fit)
-            self.alias.append(name)
-        Pg.atom=-1
-        Pg.back=-1
+        with Pg.alias_lock:
+            for i in range(0,len(self.paramlist)):
+                name=""
+                name=self.get_param_fullname(i)
+                name=Pg.name_to_alias(name,self.get_phase(i),self.fit)
+                self.alias.append(name)
+            Pg.atom=-1
+            Pg.back=-1
             
+    # the indices of the params whose alias contains pattern, in order.
+    # the aliases are searched as one string, a match cannot cross the "\n"
+    # between two aliases; the result of every pattern is kept
+    def find_alias(self,pattern):
+        if pattern in self.alias_index:
+            return self.alias_index[pattern]
+        if self.alias_text==None:
+            pos=0
+            for name in self.alias:
+                self.alias_start.append(pos)
+                pos+=len(name)+1
+            self.alias_text="\n".join(self.alias)
+        found=[]
+        if pattern=="":
+            found=list(range(0,len(self.alias)))
+        else:
+            text=self.alias_text
+            pos=text.find(pattern)
+            while pos!=-1:
+                j=bisect.bisect_right(self.alias_start,pos)-1
+                found.append(j)
+                pos=text.find(pattern,self.alias_start[j]+len(self.alias[j])+1)
+        self.alias_index[pattern]=found
+        return found
+
     def subgroup(self):
         group=self.Pg.Param_Group #get group
+        # the groups of every type name, in the order of group
+        index={}
+        for j in range(0, len(group)):
+            for name in group[j]:
+                groups=index.setdefault(name,[])
+                if groups==[] or groups[-1]!=j:
+                    groups.append(j)
         for i in range(0,self.param_num):
-            tmp = False
-            for j in range(0, len(group)):
-                if str(self.paramlist[i].parname) == "Occ":
-                    if "Atom_Occ" in group[j]:
-                        self.param_group.append(j)
-                        tmp=True
-                        # print "select parameter: ",self.paramlist[i].parname,j #print debug msg
-                else:
-                    if self.paramlist[i].type.split('[')[0] in group[j]:
-                        self.param_group.append(j)
-                        tmp = True
-            if tmp ==  False:
+            if str(self.paramlist[i].parname) == "Occ":
+                groups=index.get("Atom_Occ",[])
+            else:
+                groups=index.get(self.paramlist[i].type.split('[')[0],[])
+            # a type name is in one group of Param_Group
+            if groups==[]:
                 self.param_group.append(len(group)-2)
+            else:
+                self.param_group.append(groups[0])
+        self.param_group=numpy.array(self.param_group,dtype=int)
     def get_param_onoff(self,index):
         if self.paramlist[index].codeWord>0:
             return 1#1 is on
         else:
             return 0#0 is off
             
+    # read the on/off state of all the params from their code words
     def get_all_param_onoff(self):
-        i=0
-        while(i<self.param_num):
-            self.param_onoff_list.append(self.get_param_onoff(i))
-            i=i+1
+        self.param_onoff_list=(self.get_codewords()>0).astype(numpy.int8)
         return    
     def set_all_param_onoff(self,boollist):
-        i=0
-        while (i<self.param_num):
-            if boollist[i]==True:
-                self.turnon_param(i)
-            else:
-                self.turnoff_param(i)
-            i=i+1
+        mask=numpy.asarray(boollist)==True
+        self.set_params_onoff(mask,True)
+        self.set_params_onoff(~mask,False)
+        return
+    # turn on (on=True) or off the params of a bool mask or a list of indices,
+    # only the code words that change are set
+    def set_params_onoff(self,select,on=True):
         self.get_all_param_onoff()
+        index=numpy.arange(self.param_num)[select]
+        if on==True:
+            for i in index[self.param_onoff_list[index]==0]:
+                self.paramlist[i].codeWord=1.0
+            self.param_onoff_list[index]=1
+        else:
+            for i in index[self.param_onoff_list[index]==1]:
+                self.paramlist[i].codeWord=0.0
+            self.param_onoff_list[index]=0
         return
+    # bool mask of the params in group, in phase, and on (True) or off (False)
+    def select(self,group=None,phase=None,on=None):
+        mask=numpy.ones(self.param_num,dtype=bool)
+        if group!=None:
+            mask&=self.param_group==group
+        if phase!=None:
+            mask&=self.param_phase==phase
+        if on!=None:
+            mask&=(self.param_onoff_list==1)==on
+        return mask
+    def get_values(self):
+        return numpy.array([p.getValue() for p in self.paramlist],dtype=float)
+    def get_sigmas(self):
+        return numpy.array([p.sigma for p in self.paramlist],dtype=float)
+    def get_codewords(self):
+        return numpy.array([p.codeWord for p in self.paramlist],dtype=float)
     def get_param_codeword(self,index):
         if index>self.param_num or index<0:
             return -1
@@ -105,14 +173,15 @@ class ParamList:
         if index>self.param_num or index<0:
             return -1
         self.paramlist[index].codeWord=codeword
+        self.param_onoff_list[index]=self.get_param_onoff(index)
         return 
     def turnon_param(self,index):
         if self.get_param_onoff(index)==0:
             self.set_param_codeword(index,1.0)
-        self.get_all_param_onoff()
+        self.param_onoff_list[index]=1
         return
     def turnoff_param(self,index):
         if self.get_param_onoff(index)==1:
             self.set_param_codeword(index,0.0)
-        self.get_all_param_onoff()
+        self.param_onoff_list[index]=0
         return
\ No newline at end of file
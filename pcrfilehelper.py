@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 from diffpy.pyfullprof.pcrfilereader import *
 from diffpy.pyfullprof.pcrfilewriter import *
+import os
+
+# PcrTemplate of the last full read of every pcr file, by real path
+g_templates={}
 
 class pcrFileHelper:
 	def __init__(self):
@@ -10,31 +14,39 @@ class pcrFileHelper:
 		self.refineList=[]
 		self.normalList=[]
 		self.fixedList=[]
+		self.writer=IncrementalPcrWriter() # only patch the changed code words
 		
 	def readFromPcrFile(self,filename=""):
-		self.fit=Fit(None)
-
 		if filename=="":
 			filename=self.fileName
 
 		pcrfile=open(filename,"r")
 		pcr_context=pcrfile.read()
 		pcrfile.close()
-
-		pcrfile=open(filename,"w")
+		# the phase name "# CRY" would be cut as a comment by the reader
 		pcr_context=pcr_context.replace("# CRY","CRY")
-		print("change ok!") # change the phase name("# CRY")
-		pcrfile.write(pcr_context)
-		pcrfile.close()
-        
-		
-		self.reader=ImportFitFromFullProf(str(filename))
 
-		# try:
-		# 	self.reader.ImportFile(self.fit)
-		# except Exception as e:
-		# 	print(Exception, ":", e, "in pcrfilehelper.py FromPcrFile")
-		self.reader.ImportFile(self.fit)
+		# the file of the last full read has the same layout, only the values
+		# of the params are taken from this one
+		key=os.path.realpath(str(filename))
+		template=g_templates.get(key)
+		self.fit=None
+		if template!=None:
+			self.reader=ImportFitFromFullProf(str(filename),pcr_context)
+			self.reader.FilterFile()
+			self.fit=template.read(self.reader)
+
+		if self.fit==None:
+			self.fit=Fit(None)
+			template=PcrTemplate()
+			self.reader=ImportFitFromFullProf(str(filename),pcr_context)
+
+			# try:
+			# 	self.reader.ImportFile(self.fit)
+			# except Exception as e:
+			# 	print(Exception, ":", e, "in pcrfilehelper.py FromPcrFile")
+			if self.reader.ImportTemplate(self.fit,template)==True:
+				g_templates[key]=template
 
 		self.param_list=self.fit.Refine.constraints
 		self.fileName=str(filename)
@@ -88,7 +100,7 @@ class pcrFileHelper:
 
 	def writeToPcrFile(self,filename):
 		if self.fit!=None:
-			pcrFileWriter(self.fit,str(filename))
+			self.writer.write(self.fit,str(filename))
 			# self.remove_b_prefix(filename)
 			print("write pcr file ok!")
 
@@ -64,6 +64,20 @@ def parse_json(js, cycle):
     return data
 
 
+# add the new step events of autorun (auto.autofp_log.log_step) to js, the
+# log as parse_json reads it
+def apply_events(js, events):
+    for event in events:
+        if event.get("event") != "step" or event.get("good") != True:
+            continue
+        key = "cycle_{}".format(event["cycle"])
+        if key not in js:
+            js[key] = {"good_rwplist": [], "good_rwplist_param": []}
+        js[key]["good_rwplist"].append(event["R"]["Rwp"])
+        js[key]["good_rwplist_param"].append(event["param"])
+    return js
+
+
 # This function is used to generate data from a log josn file
 def data_gen_file(stop_event, cycle):
     data = []
@@ -79,14 +93,16 @@ def data_gen_file(stop_event, cycle):
         time.sleep(0.05)
 
 
-# using multi process queue communication to enhance data interaction
+# using multi process queue communication to enhance data interaction,
+# the queue carries the new events, the log is built again from them
 def data_gen_queue(stop_event, queue, cycle):
     data = []
     old_data = data
+    js = {}
     while not stop_event.is_set():
         try:
             js_txt = queue.get(timeout=0.01)
-            js = json.loads(js_txt)
+            apply_events(js, json.loads(js_txt))
             data = parse_json(js, cycle)
             old_data = data
             yield old_data
@@ -127,11 +143,10 @@ def show(stop_event, com_var, cycle=1):
     return
 
 
-def show_Rwp_animation(dir=None):
+def show_Rwp_animation(dir=None, cycle=1):
     if dir == None:
         dir = "."
     os.chdir(dir)
-    cycle = com.cycle
     stop_event = multiprocessing.Event()
     com_var = {"queue": com.mp_queue, "run_set": com.run_set}
     job = multiprocessing.Process(target=show, args=(stop_event, com_var, cycle))
@@ -145,8 +160,8 @@ def show_Rwp_animation(dir=None):
 """
 
 
-def show_stable(data):
-    job = multiprocessing.Process(target=show_data, args=(data, com.cycle))
+def show_stable(data, cycle=1):
+    job = multiprocessing.Process(target=show_data, args=(data, cycle))
     job.start()
     jobs_s.append(job)
 
@@ -165,7 +180,7 @@ def show_data(rwplist, cycle=1):
     plot good param mark
     """
     js = json.load(open("autofp.log"))
-    key = "cycle_{}".format(com.cycle)
+    key = "cycle_{}".format(cycle)
     if key in js:
         data_rwp_param = js[key]["rwplist_param"]
         d = [data_rwp_param, rwplist]
@@ -1,12 +1,17 @@
 import sys
 import os
 import shutil
+import zlib
 from pcrfilehelper import pcrFileHelper
-from diffpy.pyfullprof.fpoutputfileparsers import FPOutFileParser
+from diffpy.pyfullprof.fpoutputfileparsers import FPOutFileParser, FPOutFileIndex
+from diffpy.pyfullprof.fpuncertaintyreader import FPUncertainty
 from diffpy.pyfullprof.fit import Fit
 from paramlist import ParamList
 from outfilecheckerror import check
 from subrun import SubRun
+from context import RefinementContext
+import fpcache
+import coarse
 import setting
 import com
 
@@ -20,16 +25,29 @@ error_info = {
     -32: "no rwp in out file",
     -33: "Singular matrix",
     -34: "Rwp = NaN",
+    -35: "fp2k diverges, stopped",
+    -36: "fp2k makes no progress, stopped",
+    -37: "fp2k timeout, stopped",
     -10:  "no rwp task"
 }
 
+# the files written by fp2k and autofp; the other files of a job dir which
+# share the name of the pcr file are input files (.dat, .bac, .hkl...)
+output_ext = [".pcr", ".out", ".prf", ".sum", ".fst", ".rpa", ".sym", ".sav",
+              ".fou", ".new", ".cif", ".sub", ".mic", ".bvs", ".log", ".json"]
+
+# the flags of the output files of fp2k: of the fit (.rpa/.cif/.sav, .sym)
+# and of every pattern (.prf, .hkl, .fou, .sub); 0 is no file
+fit_output = ["Rpa", "Sym"]
+pattern_output = ["Prf", "Hkl", "Fou", "Ipr"]
+
 
 class Run:
     def __init__(self):
         return
     # reset Run
 
-    def reset(self, pcrfilename, tmp_dir_path="tmp"):
+    def reset(self, pcrfilename, tmp_dir_path="tmp", ctx=None):
         self.tmp_path = "/"+tmp_dir_path+"/"
         self.pcrRW = None
         self.outR = None
@@ -41,6 +59,14 @@ class Run:
         self.job_name = pcrfilename
         self.Rwp = 10000
         self.R = {"Rp": 0, "Rwp": 0, "Re": 0, "Chi2": 0}
+        self.snapshots = []  # the state of every step, snapshots[step_index]
+        self.rwp_limit = None  # fp2k making no progress above this Rwp is stopped
+        self.cycles = []     # R factors of every cycle of the last fp2k run
+        self.cycles_ncy = 0  # the NCY of the last fp2k run
+        self.dirty = False   # the pcr and out files are older than the state
+        self.user_output = None  # the output flags of the pcr file in trial mode
+        self.user_data = None    # the data files and steps of the pcr file in coarse mode
+        self.coarse_data = None  # the coarse data files and steps in coarse mode
 
         # file pcr and out
         self.pcrfilename = os.path.realpath(pcrfilename)
@@ -52,9 +78,13 @@ class Run:
         self.tmpdir = os.path.dirname(self.pcrfilename)+self.tmp_path
         shutil.copyfile(self.pcrfilename, self.pcrfilename+"_back")
 
+        # the state of the job, all files are in the pcr dir
+        if ctx == None:
+            ctx = RefinementContext(self.dirname)
+        self.ctx = ctx
+
         if os.path.exists(self.tmpdir) == False:
             os.mkdir(self.tmpdir)
-        os.chdir(self.dirname)  # change the dir to the pcr dir
         self.resetLoad()
 
         if self.err != 0:
@@ -66,11 +96,16 @@ class Run:
                     "_back")  # backup the pcrfile
         return
 
-    def resetLoad(self):
+    # outindex: FPOutFileIndex of the out file if it is already read
+    def resetLoad(self, outindex=None):
+        if self.dirty == True:
+            outindex = None  # the out file is written again by sync
+        self.sync()
         self.pcrRW = pcrFileHelper()
 
         try:
-            self.pcrRW.readFromPcrFile(self.pcrfilename)
+            with self.ctx.timer.phase("read_pcr"):
+                self.pcrRW.readFromPcrFile(self.pcrfilename)
         except Exception as e:
             print(Exception, ":", e, "in run.py resetload")
 
@@ -106,32 +141,96 @@ class Run:
         # the absolute path of the data file
         self.real_datafile = os.path.splitext(self.pcrfilename)[0]+".dat"
 
-        # read outfile and get Rwp
+        if self.user_output != None:
+            put_output(self.fit, trial_output(self.user_output))
+        if self.coarse_data != None:
+            put_output(self.fit, self.coarse_data)
+
+        self.loadOut(outindex)
+        with self.ctx.timer.phase("paramlist"):
+            self.params = ParamList(self.fit.getParamList(), self.job, self.fit)
+
+        return self.err
+
+    # update the loaded fit in place from the refined values and sigmas of
+    # the out file, instead of reading the new pcr file again.
+    # return 0 if done, else the pcr file must be read by resetLoad
+    def updateLoad(self, outindex=None):
+        if setting.run_set.fast_load == False or self.fit == None:
+            return 1
+        if self.job == 2:
+            return 1
+        refined = []
+        for param in self.params.paramlist:
+            if abs(param.codeWord) > 1E-9:
+                # a shared or scaled code word moves other params too
+                if abs(abs(param.codeWord) % 10-1) > 1E-6:
+                    return 1
+                refined.append(param)
+        try:
+            with self.ctx.timer.phase("update_fit"):
+                if outindex == None:
+                    outindex = FPOutFileIndex(self.outfilename)
+                uncertainty = FPUncertainty(self.outfilename, "out", outindex)
+                uncertainty.importUncertainty()
+                uncertainty.exportValuesToFit(self.fit, refined)
+        except Exception as e:
+            print(Exception, ":", e, "in run.py updateLoad")
+            return 1
+
+        self.loadOut(outindex)
+        return self.err
+
+    # read outfile and get Rwp
+    def loadOut(self, outindex=None):
         if os.path.exists(self.outfilename) == False:
             self.throwerr(-1, "no out file ")
         elif self.err >= 0:
-            self.outR = FPOutFileParser(self.pcrRW.fit, self.outfilename)
+            with self.ctx.timer.phase("load_out"):
+                self.outR = FPOutFileParser(self.fit, self.outfilename, outindex)
             if self.outR.getStatus() == False:
                 self.throwerr(1, "out file error")
             elif self.err == 0:
                 self.Rwp = self.getRwp()
-        # end read outfile
-
-        self.params = ParamList(self.fit.getParamList(), self.job, self.fit)
-
-        return self.err
+        return
 
     def runfp(self):
+        timer = self.ctx.timer
+        self.sync()
         self.err = 0
+        self.cycles_ncy = self.fit.get("NCY")
         subrun = SubRun()
         fp2k_path = com.run_set.fp2k_path
+        cache = fpcache.get_cache()
+        entry = None
+        loaded = False
         subrun.reset(fp2k_path, self.base_pcrfilename,
-                     "not saved to the current PCR file:")
-        self.err = subrun.run()
+                     "not saved to the current PCR file:", self.dirname,
+                     self.rwp_limit)
+        if cache != None:
+            with timer.phase("fp_cache"):
+                entry = cache.entry(self.dirname, self.base_pcrfilename, fp2k_path)
+                loaded = entry != None and entry.load()
+        if loaded:
+            # fp2k has already run this pcr file, its output is copied back
+            self.err = subrun.monitor.replay(entry.cycles)
+            self.cycles = subrun.monitor.history
+        else:
+            with timer.phase("fp2k"):
+                self.err = subrun.run()
+            self.cycles = subrun.monitor.history
+            # a run stopped by the monitor or the timeout is not complete
+            if entry != None and self.err == 0:
+                with timer.phase("fp_cache"):
+                    entry.save(self.cycles)
 
         if self.err == 0:
-            self.err += check(self.outfilename)
-            self.err += self.resetLoad()
+            # the out file is read once for check, the fit and the R factors
+            with timer.phase("check"):
+                outindex = FPOutFileIndex(self.outfilename)
+                self.err += check(self.outfilename, outindex)
+            if self.err != 0 or self.updateLoad(outindex) != 0:
+                self.err += self.resetLoad(outindex)
 
         # only save the right result
         if (self.err == 0):
@@ -165,43 +264,148 @@ class Run:
         if self.step_index-step < 0:
             step = self.step_index
         print("back", self.step_index, step)
-        self.pop(step)
-        self.resetLoad()
+        with self.ctx.timer.phase("pop"):
+            restored = self.pop(step)
+        if restored == False:
+            self.resetLoad()
+        return
+
+    # a new cycle of autofp: the steps before can not be restored any more,
+    # the state now is step 0
+    def reset_steps(self):
+        self.step_index = -1
+        self.snapshots = []
+        self.push()
         return
 
     def push(self):
-        self.step_index += 1
-        tmp = self.tmpdir+"step="+str(self.step_index)
-        copyfile(self.pcrfilename, tmp+".pcr")
-        copyfile(self.outfilename, tmp+".out")
+        with self.ctx.timer.phase("push"):
+            self.step_index += 1
+            del self.snapshots[self.step_index:]
+            self.snapshots.append(Snapshot(self))
+
+            # the files of the step are only kept for crash recovery
+            if setting.run_set.save_step == True:
+                tmp = self.tmpdir+"step="+str(self.step_index)
+                copyfile(self.pcrfilename, tmp+".pcr")
+                copyfile(self.outfilename, tmp+".out")
         return
 
+    # return True if the state is restored in memory, False if the files of
+    # the step are copied back and must be loaded again
     def pop(self, step=1):
         n = step
         if self.step_index == 0:
             n = 0
-        tmp = self.tmpdir+"step="+str(self.step_index-n)
-
-        print(">>> pop", tmp)
-        if com.is_file_locked(self.outfilename):
-            print("file is use[pop]", self.outfilename)
-            sys.exit(-1)
-        if (os.path.exists(tmp+".pcr")):
-            copyfile(tmp+".pcr", self.pcrfilename)
-        if (os.path.exists(tmp+".out")):
-            copyfile(tmp+".out", self.outfilename)
+        index = self.step_index-n
+        restored = False
+
+        if index >= 0 and index < len(self.snapshots) and \
+                self.snapshots[index].state is not None and self.fit != None:
+            print(">>> pop step", index)
+            self.snapshots[index].restore(self)
+            del self.snapshots[index+1:]
+            restored = True
         else:
-            self.throwerr(-1, "no out file")
+            tmp = self.tmpdir+"step="+str(index)
+            print(">>> pop", tmp)
+            if com.is_file_locked(self.outfilename):
+                print("file is use[pop]", self.outfilename)
+                sys.exit(-1)
+            if (os.path.exists(tmp+".pcr")):
+                copyfile(tmp+".pcr", self.pcrfilename)
+            if (os.path.exists(tmp+".out")):
+                copyfile(tmp+".out", self.outfilename)
+            else:
+                self.throwerr(-1, "no out file")
+            self.dirty = False
         self.step_index -= step
 
         if self.step_index < 0:
             self.step_index = 0
             
-        return 1
+        return restored
+
+    # write the pcr and out files of a restored state
+    def sync(self):
+        if self.dirty == False:
+            return
+        self.dirty = False
+        self.writepcr()
+        snapshot = self.snapshots[-1]
+        if snapshot.out != None:
+            out = open(self.outfilename, "wb")
+            out.write(zlib.decompress(snapshot.out))
+            out.close()
+        return
 
     # write to pcr
     def writepcr(self):
-        self.pcrRW.writeToPcrFile(self.pcrfilename)
+        with self.ctx.timer.phase("write_pcr"):
+            self.pcrRW.writeToPcrFile(self.pcrfilename)
+        return
+
+    # trial mode: the output files of fp2k a step does not need are not
+    # written until end_trial, which puts the flags of the pcr file back
+    def begin_trial(self):
+        if setting.run_set.trial_mode == False or self.fit == None:
+            return
+        if self.user_output != None:
+            return
+        self.user_output = get_output(self.fit)
+        self.set_output(trial_output(self.user_output))
+        return
+
+    def end_trial(self):
+        if self.user_output == None:
+            return
+        output = self.user_output
+        self.user_output = None
+        self.set_output(output)
+        return
+
+    # coarse mode: the steps refine on copies of the data files with only
+    # every k-th point and a step k times larger, until end_coarse puts the
+    # data files of the pcr file back. False if a data file has no coarse copy
+    def begin_coarse(self, k):
+        if self.fit == None or self.coarse_data != None or k < 2:
+            return False
+        user_data = {}
+        coarse_data = {}
+        for n, pattern in enumerate(self.fit.get("Pattern")):
+            datafile = pattern.get("Datafile")
+            name = coarse.coarse_name(datafile, k)
+            src = os.path.join(self.dirname, datafile)
+            dest = os.path.join(self.dirname, name)
+            if os.path.exists(src) == False or \
+                    coarse.decimate(src, dest, k, pattern.get("Ins")) == False:
+                print("no coarse data of", datafile, "Ins =", pattern.get("Ins"))
+                remove_data(self.dirname, coarse_data)
+                return False
+            user_data[(n, "Datafile")] = datafile
+            coarse_data[(n, "Datafile")] = name
+            if "Step" in pattern.ParamDict:
+                user_data[(n, "Step")] = pattern.get("Step")
+                coarse_data[(n, "Step")] = pattern.get("Step")*k
+        self.user_data = user_data
+        self.coarse_data = coarse_data
+        self.set_output(coarse_data)
+        return True
+
+    def end_coarse(self):
+        if self.coarse_data == None:
+            return False
+        coarse_data = self.coarse_data
+        self.coarse_data = None
+        self.set_output(self.user_data)
+        self.user_data = None
+        remove_data(self.dirname, coarse_data)
+        return True
+
+    # set the output flags, or data files, of the fit; a snapshot does not
+    # keep them
+    def set_output(self, output):
+        put_output(self.fit, output)
         return
 
     def setParam(self, index, code=False):
@@ -217,5 +421,123 @@ class Run:
         print(self.errmsg)
 
 
+class Snapshot:
+    '''
+    The state of Run after a step: the values, code words and sigmas of the
+    params (Fit.snapshot), the R factors and the out file. It is restored
+    into the fit of the Run, the params of the pcr file are the same.
+    '''
+
+    def __init__(self, r):
+        self.Rwp = r.Rwp
+        self.R = dict(r.R)
+        self.state = None
+        self.out = None
+        if r.fit != None:
+            self.state = r.fit.snapshot()
+        if os.path.exists(r.outfilename):
+            out = open(r.outfilename, "rb")
+            self.out = zlib.compress(out.read(), 1)
+            out.close()
+        return
+
+    def restore(self, r):
+        r.fit.restore(self.state)
+        r.params.get_all_param_onoff()
+        r.outR = None  # of the state before, the out file is written by sync
+        r.Rwp = self.Rwp
+        r.R = dict(self.R)
+        r.err = 0
+        r.dirty = True
+        return
+
+
+# the output flags of a fit: (pattern index, name) -> value, -1 for the fit
+def get_output(fit):
+    output = {}
+    for name in fit_output:
+        output[(-1, name)] = fit.get(name)
+    for k, pattern in enumerate(fit.get("Pattern")):
+        for name in pattern_output:
+            output[(k, name)] = pattern.get(name)
+    return output
+
+
+# the values are only set if they differ, a set changes the fit revision
+def put_output(fit, output):
+    patterns = fit.get("Pattern")
+    for (k, name), value in output.items():
+        if k < 0:
+            obj = fit
+        elif k < len(patterns):
+            obj = patterns[k]
+        else:
+            continue
+        if obj.get(name) != value:
+            obj.set(name, value)
+    return
+
+
+# the output flags of the steps: no file
+def trial_output(output):
+    return dict.fromkeys(output, 0)
+
+
+# remove the coarse data files of (pattern index, "Datafile") -> name
+def remove_data(dirname, data):
+    for (k, name), value in data.items():
+        if name == "Datafile" and os.path.exists(os.path.join(dirname, value)):
+            os.remove(os.path.join(dirname, value))
+    return
+
+
 def copyfile(source, destin):
     shutil.copyfile(source, destin)
+
+
+# the input files of the pcr file pcrname in dirname, as names relative to
+# dirname: the files of the same name but not an output (output_ext) and the
+# files named in fit (data and resolution file of every pattern).
+# raise IOError if a file named in fit is missing or is not below dirname
+def job_input_files(dirname, pcrname, fit):
+    stem = os.path.splitext(pcrname)[0]
+    names = []
+    for name in sorted(os.listdir(dirname)):
+        if name.startswith(stem+".") and name[len(stem):].lower().startswith(".pcr") == False and \
+                os.path.splitext(name)[1].lower() not in output_ext and \
+                os.path.isfile(os.path.join(dirname, name)):
+            names.append(name)
+    # the name the pcr file reader gives a pattern without a data file line
+    default = os.path.basename(pcrname).split(".")[0] + ".dat"
+    for pattern in fit.get("Pattern"):
+        files = [pattern.get("Datafile")]
+        if pattern.get("Res") != 0:
+            files.append(pattern.get("Resofile"))
+        for name in files:
+            name = name.strip()
+            path = os.path.join(dirname, name)
+            if name == "" or (name == default and os.path.isfile(path) == False):
+                continue  # fp2k reads the file of the name of the pcr file
+            if os.path.isfile(path) == False:
+                raise IOError("input file " + name + " of " + pcrname + " not found")
+            if os.path.isabs(name):
+                continue  # read where it is
+            name = os.path.normpath(name)
+            if name.startswith(".."):
+                raise IOError("input file " + name + " of " + pcrname +
+                              " is not in the dir of the pcr file")
+            if name not in names:
+                names.append(name)
+    return names
+
+
+# copy the input files of the pcr file pcrname in srcdir into desdir
+# return the names copied
+def copy_job_files(srcdir, pcrname, fit, desdir):
+    names = job_input_files(srcdir, pcrname, fit)
+    for name in names:
+        dest = os.path.join(desdir, name)
+        if os.path.dirname(name) != "" and os.path.exists(os.path.dirname(dest)) == False:
+            os.makedirs(os.path.dirname(dest))
+        shutil.copyfile(os.path.join(srcdir, name), dest)
+    return names
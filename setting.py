@@ -24,6 +24,28 @@ class setting:
               "Fou": False
               }
     show_rwp_limit = 0
+    spec_n = 1                        # spec_n: params refined in parallel, 1 is serial
+    fast_load = True                  # fast_load: update the fit from the out file, not the new pcr
+    save_step = False                 # save_step: also save every step to tmp/step=N, for crash recovery
+    fp2k_timeout = 0                  # fp2k_timeout: seconds, a longer fp2k run is killed, 0 is off
+    monitor = {"diverge_n": 3,        # monitor: stop fp2k when Chi2 goes up diverge_n cycles in a row,
+               "stall_n": 3,          # or Rwp changes less than stall_eps for stall_n cycles and is not
+               "stall_eps": 0.001     # better than the best Rwp. 0 is off
+               }
+    fp_cache = False                  # fp_cache: reuse the output of a pcr file fp2k has already run; the key has only
+                                      # the pcr, .dat and .irf files, not the other files a pcr can name (.bac, .hkl, .int...)
+    fp_cache_dir = ""                 # fp_cache_dir: "" is ~/.autofp/fpcache
+    fp_cache_size = 1024              # fp_cache_size: MB, the least recently used results are removed
+    step_timing = False               # step_timing: time the phases of every step, write autofp_trace.json
+    trial_mode = True                 # trial_mode: the steps of autorun write no prf, hkl, fou, cif, sym, sub files
+    coarse_groups = 0                 # coarse_groups: the first groups of the order refine on coarse data, 0 is off
+    coarse_stride = 4                 # coarse_stride: the coarse data has every coarse_stride-th point of the data
+    probe_screen = False              # probe_screen: the params of a group run one cycle first, only the better ones are refined
+    adaptive_ncy = False              # adaptive_ncy: the NCY of a step follows the convergence of its group, in [ncy_min, ncy_max]
+    ncy_min = 3
+    ncy_max = 40
+    tabu = False                      # tabu: a param which failed is not tried again from the same state, in the next cycles too,
+    tabu_drift = 0.01                 # until a value of the state has changed more than tabu_drift (relative)
     # ----------------------------------------------------------------------
 
     def __init__(self):
@@ -56,7 +78,7 @@ class setting:
             setting_file.close()
         except Exception as e:
             print("setting.txt error! load setting_default.txt.")
-            path = "setting_default.txt"
+            path = os.path.join(os.path.dirname(path), "setting_default.txt")
             setting_file = open(path, "r")
             self.setjson = json.load(setting_file)
             setting_file.close()
@@ -68,6 +90,25 @@ class setting:
         self.AsymLim = self.setjson["AsymLim"]
         self.eps = self.setjson["eps"]
         self.fp2k_path = self.setjson["fp2k_path"]
+        self.spec_n = self.setjson.get("spec_n", 1)
+        self.fast_load = self.setjson.get("fast_load", True)
+        self.save_step = self.setjson.get("save_step", False)
+        self.fp2k_timeout = self.setjson.get("fp2k_timeout", 0)
+        self.monitor = dict(setting.monitor)
+        self.monitor.update(self.setjson.get("monitor", {}))
+        self.fp_cache = self.setjson.get("fp_cache", False)
+        self.fp_cache_dir = self.setjson.get("fp_cache_dir", "")
+        self.fp_cache_size = self.setjson.get("fp_cache_size", 1024)
+        self.step_timing = self.setjson.get("step_timing", False)
+        self.trial_mode = self.setjson.get("trial_mode", True)
+        self.coarse_groups = self.setjson.get("coarse_groups", 0)
+        self.coarse_stride = self.setjson.get("coarse_stride", 4)
+        self.probe_screen = self.setjson.get("probe_screen", False)
+        self.adaptive_ncy = self.setjson.get("adaptive_ncy", False)
+        self.ncy_min = self.setjson.get("ncy_min", 3)
+        self.ncy_max = self.setjson.get("ncy_max", 40)
+        self.tabu = self.setjson.get("tabu", False)
+        self.tabu_drift = self.setjson.get("tabu_drift", 0.01)
 
         # Set the default location of fp2k.
         if self.fp2k_path == "fp2k":
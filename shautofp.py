@@ -8,6 +8,7 @@ import doc
 import run
 import os
 import json
+import batch
 
 tag = "shautofp->"
 
@@ -15,21 +16,14 @@ tag = "shautofp->"
 
 
 def cmd_run(argv, argn):
+    if "-b" in argv:
+        batch.batch_run(argv, argn)
+        return
+
     root_path_abs = os.path.abspath(argv[0])
     root_dir = os.path.split(root_path_abs)
     print(root_dir[0])
-    cur_dir = os.getcwd()
-    os.chdir(root_dir[0])
-    # os.chdir("../")
-    print("current_dir: ", os.getcwd())
-    com.com_init("cmd", os.getcwd())
-    os.chdir(cur_dir)
-    com.run_mode = 0
-    com.ui = com.sys_stdout
-    setting.run_set.show_log_FP = False
-    setting.run_set.show_rwp = False
-    com.mode = "cmd"
-    com.autofp_running = True
+    cmd_init(root_dir[0])
     print(argv)
 
     if argn < 2:
@@ -37,11 +31,8 @@ def cmd_run(argv, argn):
         doc.show()
         return
 
-    r = run.Run()
-    r.reset(argv[-1])
-    flag_autoselect = False
-
     cycle = 0
+    flag_autoselect = False
     for index, s in enumerate(argv):
         if s == "-c":
             cycle = int(argv[index+1])
@@ -55,6 +46,27 @@ def cmd_run(argv, argn):
             com.wait = n
     print(argv[-1])
 
+    r = run_job(argv[-1], cycle, flag_autoselect)
+    print_json(r)
+    print(tag, "Rwp=", r.Rwp)
+
+
+# init com for the shell mode
+def cmd_init(root):
+    com.com_init("cmd", root)
+    com.run_mode = 0
+    com.ui = com.sys_stdout
+    setting.run_set.show_log_FP = False
+    setting.run_set.show_rwp = False
+    com.mode = "cmd"
+    com.autofp_running = True
+
+
+# autofp one pcr file, return the Run
+def run_job(pcrfile, cycle=0, flag_autoselect=False):
+    r = run.Run()
+    r.reset(pcrfile)
+
     autoeng = subauto.SubAutoRun()
     pl = []
     for i in r.params.paramlist:
@@ -70,10 +82,12 @@ def cmd_run(argv, argn):
     autoeng.reset(r.pcrfilename, pl, r)
     core = Autofp_Core()
     core.reset(r, pl, autoeng, cycle)
-    core.autorunfp()
-    params_dic = {}
-    print_json(r)
-    print(tag, "Rwp=", r.Rwp)
+    try:
+        core.autorunfp()
+    finally:
+        if r.ctx.afl != None:
+            r.ctx.afl.close()  # the job is done, so is its event log
+    return r
 
 
 def print_json(r):
@@ -82,7 +96,7 @@ def print_json(r):
         params_dic[p.parname] = p.realvalue
     params_dic["Rwp"] = r.Rwp
     pjson = json.dumps(params_dic)
-    out = open("par.txt", "w")
+    out = open(r.ctx.path("par.txt"), "w")
     out.write(pjson)
     out.close()
     # print tag,"Rwp=",r.Rwp
@@ -99,7 +113,7 @@ class Autofp_Core:
         """Constructor"""
 
     def write(self, msg, mode=""):
-        print("=>cycle "+str(com.cycle)+": ", msg)
+        print("=>cycle "+str(self.run.ctx.cycle)+": ", msg)
 
     def reset(self, run, pl, subautorun, cycle=0):
         # run=Run(),pl=param_switch,subautorun=SubAutoRun(run),cycle=0
@@ -117,6 +131,7 @@ class Autofp_Core:
         return
 
     def autorunfp_result(self):
+        ctx = self.run.ctx
         self.rwp = self.run.Rwp
         self.write("end! \n Rwp="+str(self.rwp), "ok")
         self.run.resetLoad()
@@ -124,22 +139,22 @@ class Autofp_Core:
 
         # cycles loop
         if com.autofp_running == True:
-            if com.cycle >= self.cycle:
+            if ctx.cycle >= self.cycle:
                 if self.cycle > 0:
-                    com.cycle = 1
+                    ctx.cycle = 1
                 if self.cycle == 0:
-                    if com.des == True or com.cycle > 100:
-                        com.cycle = 1
-                        com.des = False
+                    if ctx.des == True or ctx.cycle > 100:
+                        ctx.cycle = 1
+                        ctx.des = False
                     else:
-                        com.cycle = com.cycle+1
+                        ctx.cycle = ctx.cycle+1
                         self.autorunfp()
             else:
-                com.cycle = com.cycle+1
+                ctx.cycle = ctx.cycle+1
                 self.autorunfp()
         else:
             self.write("autofp has been stoped by user!", style="warning")
-            com.cycle = 1
+            ctx.cycle = 1
             self.done_output()
 
         self.write("complete!")
@@ -0,0 +1,227 @@
+import os
+import shutil
+from diffpy.pyfullprof.fpoutputfileparsers import FPOutFileParser, FPOutFileIndex
+from outfilecheckerror import check
+from subrun import SubRun, run_all
+from run import copy_job_files
+import fpcache
+import com
+
+tag = "specrun->"
+
+
+# one speculative trial: "current accepted state + param i"
+class Trial:
+    def __init__(self, index, path):
+        self.index = index
+        self.path = path  # scratch dir of the trial
+        self.err = 0
+        self.R = {"Rp": 0, "Rwp": 0, "Re": 0, "Chi2": 0}
+        self.subrun = SubRun()
+        self.cycles = []
+        self.ncy = 0       # the NCY of the pcr file of the trial
+        self.entry = None  # fp2k cache slot of the trial
+        self.cached = False
+        self.outindex = None  # FPOutFileIndex of the out file of the trial
+
+
+class SpecRun:
+    '''
+    Speculative evaluation of the next n params of the autorun order.
+    Every candidate is refined in its own scratch dir (tmp/spec=k/) from the
+    current accepted state; the results stay valid until a step is accepted.
+    '''
+
+    def __init__(self, n=2):
+        self.n = n
+        self.trials = {}
+        self.skip = {}  # the params not to run, e.g. screened out by probes
+        self.inputs = []  # the input files copied into the dirs of the trials
+        self.R_back = None
+        self.err_back = 0
+        return
+
+    def reset(self, r):
+        self.r = r
+        self.trials = {}
+        self.stem = os.path.splitext(r.base_pcrfilename)[0]
+        copied = []
+        for k in range(0, self.n):
+            path = self.get_path(k)
+            if os.path.exists(path) == False:
+                os.mkdir(path)
+            copied = copy_job_files(r.dirname, r.base_pcrfilename, r.fit, path)
+        # the inputs of a reset before, as the coarse data, stay in the dirs
+        self.inputs = list(dict.fromkeys(self.inputs + copied))
+        return
+
+    def get_path(self, k):
+        return os.path.join(self.r.tmpdir, "spec="+str(k))
+
+    # run the batch order[pos:pos+n] in parallel
+    def launch(self, order, pos):
+        r = self.r
+        timer = r.ctx.timer
+        self.trials = {}
+        fp2k_path = com.run_set.fp2k_path
+        cache = fpcache.get_cache()
+        if os.path.dirname(fp2k_path) != "":
+            # a relative fp2k path is relative to the pcr dir, as in Run.runfp
+            fp2k_path = os.path.join(r.dirname, fp2k_path)
+        for i in order[pos:pos+self.n]:
+            if i in self.trials or i in self.skip:
+                continue  # same param twice in a batch gives the same result
+            t = Trial(i, self.get_path(len(self.trials)))
+            pcr = os.path.join(t.path, r.base_pcrfilename)
+            out = os.path.join(t.path, self.stem+".out")
+            if os.path.exists(out):
+                os.remove(out)
+            codeword = r.params.get_param_codeword(i)
+            r.setParam(i, True)
+            t.ncy = r.fit.get("NCY")
+            with timer.phase("write_pcr"):
+                r.pcrRW.writeToPcrFile(pcr)
+            r.params.set_param_codeword(i, codeword)
+            if cache != None:
+                with timer.phase("fp_cache"):
+                    t.entry = cache.entry(t.path, r.base_pcrfilename, fp2k_path)
+                    t.cached = t.entry != None and t.entry.load()
+            t.subrun.reset(fp2k_path, r.base_pcrfilename,
+                           "not saved to the current PCR file:", t.path,
+                           r.rwp_limit)
+            self.trials[i] = t
+        # all the fp2k of the batch are supervised by one event loop
+        trials = list(self.trials.values())
+        with timer.phase("fp2k"):
+            run_all([t.subrun for t in trials if t.cached == False])
+        for t in trials:
+            if t.cached == True:
+                t.err = t.subrun.monitor.replay(t.entry.cycles)
+                t.cycles = t.subrun.monitor.history
+            else:
+                t.err = t.subrun.result
+                t.cycles = t.subrun.monitor.history
+                if t.entry != None and t.err == 0:
+                    with timer.phase("fp_cache"):
+                        t.entry.save(t.cycles)
+            with timer.phase("check"):
+                self.load_trial(t)
+        print(tag, "batch", list(self.trials.keys()))
+        return
+
+    # read the R factors of a finished trial, same checks as Run.runfp
+    def load_trial(self, t):
+        out = os.path.join(t.path, self.stem+".out")
+        if t.err != 0:
+            return
+        if os.path.exists(out) == False:
+            t.err = -1
+            return
+        t.outindex = FPOutFileIndex(out)
+        t.err = check(out, t.outindex)
+        if t.err != 0:
+            return
+        try:
+            outR = FPOutFileParser(self.r.fit, out, t.outindex)
+            if outR.getStatus() == False:
+                t.err = 1
+                return
+            r_factor = outR.getResidues(outR.getNumCycles())[0]
+            t.R = {"Rp": r_factor[0], "Rwp": r_factor[1],
+                   "Re": r_factor[2], "Chi2": r_factor[3]}
+        except Exception as e:
+            print(tag, Exception, ":", e)
+            t.err = 13
+
+    # put the result of param i into r.err and r.R, launch a batch if needed
+    def trial(self, r, order, pos):
+        i = order[pos]
+        if i not in self.trials:
+            self.launch(order, pos)
+        t = self.trials[i]
+        self.R_back = r.R
+        self.err_back = r.err
+        r.err = t.err
+        r.R = t.R
+        r.cycles = t.cycles
+        r.cycles_ncy = t.ncy
+        return
+
+    # trial is rejected: the accepted state is unchanged
+    def reject(self, r):
+        r.R = self.R_back
+        r.err = 0
+        return
+
+    # trial is accepted: copy its output into the job dir and load it
+    def accept(self, r, i, clear_one=False):
+        t = self.trials[i]
+        r.dirty = False  # the pcr and out files are replaced by the trial
+        with r.ctx.timer.phase("accept"):
+            for name in os.listdir(t.path):
+                if name.startswith(self.stem) and name not in self.inputs:
+                    shutil.copyfile(os.path.join(t.path, name),
+                                    os.path.join(r.dirname, name))
+        self.trials = {}  # later trials were run from the old state
+        r.err = 0
+        r.setParam(i, True)  # as in the pcr file of the trial
+        if r.updateLoad(t.outindex) != 0:
+            r.err += r.resetLoad(t.outindex)
+        if r.err == 0:
+            r.push()
+        if clear_one == True:
+            r.setParam(i, False)
+        r.writepcr()
+        return
+
+
+class ProbeRun(SpecRun):
+    '''
+    Screening of the candidates of a group: every candidate is refined for
+    one cycle (NCY=1) from the current accepted state, n at a time in
+    parallel in tmp/probe=k/. Only the R factors of a probe are used, it is
+    never accepted. The dirs are made, and the input files copied, once
+    after reset(), as they are needed.
+    '''
+
+    def __init__(self, n=None):
+        if n == None:
+            n = max(com.run_set.spec_n, os.cpu_count() or 1)
+        SpecRun.__init__(self, n)
+        self.made = 0  # the probe dirs made since reset()
+        return
+
+    def reset(self, r):
+        self.r = r
+        self.trials = {}
+        self.stem = os.path.splitext(r.base_pcrfilename)[0]
+        self.made = 0
+        return
+
+    def get_path(self, k):
+        return os.path.join(self.r.tmpdir, "probe="+str(k))
+
+    # the result of one cycle of every candidate: i -> (err, R)
+    def probe(self, r, candidates):
+        candidates = list(dict.fromkeys(candidates))
+        for k in range(self.made, min(len(candidates), self.n)):
+            path = self.get_path(k)
+            if os.path.exists(path) == False:
+                os.mkdir(path)
+            self.inputs = copy_job_files(r.dirname, r.base_pcrfilename, r.fit, path)
+            self.made = k+1
+        ncy = r.fit.get("NCY")
+        rwp_limit = r.rwp_limit
+        r.fit.set("NCY", 1)
+        r.rwp_limit = None  # the monitor needs more than one cycle
+        result = {}
+        try:
+            for pos in range(0, len(candidates), self.n):
+                self.launch(candidates, pos)
+                for i, t in self.trials.items():
+                    result[i] = (t.err, t.R)
+        finally:
+            r.fit.set("NCY", ncy)
+            r.rwp_limit = rwp_limit
+            self.trials = {}
+        return result
@@ -0,0 +1,142 @@
+import os
+import time
+import json
+import threading
+import setting
+
+tag = "steptimer->"
+
+
+class NoPhase:
+    '''
+    The phase of a timer that is off: nothing is timed.
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+no_phase = NoPhase()
+
+
+class Phase:
+    '''
+    A timed phase of a step, used as a with block.
+    '''
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.name, self.wall, time.perf_counter()-self.wall,
+                       time.thread_time()-self.cpu)
+        return False
+
+
+class StepTimer:
+    '''
+    Wall and cpu time of the phases of every step of autorun: write pcr,
+    fp2k, check of the out file, update or read of the fit, ParamList,
+    push, pop and log. Every step is a record of steps, every phase an
+    event of a trace in Chrome trace-event format (chrome://tracing).
+    The cpu time is the one of the thread, fp2k runs in its own process.
+    Off, phase() returns no_phase and nothing is recorded.
+    '''
+
+    def __init__(self, enabled=None):
+        if enabled == None:
+            enabled = setting.run_set.step_timing
+        self.enabled = enabled
+        self.t0 = time.perf_counter()
+        self.steps = []      # {"step", "param", "wall", "cpu", "phases": {name: [wall, cpu, n]}}
+        self.totals = {}     # name -> [wall, cpu, n] of all the phases
+        self.events = []     # trace events
+        self.current = None  # record of the step being run
+        self.lock = threading.Lock()
+        return
+
+    def phase(self, name):
+        if self.enabled == False:
+            return no_phase
+        return Phase(self, name)
+
+    def begin_step(self, step, param):
+        if self.enabled == False:
+            return
+        self.current = {"step": step, "param": param, "wall": 0.0, "cpu": 0.0,
+                        "phases": {}, "start": time.perf_counter(),
+                        "start_cpu": time.thread_time()}
+        return
+
+    def end_step(self, **result):
+        if self.enabled == False or self.current == None:
+            return
+        record = self.current
+        self.current = None
+        start = record.pop("start")
+        record["wall"] = time.perf_counter()-start
+        record["cpu"] = time.thread_time()-record.pop("start_cpu")
+        record.update(result)
+        with self.lock:
+            self.steps.append(record)
+            self.events.append(self.event(
+                "step {}: {}".format(record["step"], record["param"]), start,
+                record["wall"], record["cpu"], "step"))
+        return
+
+    # a phase is finished
+    def add(self, name, start, wall, cpu):
+        with self.lock:
+            total = self.totals.setdefault(name, [0.0, 0.0, 0])
+            total[0] += wall
+            total[1] += cpu
+            total[2] += 1
+            if self.current != None:
+                phase = self.current["phases"].setdefault(name, [0.0, 0.0, 0])
+                phase[0] += wall
+                phase[1] += cpu
+                phase[2] += 1
+            self.events.append(self.event(name, start, wall, cpu, "phase"))
+        return
+
+    def event(self, name, start, wall, cpu, cat):
+        return {"name": name, "cat": cat, "ph": "X", "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "ts": round((start-self.t0)*1e6, 1), "dur": round(wall*1e6, 1),
+                "args": {"cpu_ms": round(cpu*1e3, 3)}}
+
+    # the trace file, the records of the steps are in otherData
+    def write_trace(self, path):
+        with self.lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms",
+                     "otherData": {"steps": list(self.steps)}}
+        f = open(path, "w")
+        json.dump(trace, f)
+        f.close()
+        return
+
+    # a table of the time of every phase, the most expensive first,
+    # % is of the time since the timer is made
+    def summary(self):
+        elapsed = time.perf_counter()-self.t0
+        with self.lock:
+            totals = dict(self.totals)
+            step_wall = sum([s["wall"] for s in self.steps])
+        lines = ["{:14s} {:>6s} {:>10s} {:>10s} {:>10s} {:>6s}".format(
+            "phase", "n", "wall s", "mean ms", "cpu s", "%")]
+        for name, (wall, cpu, n) in sorted(totals.items(), key=lambda x: -x[1][0]):
+            percent = wall/elapsed*100
+            lines.append("{:14s} {:6d} {:10.3f} {:10.3f} {:10.3f} {:6.1f}".format(
+                name, n, wall, wall/n*1e3, cpu, percent))
+        lines.append("{:14s} {:6d} {:10.3f} {:>10s} {:>10s} {:6.1f}".format(
+            "steps", len(self.steps), step_wall, "", "", step_wall/elapsed*100))
+        return "\n".join(lines)
@@ -53,6 +53,7 @@ strategy={
             "manual background"            
         ],
         # target function, the valid variable : R_Factor["Rwp"], R_Factor["Rp"], R_Factor["Chi2"]
+        # a weighted sum is allowed, e.g. 'MIN=0.7*R_Factor["Rwp"]+0.3*R_Factor["Chi2"]'
         # MIN = minimum function 
         'target':'MIN=R_Factor["Rwp"]'
         }
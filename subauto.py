@@ -27,7 +27,8 @@ class SubAutoRun(object):
         self.r = r
         self.param_order_num = param_order_num
         self.result = 0
-        auto.option_this["alt"] = self
+        self.option = dict(auto.option_this)
+        self.option["alt"] = self
         # QtCore.QObject.connect(self,QtCore.SIGNAL(_fromUtf8("complete()")),com.ui,SLOT(_fromUtf8("autorunfp_result()")))
         return
 
@@ -55,16 +56,17 @@ class SubAutoRun(object):
             setting.run_set.show_rwp = com.ui.ui.check_show_rwp.isChecked()
             setting.run_set.show_log_FP = com.ui.ui.check_show_fp.isChecked()
             if(setting.run_set.show_rwp == True):
-                com.plot.show_Rwp_animation() # start Rwp animation
+                com.plot.show_Rwp_animation(cycle=self.r.ctx.cycle) # start Rwp animation
             if(setting.run_set.show_log_FP == True):
                 sys.stdout = com.ui # redirect stdout to UI
             else:
                 sys.stdout = com.sys_stdout
 
-        auto.rwplist = []
-        auto.rwplist_all = []
+        if self.r != None:
+            self.r.ctx.rwplist = []
+            self.r.ctx.rwplist_all = []
         self.result = threading.Thread(target=autorun, args=(
-            self.pcrname, self.param_switch, self.r, self.param_order_num))
+            self.pcrname, self.param_switch, self.r, self.param_order_num, self.option))
         self.result.start()
 
         return self.result
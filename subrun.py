@@ -1,96 +1,209 @@
 import subprocess
+import asyncio
+import collections
 import signal
-import time
 import os
+import re
 import com
 import sys
 
 n_debug = 0
 
+
+class CycleMonitor:
+    '''
+    Follow the R factors of every cycle that fp2k prints on stdout, and stop
+    a refinement whose outcome is already clear:
+    diverge_n: Chi2 goes up diverge_n cycles in a row, err -35
+    stall_n, stall_eps: the relative change of Rwp is below stall_eps for
+        stall_n cycles while Rwp is worse than rwp_limit by more than
+        stall_eps, err -36
+    0 turns a check off.
+    '''
+    CycleRe = re.compile(r"CYCLE:\s*(\d+)")
+    RRe = re.compile(
+        r"Rp:\s*(\S+)\s+Rwp:\s*(\S+)\s+Rexp:\s*(\S+)\s+Chi2:\s*(\S+)")
+
+    def __init__(self, diverge_n=3, stall_n=3, stall_eps=0.001, rwp_limit=None):
+        self.diverge_n = diverge_n
+        self.stall_n = stall_n
+        self.stall_eps = stall_eps
+        self.rwp_limit = rwp_limit
+        self.history = []  # R factors of every cycle: {"cycle", "Rp", "Rwp", "Re", "Chi2"}
+        self.current = None
+        return
+
+    # read a line of fp2k, return the error code
+    def feed(self, line):
+        m = self.CycleRe.search(line)
+        if m != None:
+            self.current = {"cycle": int(m.group(1))}
+            return 0
+        m = self.RRe.search(line)
+        if m == None or self.current == None:
+            return 0
+        try:
+            R = [float(x) for x in m.groups()]
+        except ValueError:
+            return 0
+        if "Rwp" in self.current:
+            return 0  # several patterns: the R of the first one is kept
+        self.current.update({"Rp": R[0], "Rwp": R[1], "Re": R[2], "Chi2": R[3]})
+        self.history.append(self.current)
+        return self.check()
+
+    def check(self):
+        h = self.history
+        n = self.diverge_n
+        if n > 0 and len(h) > n:
+            up = True
+            for k in range(len(h)-n, len(h)):
+                if not h[k]["Chi2"] > h[k-1]["Chi2"]:
+                    up = False
+            if up:
+                print("fp2k diverges: Chi2", [c["Chi2"] for c in h[-n-1:]])
+                return -35
+        n = self.stall_n
+        if n > 0 and self.rwp_limit != None and len(h) > n:
+            if h[-1]["Rwp"] <= self.rwp_limit*(1+self.stall_eps):
+                return 0  # may still end as good as the best
+            for k in range(len(h)-n, len(h)):
+                if abs(h[k]["Rwp"]-h[k-1]["Rwp"]) > self.stall_eps*abs(h[k-1]["Rwp"]):
+                    return 0
+            print("fp2k no progress: Rwp", [c["Rwp"] for c in h[-n-1:]],
+                  ">=", self.rwp_limit)
+            return -36
+        return 0
+
+    # check the cycles of a finished run, as if they were read from fp2k now
+    def replay(self, history):
+        self.history = []
+        for c in history:
+            self.history.append(c)
+            err = self.check()
+            if err != 0:
+                return err
+        return 0
+
 class SubRun:
+    '''
+    Run fp2k as a child process of an asyncio event loop: stdout is read as
+    it comes, an error or a timeout kills only this child, the last lines of
+    stdout and stderr are kept in ring buffers.
+    '''
+    buffer_n = 200  # lines kept of stdout and stderr
+
     def __init__(self):
         return
 
-    def reset(self, ins, arg, err):
+    def reset(self, ins, arg, err, cwd=None, rwp_limit=None, timeout=None):
         self.ins = ins
         self.arg = arg
         self.err_string = err
+        self.cwd = cwd  # None: run fp2k in the current dir
         self.result = 0
+        self.rp = None
+        self.stdout = collections.deque(maxlen=self.buffer_n)
+        self.stderr = collections.deque(maxlen=self.buffer_n)
+        if timeout == None:
+            timeout = com.run_set.fp2k_timeout
+        self.timeout = timeout  # seconds, 0: no timeout
+        self.monitor = CycleMonitor(rwp_limit=rwp_limit, **com.run_set.monitor)
         return
 
     def run(self):
+        asyncio.run(self.run_async())
+        return self.result
+
+    async def run_async(self):
         self.result = 0
+        option = {"stdout": subprocess.PIPE, "stderr": subprocess.PIPE,
+                  "cwd": self.cwd}
+        if os.name == "nt":
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupinfo.wShowWindow = subprocess.SW_HIDE
+            option["startupinfo"] = startupinfo
+        else:
+            option["start_new_session"] = True  # kill() takes the process group
 
-        if com.mode == "ui":
-            if os.name == "nt":
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                startupinfo.wShowWindow = subprocess.SW_HIDE
-                self.rp = subprocess.Popen(
-                    [self.ins, self.arg], stdout=subprocess.PIPE, startupinfo=startupinfo)
-            else:
-                self.rp = subprocess.Popen(
-                    [self.ins, self.arg], stdout=subprocess.PIPE)
         try:
-            if com.mode == "cmd":
-                if os.name == "nt":
-                    startupinfo = subprocess.STARTUPINFO()
-                    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-                    startupinfo.wShowWindow = subprocess.SW_HIDE
-                    
-                    if sys.version_info[0] >= 3:
-                        self.rp = subprocess.Popen(
-                            # [self.ins, self.arg], stdout=subprocess.PIPE, startupinfo=startupinfo, shell=True,  universal_newlines=True)
-                            [self.ins, self.arg], stdout=subprocess.PIPE, startupinfo=startupinfo, shell=True)
-                    if sys.version_info[0] < 3:
-                        self.rp = subprocess.Popen(
-                        [self.ins, self.arg], stdout=subprocess.PIPE, startupinfo=startupinfo, shell=True, bufsize=1)
-                else:
-                    self.rp = subprocess.Popen(
-                        [self.ins, self.arg], stdout=subprocess.PIPE)
-
-            
-            while self.rp.poll() == None:
-                outstr = self.rp.stdout.readline().decode("utf-8")
-                if outstr.find(self.err_string) != -1:
-                    self.result = -30
-                if outstr.find("Rwp") != -1:
-                    print(">>>"+outstr)
-                    if outstr.find("NaN") != -1:
-                        self.result = -34
-                # kill subprocess and fp2k when meet error
-                if self.result != 0:
-                    print("fp2k meet error, please wait fp2k exit ... ")
-                    self.rp.terminate()
-                    self.rp.kill()
-                    fp2k_name = os.path.basename(
-                        self.ins)  # get fp2k prcocess name
-                    if os.name == "nt":
-                        # os.system("taskkill /PID {} /F".format(self.rp.pid))
-                        os.system("taskkill /IM {} /F".format(fp2k_name))
-                        # os.system(u"taskkill /IM {}(32 *) /F".format(fp2k_name).encode("gbk"))
-                    if os.name == "posix":
-                        os.system("pkill -f {}".format(fp2k_name))
-                    break
-            self.rp.wait()
+            self.rp = await asyncio.create_subprocess_exec(self.ins, self.arg, **option)
+            tasks = asyncio.gather(self.read_stdout(), self.read_stderr(), self.rp.wait())
+            if self.timeout > 0:
+                try:
+                    await asyncio.wait_for(tasks, self.timeout)
+                except asyncio.TimeoutError:
+                    print("fp2k timeout {}s, kill it".format(self.timeout))
+                    self.result = -37
+                    self.kill()
+            else:
+                await tasks
+            await self.rp.wait()
 
         except Exception as e:
-            print("subprocess: fp2k error!")
-            # begin python 2 - python 2 + 3
-            if sys.version_info[0] >= 3:
-                tb = e.__traceback__
-                while tb:
-                    print("file: ", tb.tb_frame.f_code.co_filename, "line: ", tb.tb_lineno)
-                    tb = tb.tb_next
-            # end
-        
+            print("subprocess: fp2k error!", e)
+            tb = e.__traceback__
+            while tb:
+                print("file: ", tb.tb_frame.f_code.co_filename, "line: ", tb.tb_lineno)
+                tb = tb.tb_next
+        finally:
+            self.kill()  # cancelled (Ctrl-C): no fp2k is left running
+
         print(">>> fp2k is finished.")
         if self.result != 0:
             print(">>> fp2k error {}".format(self.result))
-        
-        # global n_debug
-        # n_debug += 1
-        # if n_debug >= 10  :
-        #     sys.exit(0)
 
         return self.result
+
+    async def read_stdout(self):
+        while True:
+            line = await self.rp.stdout.readline()
+            if not line:
+                break
+            outstr = line.decode("utf-8", "replace")
+            self.stdout.append(outstr)
+            if self.result != 0:
+                continue  # killed, read the rest of the pipe
+            if outstr.find(self.err_string) != -1:
+                self.result = -30
+            if outstr.find("Rwp") != -1:
+                print(">>>"+outstr)
+                if outstr.find("NaN") != -1:
+                    self.result = -34
+            if self.result == 0:
+                self.result = self.monitor.feed(outstr)
+            # kill fp2k when meet error
+            if self.result != 0:
+                print("fp2k meet error, please wait fp2k exit ... ")
+                self.kill()
+
+    async def read_stderr(self):
+        while True:
+            line = await self.rp.stderr.readline()
+            if not line:
+                break
+            self.stderr.append(line.decode("utf-8", "replace"))
+
+    # kill the own fp2k only, other fp2k (speculative trials, other jobs)
+    # may be running at the same time
+    def kill(self):
+        if self.rp == None or self.rp.returncode != None:
+            return
+        try:
+            if os.name == "nt":
+                os.system("taskkill /PID {} /T /F".format(self.rp.pid))
+                self.rp.kill()
+            else:
+                os.killpg(self.rp.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        return
+
+
+# run several SubRun at the same time in one event loop,
+# return the results in the same order
+def run_all(subruns):
+    async def run_tasks():
+        return await asyncio.gather(*[s.run_async() for s in subruns])
+    return asyncio.run(run_tasks())
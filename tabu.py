@@ -0,0 +1,68 @@
+import hashlib
+import numpy
+import setting
+
+tag = "tabu->"
+
+# the errors of Run (run.error_info) which depend only on the param and the
+# state: fp2k failed on them. Not the stops by the monitor or the timeout
+# (-35, -36, -37), which depend on the best Rwp and the load of the
+# machine, nor the errors of autofp itself (11, 12, 13) or a missing out file
+failures = [1, -30, -31, -32, -33, -34]
+
+
+class TabuTable:
+    '''
+    Memo of the failed trials of autorun, across the cycles of autofp: a
+    param which made fp2k fail (failures) or a worse target in a complete
+    run is not tried again from the same accepted state. The key is the index of the param and a hash of the
+    params refined in the state (the code words of Fit.snapshot()); an
+    entry is expired when a value of the state has drifted more than drift
+    (relative) since the trial.
+    '''
+    floor = 1e-3  # the drift of a value smaller than floor is relative to floor
+
+    def __init__(self, drift=None):
+        if drift == None:
+            drift = setting.run_set.tabu_drift
+        self.drift = drift
+        self.entries = {}  # (index, hash) -> {"values", "err", "target", "cycle"}
+        self.saved = 0     # fp2k runs saved
+        self.expired = 0
+        return
+
+    def key(self, i, state):
+        n = len(state)//4
+        refined = numpy.asarray(state[2*n:3*n] != 0, dtype=numpy.uint8)
+        return (i, hashlib.sha1(refined.tobytes()).hexdigest())
+
+    # the entry of param i if it failed from the state, expired entries are
+    # removed
+    def match(self, i, state):
+        key = self.key(i, state)
+        entry = self.entries.get(key)
+        if entry == None:
+            return None
+        n = len(state)//4
+        values = state[:n]
+        drift = numpy.abs(values-entry["values"]) / \
+            numpy.maximum(numpy.abs(entry["values"]), self.floor)
+        if len(drift) > 0 and drift.max() > self.drift:
+            del self.entries[key]
+            self.expired += 1
+            return None
+        return entry
+
+    # as match, the run of the trial is saved
+    def lookup(self, i, state):
+        entry = self.match(i, state)
+        if entry != None:
+            self.saved += 1
+        return entry
+
+    # the trial of param i from the state failed: err of Run, target
+    def add(self, i, state, err, target, cycle=0):
+        n = len(state)//4
+        self.entries[self.key(i, state)] = {"values": state[:n].copy(), "err": err,
+                                            "target": target, "cycle": cycle}
+        return
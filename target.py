@@ -0,0 +1,82 @@
+import re
+import ast
+
+tag = "target->"
+
+# the R factors of a step: Run.R
+r_names = ["Rp", "Rwp", "Re", "Chi2"]
+
+# functions a target can call
+functions = {"abs": abs, "min": min, "max": max}
+
+BinOps = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow)
+UnaryOps = (ast.UAdd, ast.USub)
+
+
+class Target:
+    '''
+    The target function of a strategy, minimized by autorun: an expression
+    of the R factors, as 'MIN=R_Factor["Rwp"]' or
+    'MIN=0.7*R_Factor["Rwp"]+0.3*R_Factor["Chi2"]', or a dict of weights as
+    {"Rwp": 0.7, "Chi2": 0.3}. The expression is checked and compiled once,
+    target(R) takes the R factor dict and returns a float.
+    Numbers, + - * / **, abs(), min(), max() and R_Factor["name"] with a
+    name of r_names are allowed, anything else raises ValueError.
+    '''
+
+    def __init__(self, spec='MIN=R_Factor["Rwp"]'):
+        if isinstance(spec, dict):
+            terms = ['{!r}*R_Factor["{}"]'.format(float(w), name)
+                     for name, w in spec.items()]
+            spec = "MIN=" + "+".join(terms)
+        self.spec = spec
+        self.string = spec.strip()
+        expr = re.sub(r"^MIN\s*=", "", self.string).strip()
+        try:
+            tree = ast.parse(expr, mode="eval")
+        except SyntaxError as e:
+            raise ValueError("target '{}': {}".format(spec, e))
+        self.check(tree.body)
+        self.code = compile(tree, "<target>", "eval")
+        # the name shown to the user, "Rwp" for MIN=R_Factor["Rwp"]
+        name = re.sub(r'R_Factor\s*\[\s*["\'](\w+)["\']\s*\]', r"\1", expr)
+        self.name = re.sub(r"\s", "", name)
+        return
+
+    def check(self, node):
+        if isinstance(node, ast.BinOp) and isinstance(node.op, BinOps):
+            self.check(node.left)
+            self.check(node.right)
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, UnaryOps):
+            self.check(node.operand)
+        elif isinstance(node, ast.Constant) and type(node.value) in [int, float]:
+            pass
+        elif isinstance(node, ast.Subscript):
+            if not (isinstance(node.value, ast.Name) and node.value.id == "R_Factor"
+                    and isinstance(node.slice, ast.Constant)
+                    and node.slice.value in r_names):
+                raise ValueError("target '{}': only R_Factor[name], name in {}".format(
+                    self.spec, r_names))
+        elif isinstance(node, ast.Call):
+            if not (isinstance(node.func, ast.Name) and node.func.id in functions
+                    and node.keywords == [] and len(node.args) > 0):
+                raise ValueError("target '{}': only the functions {}".format(
+                    self.spec, list(functions.keys())))
+            for arg in node.args:
+                self.check(arg)
+        else:
+            raise ValueError("target '{}': '{}' is not allowed".format(
+                self.spec, type(node).__name__))
+        return
+
+    def __call__(self, R):
+        namespace = {"__builtins__": {}, "R_Factor": R}
+        namespace.update(functions)
+        try:
+            return float(eval(self.code, namespace))
+        except (ZeroDivisionError, OverflowError):
+            return float("nan")  # autorun takes it as an error of the step
+
+    # the code is made again from the spec, e.g. in a worker process
+    def __reduce__(self):
+        return (Target, (self.spec,))
@@ -0,0 +1,74 @@
+# tests of the coarse copies of the data files, coarse.decimate
+# usage: python -m pytest tests
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import coarse
+
+
+def read_lines(path):
+    f = open(path)
+    lines = f.read().splitlines()
+    f.close()
+    return lines
+
+
+class TestDecimate(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_free_format(self):
+        src = os.path.join(root, "example", "pbsox", "pbsox.dat")
+        dest = os.path.join(self.dir, coarse.coarse_name("pbsox.dat", 3))
+        self.assertEqual(os.path.basename(dest), "pbsox_coarse3.dat")
+        self.assertTrue(coarse.decimate(src, dest, 3, 0))
+        lines = read_lines(src)
+        head = lines[0].split()
+        values = " ".join(lines[1:]).split()
+        new = read_lines(dest)
+        new_head = new[0].split()
+        new_values = " ".join(new[1:]).split()
+        self.assertEqual(new_values, values[::3])
+        self.assertAlmostEqual(float(new_head[0]), float(head[0]))
+        self.assertAlmostEqual(float(new_head[1]), float(head[1])*3)
+        self.assertAlmostEqual(float(new_head[2]),
+                               float(head[0])+(len(new_values)-1)*float(head[1])*3, places=5)
+
+    def test_free_format_wide_values(self):
+        # values as wide as the field are still separated
+        lines = ["10.0 0.05 10.55 comment", " ".join(["123456789"]*12)]
+        text = coarse.decimate_free(lines, 2)
+        self.assertEqual(text.split()[3:], ["comment"] + ["123456789"]*6)
+
+    def test_xy(self):
+        src = os.path.join(self.dir, "xy.dat")
+        f = open(src, "w")
+        f.write("XYDATA\nINTER 1 1 0\nTEMP 300\nh3\nh4\nh5\n")
+        for k in range(0, 10):
+            f.write("{} {} {}\n".format(10+k*0.1, 100+k, 10))
+        f.close()
+        dest = os.path.join(self.dir, "xy_coarse2.dat")
+        self.assertTrue(coarse.decimate(src, dest, 2, 10))
+        lines = read_lines(dest)
+        self.assertEqual(lines[:6], read_lines(src)[:6])
+        self.assertEqual([float(line.split()[1]) for line in lines[6:]], [100, 102, 104, 106, 108])
+
+    def test_not_made(self):
+        src = os.path.join(root, "example", "pbsox", "pbsox.dat")
+        dest = os.path.join(self.dir, "out.dat")
+        self.assertFalse(coarse.decimate(src, dest, 2, 6))  # not a coarse format
+        self.assertFalse(coarse.decimate(src, dest, 1, 0))
+        self.assertFalse(coarse.decimate(os.path.join(self.dir, "none.dat"), dest, 2, 0))
+        self.assertFalse(os.path.exists(dest))
+
+
+if __name__ == "__main__":
+    unittest.main()
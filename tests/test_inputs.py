@@ -0,0 +1,79 @@
+# tests of the input files of a job, which are copied into the dirs of the
+# speculative trials, of the probes and of the batch jobs
+# usage: python -m pytest tests
+import os
+import io
+import sys
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import run
+from pcrfilehelper import pcrFileHelper
+
+example = os.path.join(root, "example", "pbso4")
+
+
+def read_fit(pcr):
+    helper = pcrFileHelper()
+    with contextlib.redirect_stdout(io.StringIO()):
+        helper.readFromPcrFile(pcr)
+    return helper.fit
+
+
+class TestJobInputFiles(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for name in ["pbso4.pcr", "pbso4.dat", "pbso4.out", "pbso4.sum", "pbso4.pcr_back"]:
+            shutil.copyfile(os.path.join(example, name), os.path.join(self.dir, name))
+        for name in ["pbso4.bac", "other.dat", "pbso4.pcr_rwplist.txt"]:
+            open(os.path.join(self.dir, name), "w").close()
+        self.fit = read_fit(os.path.join(self.dir, "pbso4.pcr"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_files_of_the_job(self):
+        names = run.job_input_files(self.dir, "pbso4.pcr", self.fit)
+        # the data and background files, no output file, no file of another job
+        self.assertEqual(sorted(names), ["pbso4.bac", "pbso4.dat"])
+
+    def test_named_resolution_file(self):
+        os.mkdir(os.path.join(self.dir, "irf"))
+        open(os.path.join(self.dir, "irf", "d1a.irf"), "w").close()
+        pattern = self.fit.get("Pattern")[0]
+        pattern.set("Res", 1)
+        pattern.set("Resofile", "irf/d1a.irf")
+        names = run.job_input_files(self.dir, "pbso4.pcr", self.fit)
+        self.assertIn(os.path.join("irf", "d1a.irf"), names)
+
+        dest = os.path.join(self.dir, "spec=0")
+        os.mkdir(dest)
+        copied = run.copy_job_files(self.dir, "pbso4.pcr", self.fit, dest)
+        self.assertEqual(copied, names)
+        for name in names:
+            self.assertTrue(os.path.isfile(os.path.join(dest, name)))
+
+    def test_missing_file(self):
+        pattern = self.fit.get("Pattern")[0]
+        pattern.set("Res", 1)
+        pattern.set("Resofile", "missing.irf")
+        self.assertRaises(IOError, run.job_input_files, self.dir, "pbso4.pcr", self.fit)
+        pattern.set("Res", 0)  # no resolution file is read
+        run.job_input_files(self.dir, "pbso4.pcr", self.fit)
+
+    def test_file_outside_the_dir(self):
+        pattern = self.fit.get("Pattern")[0]
+        os.mkdir(os.path.join(self.dir, "job"))
+        shutil.copyfile(os.path.join(self.dir, "pbso4.pcr"),
+                        os.path.join(self.dir, "job", "pbso4.pcr"))
+        pattern.set("Datafile", "../pbso4.dat")
+        self.assertRaises(IOError, run.job_input_files,
+                          os.path.join(self.dir, "job"), "pbso4.pcr", self.fit)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+# tests of the adaptive NCY of the steps of autorun, ncycontrol.NcyControl,
+# and of the speculative trials of autorun with it: a batch of trials does
+# not run params of the next group, whose NCY is not known yet
+# fp2k is replaced by benchmarks/fakefp2k.py, no FullProf is needed
+# usage: python -m pytest tests
+import os
+import io
+import sys
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, "benchmarks"))
+import run  # before com
+import com
+import auto
+import setting
+import specrun
+from ncycontrol import NcyControl
+from bench_pipeline import make_fp2k, copy_job
+
+
+# the R factors of the cycles of a run, as Run.cycles
+def cycles(rwps):
+    return [{"Rwp": rwp} for rwp in rwps]
+
+
+class TestNcyControl(unittest.TestCase):
+    def test_start(self):
+        control = NcyControl(10, 2, 40)
+        self.assertEqual(control.get(0), 10)
+        self.assertEqual(control.get(3), 10)
+        self.assertEqual(NcyControl(100, 2, 40).get(0), 40)
+        self.assertEqual(NcyControl(1, 2, 40).get(0), 2)
+
+    def test_converged(self):
+        control = NcyControl(10, 2, 40)
+        # the Rwp stops moving at the 4th cycle: 3 cycles were needed
+        self.assertEqual(control.update(1, cycles([30, 25, 22, 22.005, 22.001]), 10), 4)
+        self.assertEqual(control.get(1), 4)
+        self.assertEqual(control.get(2), 10)  # another group
+
+    def test_still_moving(self):
+        control = NcyControl(10, 2, 40)
+        self.assertEqual(control.update(1, cycles([30, 28, 26, 24]), 4), 8)
+        self.assertEqual(control.update(1, cycles(range(40, 32, -1)), 8), 16)
+        self.assertEqual(control.update(1, cycles(range(40, 24, -1)), 16), 32)
+        self.assertEqual(control.update(1, cycles(range(40, 8, -1)), 32), 40)  # ncy_max
+
+    def test_limits(self):
+        control = NcyControl(10, 3, 40)
+        self.assertEqual(control.update(0, cycles([30, 30]), 10), 3)  # ncy_min
+        self.assertEqual(control.update(0, [], 10), 3)  # no cycle: kept
+        # a run stopped before its NCY, still moving: the cycles it ran, plus one
+        self.assertEqual(control.update(0, cycles([30, 28, 26, 24, 22]), 10), 6)
+
+
+class TestTrialsOfGroup(unittest.TestCase):
+    def setUp(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            com.com_init("cmd", root)
+        com.run_mode = 0
+        com.mode = "cmd"
+        com.ui = io.StringIO()
+        self.dir = tempfile.mkdtemp()
+        self.saved = dict(setting.run_set.__dict__)
+        setting.run_set.show_rwp = False
+        setting.run_set.fp_cache = False
+        setting.run_set.fp2k_path = make_fp2k(self.dir)
+        setting.run_set.spec_n = 3
+        setting.run_set.adaptive_ncy = True
+
+    def tearDown(self):
+        setting.run_set.__dict__.update(self.saved)
+        com.autofp_running = False
+        shutil.rmtree(self.dir)
+
+    def test_batch_in_group(self):
+        src = os.path.join(root, "example", "Y2O3")
+        dest = copy_job(src, os.path.join(self.dir, "Y2O3"))
+        os.environ["AUTOFP_FAKE_SRC"] = src
+        launched = []
+        launch = specrun.SpecRun.launch
+
+        def record(spec, order, pos):
+            launched.append((pos, len(order)))
+            return launch(spec, order, pos)
+        specrun.SpecRun.launch = record
+        com.autofp_running = True
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                r = run.Run()
+                r.reset(os.path.join(dest, "Y2O3.pcr"))
+                auto.autorun(r.pcrfilename, None, r)
+        finally:
+            specrun.SpecRun.launch = launch
+        ends = []  # the end of the group of every position of the order
+        Pg = auto.paramgroup.Pgs[r.job]
+        switch = [True]*len(r.params.paramlist)
+        for g in Pg.Param_Num_Order:
+            n = len(Pg.get_order(r.params, switch, [g]))
+            ends.extend([len(ends)+n]*n)
+        self.assertGreater(len(launched), 1)
+        self.assertTrue(any([ends[pos]-pos > 1 for pos, end in launched]))
+        for pos, end in launched:
+            self.assertEqual(end, ends[pos])  # the order is cut at the group end
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+# tests of the lookup of params by alias fragment, ParamList.find_alias, and
+# of the order of autorun made from it, paramgroup.get_order
+# usage: python -m pytest tests
+import os
+import io
+import sys
+import unittest
+import contextlib
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import run  # before com
+import paramgroup
+from paramlist import ParamList
+from pcrfilehelper import pcrFileHelper
+
+jobs = ["Y2O3", "pbso4", "pbsox", "tbbaco"]
+
+
+def read_params(job):
+    helper = pcrFileHelper()
+    with contextlib.redirect_stdout(io.StringIO()):
+        helper.readFromPcrFile(os.path.join(root, "example", job, job+".pcr"))
+    fit = helper.fit
+    job_type = fit.get("Pattern")[0].get("Job")
+    return ParamList(fit.getParamList(), job_type, fit), paramgroup.Pgs[job_type]
+
+
+class TestFindAlias(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.params = dict([(job, read_params(job)) for job in jobs])
+
+    def test_same_as_search(self):
+        for job, (params, Pg) in self.params.items():
+            names = [name for group in Pg.Param_Order_Group for name in group]
+            names += ["", "[", "Atom[1]", "no such param"]
+            for name in names:
+                found = [j for j, alias in enumerate(params.alias) if alias.find(name) != -1]
+                self.assertEqual(params.find_alias(name), found, (job, name))
+                self.assertEqual(params.find_alias(name), found)  # kept
+
+    def test_not_across_aliases(self):
+        params, Pg = self.params["Y2O3"]
+        for j in range(0, len(params.alias)-1):
+            pattern = params.alias[j][-2:] + params.alias[j+1][:2]
+            found = [k for k, alias in enumerate(params.alias) if alias.find(pattern) != -1]
+            self.assertEqual(params.find_alias(pattern), found)
+
+    def test_order(self):
+        for job, (params, Pg) in self.params.items():
+            switch = [j % 3 != 1 for j in range(0, len(params.paramlist))]
+            order = []
+            for group in Pg.Param_Order_Group:
+                for name in group:
+                    order += [j for j, alias in enumerate(params.alias)
+                              if alias.find(name) != -1 and switch[j] == True]
+            self.assertEqual(Pg.get_order(params, switch, Pg.Param_Num_Order), order, job)
+
+
+if __name__ == "__main__":
+    unittest.main()
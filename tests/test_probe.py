@@ -0,0 +1,69 @@
+# tests of the probe screening of autorun, auto.screen: the candidates of a
+# group are put in the order of their one-cycle probes, the ones which made
+# the target worse are screened out, a failed probe is still refined
+# usage: python -m pytest tests
+import os
+import io
+import sys
+import unittest
+import contextlib
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import run  # before com
+import auto
+from context import RefinementContext
+from paramlist import ParamList
+from pcrfilehelper import pcrFileHelper
+
+
+# the probes of ProbeRun.probe, given: i -> (err, R)
+class GivenProbes:
+    def __init__(self, result):
+        self.result = result
+        self.candidates = None
+
+    def probe(self, r, candidates):
+        self.candidates = list(candidates)
+        return dict([(i, self.result[i]) for i in candidates])
+
+
+def rwp(value):
+    return {"Rp": 0, "Rwp": value, "Re": 0, "Chi2": 0}
+
+
+class TestScreen(unittest.TestCase):
+    def setUp(self):
+        helper = pcrFileHelper()
+        with contextlib.redirect_stdout(io.StringIO()):
+            helper.readFromPcrFile(os.path.join(root, "example", "pbso4", "pbso4.pcr"))
+        self.r = run.Run()
+        self.r.params = ParamList(helper.fit.getParamList(), 1, helper.fit)
+        self.ctx = RefinementContext()
+        self.ctx.afl = auto.autofp_log()
+
+    def test_order_and_screened(self):
+        probe = GivenProbes({10: (0, rwp(40)), 11: (0, rwp(60)), 12: (-33, rwp(0)),
+                             13: (0, rwp(30)), 14: (0, rwp(50)), 15: (-35, rwp(20))})
+        order = [1, 2, 10, 11, 12, 13, 14, 15, 3]
+        screened = auto.screen(self.r, self.ctx, probe, order, 2, 8, 50)
+        self.assertEqual(probe.candidates, [10, 11, 12, 13, 14, 15])
+        # the better ones, best first, then the failed ones, then the others
+        self.assertEqual(order, [1, 2, 13, 10, 12, 15, 11, 14, 3])
+        self.assertEqual(screened, {11: 60, 14: 50})
+
+    def test_all_failed(self):
+        probe = GivenProbes({4: (-30, rwp(0)), 5: (-34, rwp(0))})
+        order = [4, 5]
+        self.assertEqual(auto.screen(self.r, self.ctx, probe, order, 0, 2, 50), {})
+        self.assertEqual(order, [4, 5])
+
+    def test_none_better(self):
+        probe = GivenProbes({4: (0, rwp(51)), 5: (0, rwp(50))})
+        order = [4, 5]
+        self.assertEqual(auto.screen(self.r, self.ctx, probe, order, 0, 2, 50),
+                         {4: 51, 5: 50})
+
+
+if __name__ == "__main__":
+    unittest.main()
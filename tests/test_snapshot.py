@@ -0,0 +1,171 @@
+# tests of the snapshots of Run.push/pop and of the incremental pcr writer:
+# a restored state is written as the pcr file of its step, which reads back
+# to the same state, and a patched pcr file is the file the full writer makes
+# fp2k is replaced by benchmarks/fakefp2k.py, no FullProf is needed
+# usage: python -m pytest tests
+import os
+import io
+import sys
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, "benchmarks"))
+import run  # before com
+import com
+import setting
+import pcrfilehelper
+from pcrfilehelper import pcrFileHelper
+from paramlist import ParamList
+from diffpy.pyfullprof.pcrfilewriter import pcrFileWriter, IncrementalPcrWriter
+from bench_pipeline import make_fp2k
+
+jobs = ["Y2O3", "pbso4", "pbsox"]
+
+
+def read_fit(pcr, fresh=False):
+    if fresh == True:
+        pcrfilehelper.g_templates.clear()  # no layout of a read before
+    helper = pcrFileHelper()
+    with contextlib.redirect_stdout(io.StringIO()):
+        helper.readFromPcrFile(pcr)
+    return helper.fit
+
+
+def read_bytes(path):
+    f = open(path, "rb")
+    data = f.read()
+    f.close()
+    return data
+
+
+class TestIncrementalPcrWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check_same(self, fit, writer, name):
+        patched = os.path.join(self.dir, name+".pcr")
+        full = os.path.join(self.dir, name+"_full.pcr")
+        writer.write(fit, patched)
+        pcrFileWriter(fit, full)
+        self.assertEqual(read_bytes(patched), read_bytes(full))
+
+    def test_same_as_full_writer(self):
+        for job in jobs:
+            fit = read_fit(os.path.join(root, "example", job, job+".pcr"))
+            params = ParamList(fit.getParamList(), fit.get("Pattern")[0].get("Job"), fit)
+            writer = IncrementalPcrWriter()
+            self.check_same(fit, writer, job)
+            n = len(params.paramlist)
+            for step in range(0, 4):
+                # a step: a param turned on, new values of the refined ones
+                params.turnon_param((step*7) % n)
+                for c in fit.get("Refine").constraints:
+                    if c.codeWord != 0:
+                        c.setRefinedValue(c.getValue()*(1+step*0.001))
+                self.check_same(fit, writer, job)
+            # a value of another width is written in full
+            self.assertGreater(writer.numpatch, 0, job)
+            fit.set("NCY", fit.get("NCY")+1)  # not a param: the whole file
+            self.check_same(fit, writer, job)
+
+
+class TestSnapshot(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            com.com_init("cmd", root)
+        com.run_mode = 0
+        com.mode = "cmd"
+        com.ui = io.StringIO()
+        setting.run_set.show_rwp = False
+        setting.run_set.fp_cache = False
+        setting.run_set.save_step = False
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fp2k_path = setting.run_set.fp2k_path
+        setting.run_set.fp2k_path = make_fp2k(self.dir)
+
+    def tearDown(self):
+        setting.run_set.fp2k_path = self.fp2k_path
+        shutil.rmtree(self.dir)
+
+    def make_run(self, job):
+        src = os.path.join(root, "example", job)
+        dest = os.path.join(self.dir, job)
+        os.mkdir(dest)
+        for name in [job+".pcr", job+".dat", job+".out"]:
+            shutil.copyfile(os.path.join(src, name), os.path.join(dest, name))
+        os.environ["AUTOFP_FAKE_SRC"] = src
+        r = run.Run()
+        with contextlib.redirect_stdout(io.StringIO()):
+            r.reset(os.path.join(dest, job+".pcr"))
+            r.reset_steps()
+            r.writepcr()
+        return r
+
+    # a step: params turned on, new values and a new out file
+    def step(self, r, indices):
+        for i in indices:
+            r.setParam(i, True)
+        for c in r.fit.get("Refine").constraints:
+            if c.codeWord != 0:
+                c.setRefinedValue(c.getValue()*0.98+0.002)
+        r.writepcr()
+        out = open(r.outfilename, "a")
+        out.write("\n step\n")
+        out.close()
+        r.Rwp = r.Rwp-1
+        r.push()
+
+    def test_restore_is_reload(self):
+        for job in jobs:
+            r = self.make_run(job)
+            pcr = read_bytes(r.pcrfilename)
+            out = read_bytes(r.outfilename)
+            state = r.fit.snapshot()
+            Rwp = r.Rwp
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.step(r, [0, 3])
+                self.step(r, [5])
+                self.assertEqual(r.step_index, 2)
+                r.back(2)
+                self.assertEqual(r.step_index, 0)
+                self.assertTrue(r.dirty)  # restored in memory, not from files
+                r.sync()
+            self.assertEqual(r.Rwp, Rwp)
+            self.assertEqual(read_bytes(r.outfilename), out)
+            self.assertEqual(read_bytes(r.pcrfilename), pcr, job)
+            self.assertEqual(r.fit.snapshot().tolist(), state.tolist())
+
+            # the pcr file reads back to the state in memory
+            fit = read_fit(r.pcrfilename, fresh=True)
+            n = len(state)//4
+            self.assertEqual(fit.snapshot()[2*n:3*n].tolist(), state[2*n:3*n].tolist())
+            for a, b in zip(fit.snapshot()[:n], state[:n]):
+                self.assertAlmostEqual(a, b, delta=1e-4*max(abs(b), 1))
+            params = ParamList(fit.getParamList(), r.job, fit)
+            self.assertEqual(params.param_onoff_list.tolist(),
+                             r.params.param_onoff_list.tolist())
+
+    def test_stack_of_one_cycle(self):
+        r = self.make_run("Y2O3")
+        with contextlib.redirect_stdout(io.StringIO()):
+            for k in range(0, 3):
+                self.step(r, [k])
+            self.assertEqual(len(r.snapshots), 4)
+            r.reset_steps()  # a new cycle of autofp
+        self.assertEqual(len(r.snapshots), 1)
+        self.assertEqual(r.step_index, 0)
+        self.assertFalse(hasattr(r.snapshots[0], "pcrRW"))
+
+
+if __name__ == "__main__":
+    unittest.main()
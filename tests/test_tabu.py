@@ -0,0 +1,65 @@
+# tests of the memo of the failed trials of autorun, tabu.TabuTable
+# usage: python -m pytest tests
+import os
+import sys
+import unittest
+import numpy
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+import tabu
+from tabu import TabuTable
+
+
+# a state of Fit.snapshot(): values, real values, code words, sigmas
+def state(values, codewords):
+    values = numpy.asarray(values, dtype=float)
+    return numpy.concatenate([values, values, numpy.asarray(codewords, dtype=float),
+                              numpy.zeros(len(values))])
+
+
+class TestTabuTable(unittest.TestCase):
+    def test_lookup(self):
+        table = TabuTable(drift=0.05)
+        s = state([1.0, 2.0, 3.0], [11, 0, 0])
+        table.add(1, s, -33, None, cycle=1)
+        entry = table.lookup(1, s)
+        self.assertEqual(entry["err"], -33)
+        self.assertEqual(entry["cycle"], 1)
+        self.assertEqual(table.saved, 1)
+        self.assertIsNone(table.lookup(2, s))  # another param
+        self.assertEqual(table.saved, 1)
+
+    def test_mask_changed(self):
+        table = TabuTable(drift=0.05)
+        s = state([1.0, 2.0, 3.0], [11, 0, 0])
+        table.add(1, s, -33, None)
+        # another param refined since: not the same state
+        self.assertIsNone(table.lookup(1, state([1.0, 2.0, 3.0], [11, 0, 21])))
+        # the same params refined, other code words: the same state
+        self.assertIsNotNone(table.lookup(1, state([1.0, 2.0, 3.0], [-11, 0, 0])))
+        # the entry is kept for the state it was added from
+        self.assertIsNotNone(table.lookup(1, s))
+        self.assertEqual(table.expired, 0)
+
+    def test_drift(self):
+        table = TabuTable(drift=0.05)
+        s = state([1.0, 2.0, 0.0], [11, 0, 0])
+        table.add(1, s, 0, 42.0)
+        # small drift, of a value near zero relative to TabuTable.floor
+        self.assertEqual(table.lookup(1, state([1.04, 2.0, 0.00004], [11, 0, 0]))["target"], 42.0)
+        self.assertIsNone(table.lookup(1, state([1.0, 2.2, 0.0], [11, 0, 0])))
+        self.assertEqual(table.expired, 1)
+        self.assertIsNone(table.lookup(1, s))  # removed
+
+    def test_failures(self):
+        # the errors of fp2k on the param and the state, not the stops of the
+        # monitor, the timeout or the errors of autofp
+        for err in [1, -30, -31, -32, -33, -34]:
+            self.assertIn(err, tabu.failures)
+        for err in [0, -1, -35, -36, -37, 11, 12, 13]:
+            self.assertNotIn(err, tabu.failures)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# tests of the target function of a strategy, target.Target
+# usage: python -m pytest tests
+import os
+import sys
+import math
+import pickle
+import unittest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+from target import Target
+
+R = {"Rp": 10.0, "Rwp": 12.0, "Re": 8.0, "Chi2": 2.25}
+
+
+class TestTarget(unittest.TestCase):
+    def test_value(self):
+        self.assertEqual(Target()(R), 12.0)
+        self.assertEqual(Target()(R), Target('MIN=R_Factor["Rwp"]')(R))
+        t = Target('MIN=0.5*R_Factor["Rwp"]+abs(-R_Factor["Chi2"])**2')
+        self.assertAlmostEqual(t(R), 0.5*12.0+2.25**2)
+        self.assertAlmostEqual(Target({"Rwp": 0.7, "Chi2": 0.3})(R), 0.7*12.0+0.3*2.25)
+        self.assertEqual(Target("MIN=max(R_Factor['Rp'], R_Factor['Re'])")(R), 10.0)
+
+    def test_name(self):
+        self.assertEqual(Target().name, "Rwp")
+        self.assertEqual(Target('MIN = R_Factor["Chi2"]').name, "Chi2")
+
+    def test_division_by_zero(self):
+        t = Target('MIN=R_Factor["Rwp"]/R_Factor["Re"]')
+        self.assertTrue(math.isnan(t(dict(R, Re=0.0))))
+
+    def test_not_allowed(self):
+        for spec in ['MIN=R_Factor["Rwq"]',
+                     'MIN=R_Factor[0]',
+                     'MIN=X["Rwp"]',
+                     'MIN=Rwp',
+                     'MIN=__import__("os").getcwd()',
+                     'MIN=R_Factor.keys()',
+                     'MIN=open("f")',
+                     'MIN=max(R_Factor["Rwp"], key=abs)',
+                     'MIN=max()',
+                     'MIN=R_Factor["Rwp"] if 1 else 0',
+                     'MIN=R_Factor["Rwp"] < 3',
+                     'MIN=[R_Factor["Rwp"]]',
+                     'MIN="Rwp"',
+                     'MIN=R_Factor["Rwp"] % 3',
+                     'MIN=(lambda: 1)()',
+                     'MIN=R_Factor["Rwp"]+']:
+            self.assertRaises(ValueError, Target, spec)
+
+    def test_pickle(self):
+        t = pickle.loads(pickle.dumps(Target('MIN=R_Factor["Rp"]*2')))
+        self.assertEqual(t(R), 20.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -277,7 +277,7 @@ class Ui(QtGui.QMainWindow):
 
     def done_output(self):  # auto refinement over!
         rpa_raw = 0
-        com.des = False
+        self.run.ctx.des = False
         self.write(" ")
         self.write("weight of phase [phase1, phase2, phase3 ... ]:", style="ok")
         wp = com.wphase.get_w(self.run)
@@ -293,6 +293,7 @@ class Ui(QtGui.QMainWindow):
 
     # the real place for multi cycle operation
     def autorunfp_result(self, r):
+        ctx = self.run.ctx
         rwp = r
         self.write("end! \n Rwp=" + str(rwp), "ok")
         self.textrwp.setText(str(rwp))
@@ -301,30 +302,30 @@ class Ui(QtGui.QMainWindow):
 
         # cycles loop
         if com.autofp_running == True:
-            if com.cycle >= self.cycle:
+            if ctx.cycle >= self.cycle:
                 if self.cycle > 0:
-                    com.cycle = 1
+                    ctx.cycle = 1
                     self.updateTable()
                     self.done_output()
                 if self.cycle == 0:
-                    if com.des == True or com.cycle > 100:
-                        com.cycle = 1
+                    if ctx.des == True or ctx.cycle > 100:
+                        ctx.cycle = 1
                         self.updateTable()
                         self.done_output()
-                        com.des = False
+                        ctx.des = False
                     else:
-                        com.cycle = com.cycle + 1
+                        ctx.cycle = ctx.cycle + 1
                         self.autorunfp()
             else:
-                com.cycle = com.cycle + 1
+                ctx.cycle = ctx.cycle + 1
                 self.autorunfp()
         else:
             self.write("autofp has been stoped by user!", style="warning")
-            com.cycle = 1
+            ctx.cycle = 1
             self.updateTable()
             self.done_output()
 
-        self.showMsg(str(com.cycle) + " ok!")
+        self.showMsg(str(ctx.cycle) + " ok!")
         return
 
     def closeEvent(self, event):
@@ -434,6 +435,7 @@ class Ui(QtGui.QMainWindow):
     def back(self):
         self.showMsg("back!")
         self.run.back()
+        self.run.sync()
         self.showMsg("step=" + str(self.run.step_index))
         self.updateTable()
         self.textrwp.setText(str(self.run.Rwp))
@@ -1,7 +1,7 @@
 import os
 import math
 import run
-import re
+from diffpy.pyfullprof.fpoutputfileparsers import FPOutFileIndex
 # weight of phase is define by
 # weight cell : Scale*Unit*ATZ
 
@@ -27,16 +27,13 @@ def get_w_phase_n(phase, n):
     return w
 
 
-def get_volume(path, n):
-    outfile = open(path)
-    context = outfile.read()
-    obj = re.compile(r'Direct Cell Volume =\s*\w*\d')
-    con = obj.findall(context)
+# outindex: FPOutFileIndex of the out file, None to read it
+def get_volume(path, n, outindex=None):
+    if outindex == None:
+        outindex = FPOutFileIndex(path)
     vol = []
     for i in range(0, n):
-        con_i = con[i]
-        sc = con_i.split(' ')
-        vol.append(float(sc[-1]))
+        vol.append(outindex.volumes[i])
     return vol
 
 
@@ -45,7 +42,11 @@ def get_w(r_):
     r = r_
     n = r.phase_num
     pcell = []
-    unit = get_volume(r.outfilename, n)
+    outindex = None
+    r.sync()  # the out file of a restored state
+    if r.outR != None:
+        outindex = r.outR.getOutIndex()  # the out file of the current state
+    unit = get_volume(r.outfilename, n, outindex)
     for p_i in range(0, n):
         atz = r.fit.get("Phase")[p_i].get("ATZ")
         scale = r.fit.get("Contribution")[p_i].get("Scale")